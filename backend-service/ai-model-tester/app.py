@@ -1,4 +1,5 @@
 import os
+import sys
 import json
 import requests
 from flask import Flask, render_template, request, jsonify
@@ -7,6 +8,10 @@ from firebase_admin import credentials, firestore
 import google.generativeai as genai
 from dotenv import load_dotenv
 
+# Stored analyses may be compressed with the backend's analysis codec
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'src'))
+from services.analysis_codec import AnalysisCodec
+
 # Load environment variables
 load_dotenv()
 
@@ -89,8 +94,22 @@ def index():
 def get_files(repo_id):
     # Get all files for a repository
     files = []
+    
+    # Synced repositories keep a chunked manifest of their file tree
+    manifest_ref = db.collection('repositories').document(repo_id).collection('manifest')
+    for chunk in manifest_ref.stream():
+        for path, entry in (chunk.to_dict().get('entries') or {}).items():
+            files.append({
+                'id': path.replace('/', '_'),
+                'path': path,
+                'language': entry.get('language') or 'Unknown'
+            })
+    if files:
+        return jsonify(files)
+    
     files_ref = db.collection('repositories').document(repo_id).collection('files')
-    all_files = files_ref.stream()
+    # Only the listed fields are read, not the analysis payloads
+    all_files = files_ref.select(['path', 'language']).stream()
     
     for file in all_files:
         file_data = file.to_dict()
@@ -103,6 +122,28 @@ def get_files(repo_id):
     
     return jsonify(files)
 
+# Codecs with their repository's shared dictionary, keyed by (repo_id, codec, dict_id)
+analysis_codecs = {}
+
+def decode_analysis(repo_id, file_data):
+    """Replace an encoded analysis with the decoded 'ai_analysis', as FirestoreService does"""
+    encoded = file_data.pop('ai_analysis_encoded', None)
+    codec_info = file_data.pop('ai_analysis_codec', None)
+    if encoded is None or not codec_info:
+        return file_data
+    key = (repo_id, codec_info['codec'], codec_info.get('dict_id'))
+    if key not in analysis_codecs:
+        dictionary = None
+        if codec_info.get('dict_id'):
+            doc = db.collection('repositories').document(repo_id) \
+                .collection('codec_dictionaries').document(codec_info['dict_id']).get()
+            if not doc.exists:
+                raise ValueError(f"Analysis dictionary {codec_info['dict_id']} not found")
+            dictionary = doc.get('dictionary')
+        analysis_codecs[key] = AnalysisCodec(codec_info['codec'], dictionary)
+    file_data['ai_analysis'] = analysis_codecs[key].decode(encoded)
+    return file_data
+
 @app.route('/file/<repo_id>/<file_id>')
 def get_file(repo_id, file_id):
     # Get file details
@@ -110,7 +151,15 @@ def get_file(repo_id, file_id):
     file = file_ref.get()
     
     if file.exists:
-        return jsonify(file.to_dict())
+        file_data = file.to_dict()
+        # Repositories on the split storage layout keep the analysis separately
+        if file_data.get('has_analysis'):
+            analysis_ref = db.collection('repositories').document(repo_id).collection('analyses').document(file_id)
+            analysis = analysis_ref.get()
+            if analysis.exists:
+                file_data.update(analysis.to_dict())
+        # Encoded analyses are bytes, which jsonify cannot serialize
+        return jsonify(decode_analysis(repo_id, file_data))
     else:
         return jsonify({"error": "File not found"}), 404
 
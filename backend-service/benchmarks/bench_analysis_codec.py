@@ -0,0 +1,121 @@
+#!/usr/bin/env python3
+"""
+Benchmark the stored-analysis codecs: bytes per document and encode/decode
+latency, with and without a per-repository shared dictionary.
+
+Usage:
+    python benchmarks/bench_analysis_codec.py --files 500 --output codec.json
+"""
+import argparse
+import json
+import random
+import statistics
+import sys
+import time
+from pathlib import Path
+
+# Add the src directory to the Python path
+sys.path.append(str(Path(__file__).resolve().parent.parent / 'src'))
+
+from services.analysis_codec import AnalysisCodec, DICTIONARY_SAMPLE_SIZE, train_dictionary, zstandard
+
+DEPENDENCIES = ['react', 'firebase/firestore', 'firebase/auth', 'react-router-dom', 'lucide-react',
+                'axios', 'tailwindcss', '@headlessui/react', 'date-fns', 'zustand']
+FEATURES = ['React component', 'Firestore queries', 'Authentication', 'Form handling',
+            'State management with hooks', 'Routing', 'Error handling', 'Data fetching']
+PURPOSES = ['Loads data from Firestore', 'Handles form submission', 'Renders the list view',
+            'Updates local state', 'Validates user input', 'Subscribes to realtime updates']
+
+def synthetic_analysis(rng: random.Random, index: int) -> dict:
+    """A CodeAnalysis shaped like the ones Gemini returns for a UI component"""
+    def pick(items, count):
+        return rng.sample(items, min(count, len(items)))
+
+    return {
+        'summary': f'Component {index} that {rng.choice(PURPOSES).lower()} and renders the result.',
+        'searchMetadata': {
+            'primaryFeatures': pick(FEATURES, 3),
+            'dataTypes': ['Props', f'State{index}', 'Repository'],
+            'stateManagement': ['useState', 'useEffect'],
+            'dependencies': {
+                'external': pick(DEPENDENCIES, 4),
+                'internal': [f'../services/service{rng.randint(1, 20)}', '../hooks/useAuth']
+            }
+        },
+        'imports': [
+            {'path': dep, 'items': ['default'], 'purpose': rng.choice(PURPOSES)}
+            for dep in pick(DEPENDENCIES, 4)
+        ],
+        'functions': [
+            {
+                'name': f'handle{index}_{n}',
+                'purpose': rng.choice(PURPOSES),
+                'params': ['event'],
+                'returns': 'void',
+                'dependencies': pick(DEPENDENCIES, 2),
+                'stateInteractions': {'reads': ['user'], 'writes': ['loading', 'error']}
+            }
+            for n in range(rng.randint(2, 6))
+        ],
+        'classes': [],
+        'integrationPoints': [
+            {'type': 'Service', 'name': 'FirestoreService', 'purpose': rng.choice(PURPOSES)}
+        ]
+    }
+
+def measure(codec: AnalysisCodec, analyses: list) -> dict:
+    sizes, encode_times, decode_times = [], [], []
+    for analysis in analyses:
+        start = time.perf_counter()
+        encoded = codec.encode(analysis)
+        encode_times.append(time.perf_counter() - start)
+        if codec.codec == 'json':
+            # Firestore map size is close to its compact JSON size
+            sizes.append(len(json.dumps(encoded['ai_analysis'], separators=(',', ':')).encode('utf-8')))
+            decode_times.append(0.0)
+            continue
+        sizes.append(len(encoded['ai_analysis_encoded']))
+        start = time.perf_counter()
+        codec.decode(encoded['ai_analysis_encoded'])
+        decode_times.append(time.perf_counter() - start)
+    return {
+        'mean_bytes': round(statistics.mean(sizes), 1),
+        'total_bytes': sum(sizes),
+        'encode_us_p50': round(statistics.median(encode_times) * 1e6, 1),
+        'decode_us_p50': round(statistics.median(decode_times) * 1e6, 1)
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark stored-analysis codecs')
+    parser.add_argument('--files', type=int, default=500, help='Number of synthetic analyses')
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--output', help='Write results as JSON to this path')
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    analyses = [synthetic_analysis(rng, i) for i in range(args.files)]
+    samples = analyses[:DICTIONARY_SAMPLE_SIZE]
+
+    variants = {'json': AnalysisCodec('json'), 'zlib': AnalysisCodec('zlib')}
+    variants['zlib+dict'] = AnalysisCodec('zlib', train_dictionary('zlib', samples))
+    if zstandard is not None:
+        variants['zstd'] = AnalysisCodec('zstd')
+        variants['zstd+dict'] = AnalysisCodec('zstd', train_dictionary('zstd', samples))
+    else:
+        print("msgpack/zstandard not installed, skipping zstd variants")
+
+    results = {name: measure(codec, analyses) for name, codec in variants.items()}
+    baseline = results['json']['mean_bytes']
+
+    print(f"{'codec':<12}{'mean bytes':>12}{'ratio':>8}{'encode p50 us':>16}{'decode p50 us':>16}")
+    for name, result in results.items():
+        result['ratio'] = round(result['mean_bytes'] / baseline, 3)
+        print(f"{name:<12}{result['mean_bytes']:>12}{result['ratio']:>8}"
+              f"{result['encode_us_p50']:>16}{result['decode_us_p50']:>16}")
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump({'files': args.files, 'seed': args.seed, 'results': results}, f, indent=2)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,383 @@
+#!/usr/bin/env python3
+"""
+End-to-end sync benchmark on synthetic repositories.
+
+Generates a repository of the requested size and shape, runs an initial
+sync and then an incremental sync after a commit that modifies, adds and
+deletes files. process_repository runs unchanged against local stand-ins
+for GitHub and Gemini, with simulated latencies, and the Firestore emulator:
+
+    firebase emulators:start --only firestore
+    FIRESTORE_EMULATOR_HOST=localhost:8085 python benchmarks/bench_sync.py \\
+        --files 2000 --depth 4 --languages py:4,ts:3,tsx:2,md:1 --churn 0.05 --output sync.json
+
+Each sync records files/sec, p50/p99 per-file latency (from the first
+GitHub call for a file until it is stored), GitHub and model calls, tokens
+and peak RSS. With --baseline, results are compared against an earlier
+output file and the script exits with status 1 on a regression.
+"""
+import argparse
+import asyncio
+import contextlib
+import hashlib
+import json
+import os
+import platform
+import random
+import resource
+import statistics
+import sys
+import threading
+import time
+import uuid
+from collections import Counter
+from datetime import datetime, timezone
+from pathlib import Path
+from types import SimpleNamespace
+
+# Add the src directory to the Python path
+sys.path.append(str(Path(__file__).resolve().parent.parent / 'src'))
+
+import firebase_admin
+from firebase_admin import credentials
+from google.auth.credentials import AnonymousCredentials
+
+from bench_analysis_codec import synthetic_analysis
+from main import process_repository
+from services.github_service import GitHubService
+from services.gemini_service import GeminiService
+
+# Relative change in a metric, in its worse direction, reported as a regression
+DEFAULT_TOLERANCE = 0.1
+
+# Metrics compared against a baseline, and whether higher values are better
+COMPARED_METRICS = {
+    'files_per_second': True,
+    'latency_ms_p50': False,
+    'latency_ms_p99': False,
+    'github_calls': False,
+    'model_requests': False,
+    'model_tokens': False,
+    'peak_rss_mb': False
+}
+
+def parse_languages(value: str) -> dict:
+    """Parse 'py:4,ts:3,md:1' into extension weights"""
+    weights = {}
+    for item in value.split(','):
+        extension, _, weight = item.partition(':')
+        weights[extension.strip().lstrip('.')] = float(weight or 1)
+    return weights
+
+def blob_sha(content: str) -> str:
+    data = content.encode('utf-8')
+    return hashlib.sha1(b'blob %d\0' % len(data) + data).hexdigest()
+
+class SyntheticRepository:
+    """
+    A repository's files at one commit, generated from a seed.
+
+    Files are spread over a directory tree of the given depth, with
+    extensions drawn from the language weights. Code files import other
+    generated modules, so import fan-in and metadata extraction see
+    realistic input; sizes vary around the mean.
+    """
+
+    def __init__(self, files: int, depth: int, languages: dict, mean_size: int, seed: int):
+        self.rng = random.Random(seed)
+        self.depth = depth
+        self.languages = languages
+        self.mean_size = mean_size
+        self.commit_number = 0
+        self.files = {}
+        for _ in range(files):
+            path = self._new_path()
+            self.files[path] = self._content(path)
+
+    @property
+    def commit(self) -> str:
+        return hashlib.sha1(f'{self.commit_number}:{len(self.files)}'.encode()).hexdigest()
+
+    def _new_path(self) -> str:
+        while True:
+            directories = [f'pkg{self.rng.randint(0, 9)}' for _ in range(self.rng.randint(1, self.depth))]
+            extension = self.rng.choices(list(self.languages), weights=list(self.languages.values()))[0]
+            path = '/'.join(directories + [f'module{self.rng.randint(0, 99999)}.{extension}'])
+            if path not in self.files:
+                return path
+
+    def _content(self, path: str) -> str:
+        extension = path.rsplit('.', 1)[-1]
+        size = max(200, int(self.rng.expovariate(1 / self.mean_size)))
+        others = list(self.files) or [path]
+        imports = [self.rng.choice(others) for _ in range(self.rng.randint(0, 5))]
+        lines = []
+        if extension == 'py':
+            lines += [f"from {other.rsplit('.', 1)[0].replace('/', '.')} import handler" for other in imports]
+            body = "\ndef handler_{n}(event):\n    total = sum(item['value'] for item in event)\n    return total * {n}\n"
+        elif extension in ('ts', 'tsx', 'js', 'jsx'):
+            lines += [f"import {{ handler }} from '{other.rsplit('.', 1)[0]}';" for other in imports]
+            body = "\nexport function handler{n}(event: any) {{\n  return event.items.map((item: any) => item.value * {n});\n}}\n"
+        else:
+            body = "\n## Section {n}\n\nNotes about the behaviour of this part of the system, revision {n}.\n"
+        content = '\n'.join(lines)
+        n = 0
+        while len(content) < size:
+            n += 1
+            content += body.format(n=n + self.commit_number * 1000)
+        return content
+
+    def next_commit(self, modify: float, add: float, delete: float):
+        """Advance one commit, changing the given fractions of files"""
+        self.commit_number += 1
+        paths = list(self.files)
+        for path in self.rng.sample(paths, int(len(paths) * modify)):
+            self.files[path] = self._content(path)
+        for path in self.rng.sample(paths, int(len(paths) * delete)):
+            del self.files[path]
+        for _ in range(int(len(paths) * add)):
+            path = self._new_path()
+            self.files[path] = self._content(path)
+
+class LocalGitHub(GitHubService):
+    """GitHub stand-in serving a SyntheticRepository, with a fixed latency per call"""
+
+    def __init__(self, repository: SyntheticRepository, latency: float):
+        self.repository = repository
+        self.latency = latency
+        self.rate_limiter = None
+        self.calls = Counter()
+        self.first_call_at = {}
+        self.blobs = {}
+        self._lock = threading.Lock()
+
+    def _call(self, name: str, path: str = None):
+        with self._lock:
+            self.calls[name] += 1
+            if path is not None:
+                self.first_call_at.setdefault(path, time.monotonic())
+        time.sleep(self.latency)
+
+    def get_repository_metadata(self, repo_full_name: str) -> dict:
+        self._call('repository')
+        return {'name': repo_full_name.split('/')[-1], 'full_name': repo_full_name,
+                'default_branch': 'main', 'language': 'Python'}
+
+    def get_head_commit(self, repo_full_name: str, branch: str = None) -> str:
+        self._call('head_commit')
+        return self.repository.commit
+
+    def list_repository_files(self, repo_full_name: str, ref: str = None, skip_types: set = None,
+                              max_files: int = None) -> list:
+        self._call('tree')
+        files = []
+        for path, content in sorted(self.repository.files.items()):
+            language = Path(path).suffix.lstrip('.')
+            if skip_types and language in skip_types:
+                continue
+            sha = blob_sha(content)
+            self.blobs[sha] = content
+            files.append({
+                'name': Path(path).name,
+                'path': path,
+                'language': language,
+                'size': len(content.encode('utf-8')),
+                'metadata': {'sha': sha, 'type': 'file', 'content_type': 'code'}
+            })
+            if max_files and len(files) >= max_files:
+                break
+        return files
+
+    def get_last_commit(self, repo_full_name: str, file_path: str, ref: str = None) -> dict:
+        self._call('last_commit', file_path)
+        return {'date': datetime.now(timezone.utc).isoformat(), 'message': f'Commit {self.repository.commit_number}'}
+
+    def get_blob_content(self, repo_full_name: str, sha: str) -> str:
+        self._call('blob')
+        return self.blobs[sha]
+
+    def get_file_content(self, repo_full_name: str, file_path: str) -> str:
+        self._call('contents', file_path)
+        return self.repository.files[file_path]
+
+class LocalGemini(GeminiService):
+    """Gemini stand-in returning synthetic analyses after a fixed latency"""
+
+    def __init__(self, latency: float, seed: int):
+        self.latency = latency
+        self.rng = random.Random(seed)
+        self.concurrency_limit = None
+        self.rate_limiter = None
+        self.requests = 0
+        self.prompt_tokens = 0
+        self.response_tokens = 0
+        self._lock = threading.Lock()
+
+    def _generate(self, prompt: str):
+        time.sleep(self.latency)
+        with self._lock:
+            text = json.dumps(synthetic_analysis(self.rng, self.requests))
+            self.requests += 1
+            self.prompt_tokens += len(prompt) // 4
+            self.response_tokens += len(text) // 4
+        usage = SimpleNamespace(prompt_token_count=len(prompt) // 4, candidates_token_count=len(text) // 4,
+                                total_token_count=(len(prompt) + len(text)) // 4)
+        return SimpleNamespace(text=text, usage_metadata=usage)
+
+class StoredAtRecorder:
+    """Progress broadcaster stand-in recording when each file was stored"""
+
+    def __init__(self):
+        self.stored_at = {}
+
+    def publish(self, topic: str, event_type: str, data: dict):
+        if event_type == 'file' and data.get('path'):
+            self.stored_at[data['path']] = time.monotonic()
+
+class EmulatorCredential(credentials.Base):
+    """Credential for the Firestore emulator, which accepts any request"""
+
+    def get_credential(self):
+        return AnonymousCredentials()
+
+def percentile(values: list, fraction: float) -> float:
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))]
+
+async def run_sync(name: str, repository: SyntheticRepository, repo_full_name: str, config: dict,
+                   args) -> dict:
+    github = LocalGitHub(repository, args.github_latency)
+    gemini = LocalGemini(args.model_latency, args.seed)
+    recorder = StoredAtRecorder()
+
+    started_at = time.monotonic()
+    with open(os.devnull, 'w') as devnull, contextlib.redirect_stdout(sys.stdout if args.verbose else devnull):
+        result = await process_repository(
+            repo_full_name, 'benchmark', 'benchmark', config,
+            github_service=github, gemini_service=gemini, broadcaster=recorder
+        )
+    wall = time.monotonic() - started_at
+    if result['status'] != 'success':
+        raise RuntimeError(f"{name} sync failed: {result['error']}")
+
+    latencies = [
+        recorder.stored_at[path] - started for path, started in github.first_call_at.items()
+        if path in recorder.stored_at
+    ]
+    return {
+        'name': name,
+        'listed_files': len(repository.files),
+        'processed_files': result['file_count'],
+        'wall_seconds': round(wall, 3),
+        'files_per_second': round(result['file_count'] / wall, 2) if wall else 0.0,
+        'latency_ms_p50': round(1000 * (statistics.median(latencies) if latencies else 0.0), 1),
+        'latency_ms_p99': round(1000 * percentile(latencies, 0.99), 1),
+        'github_calls': sum(github.calls.values()),
+        'github_calls_by_type': dict(github.calls),
+        'model_requests': gemini.requests,
+        'model_tokens': gemini.prompt_tokens + gemini.response_tokens,
+        'prompt_tokens': gemini.prompt_tokens,
+        'response_tokens': gemini.response_tokens,
+        # ru_maxrss is in KiB on Linux; it is the peak of the whole process so far
+        'peak_rss_mb': round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1),
+        'pipeline': result['pipeline']
+    }
+
+def compare(results: dict, baseline: dict, tolerance: float) -> list:
+    """Print each run's metrics against the baseline and return the regressions"""
+    regressions = []
+    previous_runs = {run['name']: run for run in baseline.get('runs', [])}
+    print(f"\n{'run':<14}{'metric':<18}{'baseline':>12}{'current':>12}{'change':>9}")
+    for run in results['runs']:
+        previous = previous_runs.get(run['name'])
+        if previous is None:
+            continue
+        for metric, higher_is_better in COMPARED_METRICS.items():
+            before, after = previous.get(metric), run.get(metric)
+            if not before or after is None:
+                continue
+            change = (after - before) / before
+            worse = -change if higher_is_better else change
+            flag = '  REGRESSION' if worse > tolerance else ''
+            print(f"{run['name']:<14}{metric:<18}{before:>12}{after:>12}{change:>+9.1%}{flag}")
+            if flag:
+                regressions.append(f"{run['name']} {metric}: {before} -> {after}")
+    return regressions
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark full and incremental syncs of a synthetic repository')
+    parser.add_argument('--files', type=int, default=500, help='Files in the repository')
+    parser.add_argument('--depth', type=int, default=3, help='Maximum directory depth')
+    parser.add_argument('--languages', type=parse_languages, default='py:4,ts:3,tsx:2,md:1',
+                        help='Extension weights, e.g. py:4,ts:3,md:1')
+    parser.add_argument('--mean-size', type=int, default=3000, help='Mean file size in bytes')
+    parser.add_argument('--churn', type=float, default=0.05, help='Fraction of files modified by the second commit')
+    parser.add_argument('--added', type=float, default=0.01, help='Fraction of files added by the second commit')
+    parser.add_argument('--deleted', type=float, default=0.01, help='Fraction of files deleted by the second commit')
+    parser.add_argument('--github-latency', type=float, default=0.05, help='Seconds per GitHub call')
+    parser.add_argument('--model-latency', type=float, default=0.5, help='Seconds per model request')
+    parser.add_argument('--async-firestore', action='store_true', help='Use the async Firestore client')
+    parser.add_argument('--project', default='demo-qeek', help='Firestore emulator project ID')
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--output', help='Write results as JSON to this path')
+    parser.add_argument('--baseline', help='Earlier results to compare against')
+    parser.add_argument('--tolerance', type=float, default=DEFAULT_TOLERANCE,
+                        help='Relative change counted as a regression')
+    parser.add_argument('--verbose', action='store_true', help='Show the sync output')
+    args = parser.parse_args()
+
+    if not os.environ.get('FIRESTORE_EMULATOR_HOST'):
+        parser.error('FIRESTORE_EMULATOR_HOST is not set; start the emulator with '
+                     '`firebase emulators:start --only firestore`')
+    firebase_admin.initialize_app(EmulatorCredential(), {'projectId': args.project})
+
+    config = {
+        'firebase_project_id': args.project,
+        'firestore_async': args.async_firestore,
+        'progress_min_interval': 1.0
+    }
+    scenario = {
+        key: getattr(args, key)
+        for key in ('files', 'depth', 'languages', 'mean_size', 'churn', 'added', 'deleted',
+                    'github_latency', 'model_latency', 'async_firestore', 'seed')
+    }
+    repository = SyntheticRepository(args.files, args.depth, args.languages, args.mean_size, args.seed)
+    # A new repository per run, so the first sync starts from an empty index
+    repo_full_name = f'benchmark/synthetic-{uuid.uuid4().hex[:8]}'
+
+    async def run():
+        runs = [await run_sync('initial', repository, repo_full_name, config, args)]
+        repository.next_commit(args.churn, args.added, args.deleted)
+        runs.append(await run_sync('incremental', repository, repo_full_name, config, args))
+        return runs
+
+    results = {
+        'scenario': scenario,
+        'environment': {'python': platform.python_version(), 'platform': platform.platform()},
+        'started_at': datetime.now(timezone.utc).isoformat(),
+        'repository': repo_full_name,
+        'runs': asyncio.run(run())
+    }
+
+    print(f"{'run':<14}{'files':>8}{'files/s':>10}{'p50 ms':>10}{'p99 ms':>10}"
+          f"{'GitHub':>9}{'model':>8}{'tokens':>10}{'RSS MB':>9}")
+    for run in results['runs']:
+        print(f"{run['name']:<14}{run['processed_files']:>8}{run['files_per_second']:>10}"
+              f"{run['latency_ms_p50']:>10}{run['latency_ms_p99']:>10}{run['github_calls']:>9}"
+              f"{run['model_requests']:>8}{run['model_tokens']:>10}{run['peak_rss_mb']:>9}")
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(results, f, indent=2)
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            regressions = compare(results, json.load(f), args.tolerance)
+        if regressions:
+            print(f"\n{len(regressions)} regression(s) beyond {args.tolerance:.0%}")
+            sys.exit(1)
+
+if __name__ == '__main__':
+    main()
@@ -1,6 +1,9 @@
-from flask import Flask, jsonify, request
+from flask import Flask, Response, jsonify, request, stream_with_context
+import asyncio
 import os
 import sys
+import tempfile
+import threading
 import traceback
 import logging
 import platform
@@ -34,7 +37,15 @@ try:
     from services.github_service import GitHubService
     from services.firestore_service import FirestoreService
     from services.gemini_service import GeminiService
+    from services.symbol_index import search_symbols
+    from services.job_queue import JobQueue, JobWorkerPool
+    from services.progress_broadcaster import ProgressBroadcaster, TERMINAL_EVENTS, format_sse
+    from services.telemetry import metrics
+    from services.sync_logging import configure_logging
+    from src.main import join_sharded_sync, plan_repository, process_repository
     import_success = True
+    # LOG_MODE=quiet logs JSON lines for Cloud Logging, sampled and truncated
+    configure_logging()
     logger.info("Successfully imported modules from src")
 except Exception as e:
     import_success = False
@@ -46,6 +57,74 @@ app = Flask(__name__)
 # Enable CORS for all routes
 CORS(app, origins=["http://localhost:3000", "https://qap-ai.web.app", "https://qap-ai.firebaseapp.com"])
 
+# Firestore service shared by request handlers, created on first use
+_firestore_service = None
+
+def get_firestore_service():
+    """Get the shared FirestoreService, initializing it on first use"""
+    global _firestore_service
+    if _firestore_service is None:
+        _firestore_service = FirestoreService(os.environ.get('FIREBASE_PROJECT_ID', 'qap-ai'))
+    return _firestore_service
+
+# Live progress of the syncs running in this process, streamed to clients
+progress_broadcaster = ProgressBroadcaster() if import_success else None
+
+# Seconds between keep-alive comments on idle event streams
+EVENT_STREAM_KEEPALIVE = 15
+
+# Durable queue of sync jobs and the background workers draining it, started on first use
+_job_workers = None
+_job_workers_lock = threading.Lock()
+
+def run_sync_job(payload):
+    """Run a queued repository sync, or work on its shards; raising marks the job failed"""
+    config = {
+        'environment': os.getenv('ENVIRONMENT', 'development'),
+        'firebase_project_id': os.environ.get('FIREBASE_PROJECT_ID', 'qap-ai'),
+        'gemini_api_key': os.environ.get('GEMINI_API_KEY'),
+        # Large syncs are split into up to this many shards for other instances to join
+        'sync_shards': int(payload.get('shards') or os.environ.get('SYNC_SHARDS', 1)),
+        # A sync already running elsewhere is joined, or waited for and repeated
+        'if_running': payload.get('if_running') or 'join'
+    }
+    if payload.get('join'):
+        result = asyncio.run(join_sharded_sync(payload['repository_name'], payload['account_id'], config))
+        if result['status'] != 'success':
+            raise RuntimeError(result['error'].split('\n', 1)[0])
+        return result
+    result = asyncio.run(process_repository(
+        payload['repository_name'],
+        payload.get('user_id') or 'api',
+        payload['account_id'],
+        config,
+        # A job retried after its worker died continues where it stopped
+        resume=True,
+        broadcaster=progress_broadcaster
+    ))
+    if result['status'] != 'success':
+        raise RuntimeError(result['error'].split('\n', 1)[0])
+    return {
+        'status': result['status'],
+        'file_count': result['file_count'],
+        'changed_files': result['changed_files'],
+        'shards': result.get('shards'),
+        'joined': result.get('joined', False),
+        'pipeline': result.get('pipeline')
+    }
+
+def get_job_workers():
+    """Get the sync job worker pool, starting it on first use"""
+    global _job_workers
+    with _job_workers_lock:
+        if _job_workers is None:
+            queue = JobQueue(os.environ.get(
+                'SYNC_JOB_DB', os.path.join(tempfile.gettempdir(), 'qap-sync-jobs.sqlite3')
+            ))
+            _job_workers = JobWorkerPool(queue, run_sync_job, workers=int(os.environ.get('SYNC_WORKERS', 2)))
+            _job_workers.start()
+        return _job_workers
+
 @app.route('/', methods=['GET'])
 def hello_world():
     """Health check endpoint"""
@@ -77,22 +156,184 @@ def sync_repository():
         
         logger.info(f"Processing repository sync request for {repository_name} (account: {account_id})")
         
-        # Here we would implement the actual repository sync logic
-        # For now, return a simple success response
+        # Queue the sync and return at once; a request for a repository that
+        # is already queued or syncing gets the existing job
+        workers = get_job_workers()
+        job, created = workers.queue.enqueue(
+            'repository_sync',
+            {
+                'repository_name': repository_name,
+                'account_id': account_id,
+                'user_id': request_json.get('userId'),
+                'shards': request_json.get('shards'),
+                'if_running': request_json.get('ifRunning')
+            },
+            dedupe_key=repository_name.replace('/', '_')
+        )
+        if created:
+            # Event streams opened now wait for this job, not the previous run's result
+            progress_broadcaster.publish(repository_name.replace('/', '_'), 'queued', {
+                'status': 'queued',
+                'job_id': job['id']
+            })
+            workers.notify()
+        
         return jsonify({
             "success": True, 
             "result": {
-                "status": "success",
-                "message": "Repository sync initiated",
+                "status": job['status'],
+                "message": "Repository sync queued" if created else f"Repository sync already {job['status']}",
                 "repository": repository_name,
-                "account_id": account_id
+                "account_id": account_id,
+                "job_id": job['id'],
+                "deduplicated": not created
             }
-        })
+        }), 202
     
     except Exception as e:
         logger.exception(f"Error processing repository: {e}")
         return jsonify({"error": str(e)}), 500
 
+@app.route('/repositories/shards/join', methods=['POST'])
+def join_repository_sync():
+    """Work on the shards of a repository's running sharded sync from this instance"""
+    try:
+        request_json = request.get_json(silent=True)
+        if not request_json:
+            return jsonify({"error": "No JSON data provided"}), 400
+        
+        repository_name = request_json.get('repositoryName')
+        account_id = request_json.get('accountId')
+        if not repository_name or not account_id:
+            return jsonify({"error": "Repository name and account ID are required"}), 400
+        
+        # One shard worker per repository per instance; more instances add more workers
+        workers = get_job_workers()
+        job, created = workers.queue.enqueue(
+            'repository_shard_sync',
+            {
+                'repository_name': repository_name,
+                'account_id': account_id,
+                'join': True
+            },
+            dedupe_key=f"{repository_name.replace('/', '_')}:shards"
+        )
+        if created:
+            workers.notify()
+        
+        return jsonify({
+            "success": True,
+            "result": {
+                "status": job['status'],
+                "repository": repository_name,
+                "job_id": job['id'],
+                "deduplicated": not created
+            }
+        }), 202
+    
+    except Exception as e:
+        logger.exception(f"Error joining repository sync: {e}")
+        return jsonify({"error": str(e)}), 500
+
+@app.route('/repositories/plan', methods=['POST'])
+def plan_repository_sync():
+    """Estimate API calls, tokens, cost and duration of a sync without running it"""
+    try:
+        request_json = request.get_json(silent=True)
+        if not request_json:
+            return jsonify({"error": "No JSON data provided"}), 400
+        
+        repository_name = request_json.get('repositoryName')
+        account_id = request_json.get('accountId')
+        if not repository_name or not account_id:
+            return jsonify({"error": "Repository name and account ID are required"}), 400
+        
+        skip_types = request_json.get('skipTypes')
+        plan = plan_repository(
+            repository_name,
+            account_id,
+            {'firebase_project_id': os.environ.get('FIREBASE_PROJECT_ID', 'qap-ai')},
+            max_files=request_json.get('maxFiles'),
+            skip_types=set(skip_types) if skip_types else None,
+            # Sync jobs resume an interrupted run, so plans do too unless asked not to
+            resume=request_json.get('resume', True)
+        )
+        return jsonify({"success": True, "plan": plan})
+    
+    except Exception as e:
+        logger.exception(f"Error planning repository sync: {e}")
+        return jsonify({"error": str(e)}), 500
+
+@app.route('/jobs/<job_id>', methods=['GET'])
+def get_job(job_id):
+    """Status and result of a queued sync job"""
+    try:
+        job = get_job_workers().queue.get(job_id)
+        if job is None:
+            return jsonify({"error": f"Job not found: {job_id}"}), 404
+        return jsonify({"success": True, "job": job})
+    
+    except Exception as e:
+        logger.exception(f"Error getting job {job_id}: {e}")
+        return jsonify({"error": str(e)}), 500
+
+@app.route('/repositories/<repo_id>/events', methods=['GET'])
+def stream_repository_events(repo_id):
+    """Stream a repository's sync progress as Server-Sent Events"""
+    if not import_success:
+        return jsonify({"error": "Sync modules failed to import; see the server log"}), 500
+    
+    def events():
+        with progress_broadcaster.subscribe(repo_id) as subscription:
+            while True:
+                event = subscription.get(timeout=EVENT_STREAM_KEEPALIVE)
+                if event is None:
+                    # Keeps proxies from closing the idle connection
+                    yield ": keepalive\n\n"
+                    continue
+                yield format_sse(event)
+                if event['event'] in TERMINAL_EVENTS:
+                    return
+    
+    return Response(
+        stream_with_context(events()),
+        mimetype='text/event-stream',
+        headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'}
+    )
+
+@app.route('/metrics', methods=['GET'])
+def get_metrics():
+    """Sync latency, token, cache and error metrics in the Prometheus text format"""
+    if not import_success:
+        return jsonify({"error": "Sync modules failed to import; see the server log"}), 500
+    return Response(metrics.render(), mimetype='text/plain; version=0.0.4')
+
+@app.route('/symbols/search', methods=['GET'])
+def search_symbol_index():
+    """Find files across repositories that define or import a symbol prefix"""
+    try:
+        prefix = request.args.get('q', '').strip()
+        if not prefix:
+            return jsonify({"error": "Query parameter 'q' is required"}), 400
+        
+        kind = request.args.get('kind')
+        if kind and kind not in ('import', 'function', 'class', 'export'):
+            return jsonify({"error": f"Unknown symbol kind: {kind}"}), 400
+        
+        limit = min(request.args.get('limit', 50, type=int), 200)
+        results = search_symbols(
+            get_firestore_service().db,
+            prefix,
+            kind=kind,
+            repo_id=request.args.get('repo'),
+            limit=limit
+        )
+        return jsonify({"success": True, "results": results})
+    
+    except Exception as e:
+        logger.exception(f"Error searching symbols: {e}")
+        return jsonify({"error": str(e)}), 500
+
 @app.route('/test-env', methods=['GET'])
 def test_environment():
     """Environment test endpoint"""
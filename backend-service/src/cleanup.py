@@ -1,35 +1,190 @@
+#!/usr/bin/env python3
+import argparse
+import sys
+import time
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+from typing import Dict, Iterable, List
 import firebase_admin
 from firebase_admin import credentials, firestore
-from pathlib import Path
+from google.cloud.firestore_v1.field_path import FieldPath
+
+# Add the backend-service directory to the Python path
+backend_service_dir = Path(__file__).resolve().parent.parent
+sys.path.append(str(backend_service_dir))
+
+from src.utils.firebase_utils import find_firebase_credentials
+from src.services.firestore_service import FirestoreService
+from src.services.repository_manifest import chunk_id, chunk_index
+
+# Deletes between progress lines
+PROGRESS_INTERVAL = 5000
+
+class PurgeProgress:
+    """Counts queued deletes and prints progress with the confirmed delete rate"""
+
+    def __init__(self, write_stats=None, interval: int = PROGRESS_INTERVAL):
+        self.write_stats = write_stats
+        self.interval = interval
+        self.started_at = time.monotonic()
+        self.counts: Dict[str, int] = {}
+        self.total = 0
+
+    def add(self, scope: str, count: int = 1):
+        self.counts[scope] = self.counts.get(scope, 0) + count
+        previous, self.total = self.total, self.total + count
+        if previous // self.interval != self.total // self.interval:
+            elapsed = time.monotonic() - self.started_at
+            if self.write_stats:
+                print(f"Queued {self.total} deletes, {self.write_stats.succeeded} done "
+                      f"({self.write_stats.succeeded / elapsed:.0f}/s)")
+            else:
+                print(f"Found {self.total} documents...")
+
+def document_keys(query) -> Iterable:
+    """Stream document references only, without their fields"""
+    for doc in query.select([FieldPath.document_id()]).stream():
+        yield doc.reference
+
+def _delete_all(references: Iterable, scope: str, bulk_writer, progress: PurgeProgress):
+    for reference in references:
+        if bulk_writer:
+            bulk_writer.delete(reference)
+        progress.add(scope)
+
+def purge_repository(firestore_service: FirestoreService, repo_name: str, dry_run: bool = False,
+                     collections: List[str] = None) -> Dict:
+    """
+    Delete a repository's whole document tree
+
+    Every subcollection is walked with a keys-only all-descendants query, so
+    nested documents such as sync run chunks are included, and the deletes
+    are sent in parallel by a BulkWriter. The repository's symbol index
+    entries are removed too, and the repository document is deleted last.
+
+    Args:
+        firestore_service: Firestore service to delete with
+        repo_name: Repository name (owner/repo)
+        dry_run: Only count the documents that would be deleted
+        collections: Only purge these subcollections (e.g. ['metrics']),
+            keeping the repository document and symbol index
+
+    Returns:
+        Dict with 'deleted' counts per scope, 'total' and 'writes'
+    """
+    repo_id = repo_name.replace('/', '_')
+    db = firestore_service.db
+    repo_ref = db.collection('repositories').document(repo_id)
+
+    bulk_writer, write_stats = (None, None) if dry_run else firestore_service.open_bulk_writer()
+    progress = PurgeProgress(write_stats)
 
-def cleanup_repository(repo_name: str):
-    """Clean up repository files in Firestore"""
-    try:
-        # Initialize Firebase
-        root_dir = Path(__file__).resolve().parent.parent.parent.parent
-        cred_path = root_dir / 'firebase-credentials.json'
-        cred = credentials.Certificate(str(cred_path))
-        firebase_admin.initialize_app(cred)
-        
-        db = firestore.client()
-        
-        # Get repository reference
-        repo_id = repo_name.replace('/', '_')
-        repo_ref = db.collection('repositories').document(repo_id)
-        
-        # Delete all files in the files collection
-        files_ref = repo_ref.collection('files')
-        docs = files_ref.list_documents()
-        for doc in docs:
-            doc.delete()
-            
-        print(f"Cleaned up files for repository: {repo_name}")
-        
-    except Exception as e:
-        print(f"Error cleaning up repository: {str(e)}")
-    finally:
-        if firebase_admin._apps:
-            firebase_admin.delete_app(firebase_admin.get_app())
+    for collection in repo_ref.collections():
+        if collections and collection.id not in collections:
+            continue
+        _delete_all(document_keys(collection.recursive()), collection.id, bulk_writer, progress)
+
+    if not collections:
+        symbols = db.collection('symbol_index').where('repo_id', '==', repo_id)
+        _delete_all(document_keys(symbols), 'symbol_index', bulk_writer, progress)
+        _delete_all([repo_ref], 'repository', bulk_writer, progress)
+
+    return _finish(repo_name, progress, bulk_writer, write_stats, dry_run)
+
+def purge_tombstones(firestore_service: FirestoreService, repo_name: str, older_than_days: int,
+                     dry_run: bool = False) -> Dict:
+    """
+    Delete file tombstones that have been deleted for longer than a number of days
+
+    Removes each tombstone's file document, its analysis document and its
+    manifest entry. Their symbol index entries were already removed when the
+    files were tombstoned.
+
+    Args:
+        firestore_service: Firestore service to delete with
+        repo_name: Repository name (owner/repo)
+        older_than_days: Minimum age of the tombstones, by 'deleted_at'
+        dry_run: Only count the tombstones that would be deleted
+
+    Returns:
+        Dict with 'deleted' counts per scope (documents, or entries for
+        'manifest_entries'), 'total' and 'writes'
+    """
+    repo_id = repo_name.replace('/', '_')
+    repo_ref = firestore_service.db.collection('repositories').document(repo_id)
+    cutoff = datetime.now(timezone.utc) - timedelta(days=older_than_days)
+    settings = firestore_service.get_sync_settings(repo_ref)
+    manifest = settings.get('manifest') or {}
+
+    bulk_writer, write_stats = (None, None) if dry_run else firestore_service.open_bulk_writer()
+    progress = PurgeProgress(write_stats)
+
+    tombstones = repo_ref.collection('files') \
+        .where('status', '==', 'deleted') \
+        .where('deleted_at', '<', cutoff) \
+        .select(['path'])
+    manifest_deletes: Dict[str, Dict] = {}
+    for doc in tombstones.stream():
+        _delete_all([doc.reference], 'files', bulk_writer, progress)
+        if settings.get('storage_layout') == 'split':
+            _delete_all([repo_ref.collection('analyses').document(doc.id)], 'analyses', bulk_writer, progress)
+        path = doc.to_dict().get('path')
+        if manifest.get('chunk_count') and path:
+            chunk = chunk_id(chunk_index(path, manifest['chunk_count']))
+            manifest_deletes.setdefault(chunk, {})[FieldPath('entries', path).to_api_repr()] = firestore.DELETE_FIELD
+
+    # Drop the tombstones' manifest entries with one update per chunk
+    for manifest_chunk_id, fields in manifest_deletes.items():
+        progress.add('manifest_entries', len(fields))
+        if bulk_writer:
+            bulk_writer.update(repo_ref.collection('manifest').document(manifest_chunk_id), fields)
+
+    return _finish(f"tombstones older than {older_than_days} days in {repo_name}",
+                   progress, bulk_writer, write_stats, dry_run)
+
+def _finish(description: str, progress: PurgeProgress, bulk_writer, write_stats, dry_run: bool) -> Dict:
+    result = {'deleted': dict(progress.counts), 'total': progress.total}
+    if dry_run:
+        print(f"Dry run: would delete {progress.total} documents for {description}: {progress.counts}")
+        return result
+
+    # Wait for all deletes, including retries, to finish
+    bulk_writer.close()
+    result['writes'] = write_stats.to_dict()
+    print(f"Deleted {description}: {progress.counts} in {result['writes']['duration_seconds']}s "
+          f"({result['writes']['succeeded']} writes, {result['writes']['failed']} failed)")
+    return result
+
+def parse_args():
+    """Parse command line arguments"""
+    parser = argparse.ArgumentParser(description="Purge repositories' Firestore documents")
+    parser.add_argument('repos', nargs='+', help='Repository names (owner/repo)')
+    parser.add_argument('--project-id', default='qap-ai', help='Firebase project ID')
+    parser.add_argument('--dry-run', action='store_true', help='Only count the documents that would be deleted')
+    parser.add_argument('--collections', help='Comma-separated subcollections to purge, e.g. metrics,sync_runs')
+    parser.add_argument('--tombstones-older-than', type=int, metavar='DAYS',
+                        help='Only delete file tombstones deleted more than DAYS days ago')
+    parser.add_argument('--ops-per-second', type=int, default=2000, help='Initial delete rate')
+    return parser.parse_args()
 
 if __name__ == '__main__':
-    cleanup_repository('mmbely/qeek')
\ No newline at end of file
+    args = parse_args()
+
+    cred_path = find_firebase_credentials()
+    if not firebase_admin._apps:
+        if cred_path:
+            firebase_admin.initialize_app(credentials.Certificate(cred_path))
+        else:
+            firebase_admin.initialize_app()
+
+    service = FirestoreService(
+        args.project_id,
+        initial_ops_per_second=args.ops_per_second,
+        max_ops_per_second=max(args.ops_per_second, 10000)
+    )
+    for repo in args.repos:
+        if args.tombstones_older_than is not None:
+            purge_tombstones(service, repo, args.tombstones_older_than, dry_run=args.dry_run)
+        else:
+            collections = args.collections.split(',') if args.collections else None
+            purge_repository(service, repo, dry_run=args.dry_run, collections=collections)
@@ -16,13 +16,10 @@ sys.path.append(str(backend_service_dir))
 
 # Import from src
 from src.utils.firebase_utils import find_firebase_credentials
-from src.main import process_repository
+from src.main import join_sharded_sync, plan_repository, process_repository
+from services.sync_profiler import SyncProfiler
+from services.sync_logging import configure_logging
 
-# Configure logging
-logging.basicConfig(
-    level=logging.INFO,
-    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
-)
 logger = logging.getLogger(__name__)
 
 def parse_args():
@@ -33,18 +30,64 @@ def parse_args():
     parser.add_argument('--user-id', help='User ID for logging')
     parser.add_argument('--max-files', type=int, help='Maximum number of files to process')
     parser.add_argument('--skip-types', help='Comma-separated list of file extensions to skip')
+    parser.add_argument('--resume', action='store_true', help='Resume the last interrupted sync for the current commit')
+    parser.add_argument('--plan', action='store_true', help='Estimate API calls, tokens, cost and duration without syncing')
+    parser.add_argument('--shards', type=int, default=1,
+                        help='Split large syncs into up to this many shards that --join workers can claim')
+    parser.add_argument('--join', action='store_true',
+                        help='Work on the shards of the repository\'s running sharded sync')
+    parser.add_argument('--if-running', choices=['join', 'queue'], default='join',
+                        help='If the repository is already being synced, wait for that sync and return its '
+                             'result (join) or sync again after it (queue)')
+    parser.add_argument('--async-firestore', action='store_true', help='Use the async Firestore client for file storage')
+    parser.add_argument('--profile', nargs='?', const='sync-profile', metavar='DIR',
+                        help='Profile the sync and write the report to DIR (default: sync-profile)')
+    parser.add_argument('--trace-file', help='Append the sync\'s trace spans to this file as JSON lines')
+    parser.add_argument('--quiet', action='store_true',
+                        help='Log JSON lines with a summary per batch of files instead of per-file output')
     parser.add_argument('--verbose', action='store_true', help='Enable verbose logging')
     return parser.parse_args()
 
+def print_plan(plan):
+    """Print a sync estimate, followed by the full estimate as JSON"""
+    files = plan['files']
+    print(f"\nSync plan for {plan['repository']} at {plan['target_commit'][:12]}")
+    print(f"Files: {plan['listed_files']} listed, {files['to_process']} to process "
+          f"({files['analyzed']} analyzed), {files['unchanged']} unchanged, "
+          f"{files['resumed']} resumed, {files['deleted']} deleted")
+    print(f"Cache hit ratio: {plan['cache']['hit_ratio']:.1%}")
+    github = plan['github']
+    print(f"GitHub API calls: {github['calls']} ({github['rate_limit']['remaining']} remaining"
+          f"{'' if github['within_rate_limit'] else ', exceeds the remaining budget'})")
+    for model, usage in plan['models'].items():
+        print(f"{model}: {usage['requests']} requests, {usage['prompt_tokens']} prompt tokens, "
+              f"{usage['response_tokens']} response tokens, ${usage['cost_usd']:.2f}")
+    print(f"Estimated duration: {plan['duration_seconds']['total'] / 60:.1f} min "
+          f"(bottleneck: {plan['bottleneck']})")
+    print(json.dumps(plan, indent=2))
+
+def print_profile(report):
+    """Print the highlights of a sync profile and where the full report was written"""
+    print(f"\nProfile of {report['wall_seconds']:.1f}s sync")
+    for name, stage in report['stages'].items():
+        print(f"  {name}: {stage['calls']} calls, {stage['wall_seconds']:.2f}s wall, "
+              f"{stage['total_seconds']:.2f}s total")
+    lag = report['event_loop_lag']
+    print(f"Event loop lag: mean {lag['mean_ms']}ms, p95 {lag['p95_ms']}ms, max {lag['max_ms']}ms")
+    print(f"Peak traced memory: {report['memory']['peak_bytes'] / 2**20:.1f} MiB")
+    for allocation in report['memory']['top_allocations'][:5]:
+        print(f"  {allocation['size_bytes'] / 2**10:.0f} KiB at {allocation['site']}")
+    for name, path in report['files'].items():
+        print(f"{name}: {path}")
+
 async def main():
     """Main entry point"""
-    logger.info("Starting repository sync script")
     args = parse_args()
-    logger.debug(f"Arguments: {sys.argv}")
     
-    # Set verbose logging if requested
-    if args.verbose:
-        logging.getLogger().setLevel(logging.DEBUG)
+    # Per-file debug events are only logged if verbose logging is requested
+    configure_logging('quiet' if args.quiet else None, 'DEBUG' if args.verbose else None)
+    logger.info("Starting repository sync script")
+    logger.debug(f"Arguments: {sys.argv}")
     
     # Load environment variables
     load_dotenv()
@@ -80,20 +123,56 @@ async def main():
     config = {
         'environment': 'development',
         'firebase_project_id': 'qap-ai',
-        'gemini_api_key': os.environ.get('GEMINI_API_KEY')
+        'gemini_api_key': os.environ.get('GEMINI_API_KEY'),
+        'firestore_async': args.async_firestore,
+        'sync_shards': args.shards,
+        'if_running': args.if_running,
+        'trace_export_path': args.trace_file
     }
     
+    if args.plan:
+        plan = plan_repository(
+            repo_full_name=args.repo,
+            account_id=args.account_id,
+            config=config,
+            max_files=args.max_files,
+            skip_types=skip_types,
+            resume=args.resume
+        )
+        print_plan(plan)
+        return
+    
+    if args.join:
+        result = await join_sharded_sync(args.repo, args.account_id, config)
+        print(f"\nSynced shards {result.get('shards')} of sharded sync {result.get('run_id')}")
+        print(f"Status: {result['status']}")
+        if result['status'] == 'error':
+            print(f"Error: {result['error']}")
+        return
+    
+    profiler = SyncProfiler() if args.profile else None
+    if profiler:
+        profiler.start()
+    
     # Process repository
-    result = await process_repository(
-        repo_full_name=args.repo,
-        user_id=args.user_id or 'cli_user',
-        account_id=args.account_id,
-        config=config,
-        max_files=args.max_files,
-        skip_types=skip_types
-    )
+    try:
+        result = await process_repository(
+            repo_full_name=args.repo,
+            user_id=args.user_id or 'cli_user',
+            account_id=args.account_id,
+            config=config,
+            max_files=args.max_files,
+            skip_types=skip_types,
+            resume=args.resume
+        )
+    finally:
+        if profiler:
+            profiler.stop()
+            print_profile(profiler.write_report(args.profile))
     
     print("\nProcessing completed!")
+    if result.get('joined'):
+        print(f"Joined sync run {result['run_id']}, which was already running")
     print(f"Status: {result['status']}")
     if result['status'] == 'error':
         print(f"Error: {result['error']}")
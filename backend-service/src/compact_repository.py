@@ -0,0 +1,167 @@
+#!/usr/bin/env python3
+import argparse
+import sys
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+from typing import Dict
+import firebase_admin
+from firebase_admin import credentials
+
+# Add the backend-service directory to the Python path
+backend_service_dir = Path(__file__).resolve().parent.parent
+sys.path.append(str(backend_service_dir))
+
+from src.utils.firebase_utils import find_firebase_credentials
+from src.services.firestore_service import FirestoreService
+from src.services.metrics_rollup import ROLLUP_COLLECTIONS, group_by_period, rollup_update
+from src.cleanup import document_keys, purge_tombstones
+
+# Default retention policy, in days
+TOMBSTONE_RETENTION_DAYS = 30
+RAW_METRICS_RETENTION_DAYS = 7
+DAILY_METRICS_RETENTION_DAYS = 90
+SYNC_RUN_RETENTION_DAYS = 7
+
+# Source documents deleted per batch, alongside the aggregate update; one
+# batch commits the update and the deletes together, so nothing is counted twice
+ROLLUP_BATCH_SIZE = 400
+
+def rollup_metrics(firestore_service: FirestoreService, repo_ref, source_collection: str, period: str,
+                   timestamp_field: str, cutoff, dry_run: bool = False) -> Dict:
+    """
+    Roll documents older than the cutoff up into period aggregates and delete them
+
+    Args:
+        firestore_service: Firestore service to write with
+        repo_ref: Reference to repository document
+        source_collection: 'metrics' or 'metrics_daily'
+        period: Aggregate period, 'daily' or 'weekly'
+        timestamp_field: Field the cutoff and period are taken from
+        cutoff: Documents before this value are rolled up
+        dry_run: Only count the documents that would be rolled up
+
+    Returns:
+        Dict with 'rolled_up' and 'aggregates' counts
+    """
+    query = repo_ref.collection(source_collection).where(timestamp_field, '<', cutoff)
+    documents = [(doc.reference, doc.to_dict()) for doc in query.stream()]
+    if source_collection == 'metrics_daily':
+        # Daily aggregates are grouped by their period start date
+        documents = [
+            (reference, {**data, 'period_date': datetime.fromisoformat(data['period_start'])})
+            for reference, data in documents
+        ]
+        timestamp_field = 'period_date'
+    groups = group_by_period(documents, period, timestamp_field)
+
+    if not dry_run:
+        aggregates = repo_ref.collection(ROLLUP_COLLECTIONS[period])
+        for start, group in groups.items():
+            for index in range(0, len(group), ROLLUP_BATCH_SIZE):
+                chunk = group[index:index + ROLLUP_BATCH_SIZE]
+                batch = firestore_service.db.batch()
+                batch.set(aggregates.document(start), rollup_update(start, period, [data for _, data in chunk]),
+                          merge=True)
+                for reference, _ in chunk:
+                    batch.delete(reference)
+                batch.commit()
+
+    return {'rolled_up': len(documents), 'aggregates': len(groups)}
+
+def expire_sync_runs(firestore_service: FirestoreService, repo_ref, cutoff, dry_run: bool = False) -> int:
+    """Delete sync run records, with their path chunks, last updated before the cutoff"""
+    runs = list(repo_ref.collection('sync_runs').where('updated_at', '<', cutoff).stream())
+    if dry_run or not runs:
+        return len(runs)
+    bulk_writer, _ = firestore_service.open_bulk_writer()
+    for run in runs:
+        for collection in run.reference.collections():
+            for reference in document_keys(collection):
+                bulk_writer.delete(reference)
+        bulk_writer.delete(run.reference)
+    bulk_writer.close()
+    return len(runs)
+
+def compact_repository(firestore_service: FirestoreService, repo_name: str,
+                       tombstone_days: int = TOMBSTONE_RETENTION_DAYS,
+                       raw_metrics_days: int = RAW_METRICS_RETENTION_DAYS,
+                       daily_metrics_days: int = DAILY_METRICS_RETENTION_DAYS,
+                       sync_run_days: int = SYNC_RUN_RETENTION_DAYS,
+                       dry_run: bool = False) -> Dict:
+    """
+    Apply the retention policy to a repository
+
+    Expires file tombstones, rolls per-sync metrics older than the raw
+    retention into daily aggregates and daily aggregates older than their
+    retention into weekly ones, and removes old sync run records. Weekly
+    aggregates are kept.
+
+    Args:
+        firestore_service: Firestore service to write with
+        repo_name: Repository name (owner/repo)
+        tombstone_days: Days to keep deleted-file tombstones
+        raw_metrics_days: Days to keep per-sync metrics documents
+        daily_metrics_days: Days to keep daily aggregates
+        sync_run_days: Days to keep sync run records
+        dry_run: Only report what would be compacted
+
+    Returns:
+        Dict with the results of each step
+    """
+    repo_id = repo_name.replace('/', '_')
+    repo_ref = firestore_service.db.collection('repositories').document(repo_id)
+    now = datetime.now(timezone.utc)
+
+    result = {
+        'tombstones': purge_tombstones(firestore_service, repo_name, tombstone_days, dry_run=dry_run),
+        'metrics': rollup_metrics(firestore_service, repo_ref, 'metrics', 'daily', 'timestamp',
+                                  now - timedelta(days=raw_metrics_days), dry_run=dry_run),
+        'metrics_daily': rollup_metrics(firestore_service, repo_ref, 'metrics_daily', 'weekly', 'period_start',
+                                        (now - timedelta(days=daily_metrics_days)).date().isoformat(),
+                                        dry_run=dry_run),
+        'sync_runs': expire_sync_runs(firestore_service, repo_ref, now - timedelta(days=sync_run_days),
+                                      dry_run=dry_run)
+    }
+    prefix = 'Dry run: would compact' if dry_run else 'Compacted'
+    print(f"{prefix} {repo_name}: {result['metrics']['rolled_up']} metrics into daily aggregates, "
+          f"{result['metrics_daily']['rolled_up']} daily aggregates into weekly ones, "
+          f"{result['sync_runs']} sync runs expired")
+    return result
+
+def parse_args():
+    """Parse command line arguments"""
+    parser = argparse.ArgumentParser(description='Expire tombstones and roll up sync metrics')
+    parser.add_argument('repos', nargs='*', help='Repository names (owner/repo); all repositories if omitted')
+    parser.add_argument('--project-id', default='qap-ai', help='Firebase project ID')
+    parser.add_argument('--dry-run', action='store_true', help='Only report what would be compacted')
+    parser.add_argument('--tombstone-days', type=int, default=TOMBSTONE_RETENTION_DAYS)
+    parser.add_argument('--raw-metrics-days', type=int, default=RAW_METRICS_RETENTION_DAYS)
+    parser.add_argument('--daily-metrics-days', type=int, default=DAILY_METRICS_RETENTION_DAYS)
+    parser.add_argument('--sync-run-days', type=int, default=SYNC_RUN_RETENTION_DAYS)
+    return parser.parse_args()
+
+if __name__ == '__main__':
+    args = parse_args()
+
+    cred_path = find_firebase_credentials()
+    if not firebase_admin._apps:
+        if cred_path:
+            firebase_admin.initialize_app(credentials.Certificate(cred_path))
+        else:
+            firebase_admin.initialize_app()
+
+    service = FirestoreService(args.project_id)
+    repos = args.repos or [
+        # IDs are owner_repo; any split maps back to the same ID
+        ref.id.replace('_', '/', 1) for ref in service.db.collection('repositories').list_documents()
+    ]
+    for repo in repos:
+        compact_repository(
+            service,
+            repo,
+            tombstone_days=args.tombstone_days,
+            raw_metrics_days=args.raw_metrics_days,
+            daily_metrics_days=args.daily_metrics_days,
+            sync_run_days=args.sync_run_days,
+            dry_run=args.dry_run
+        )
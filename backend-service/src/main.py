@@ -1,15 +1,28 @@
 import json
 import asyncio
-from typing import List, Dict
+import inspect
+from collections import deque
+from typing import List, Dict, NamedTuple
 from pathlib import Path
 from datetime import datetime
-import time
 from tqdm import tqdm  # For progress bars
 import firebase_admin
 from firebase_admin import credentials
-from services.github_service import GitHubService
+from services.github_service import GitHubService, CODE_METADATA_EXTENSIONS
 from services.firestore_service import FirestoreService
+from services.async_firestore_service import AsyncFirestoreService
 from services.gemini_service import GeminiService
+from services.sync_checkpoint import SyncCheckpoint
+from services.progress_reporter import ProgressReporter
+from services.sync_pipeline import PipelineStage, SyncPipeline
+from services.analysis_priority import prioritize_files
+from services.sync_planner import estimate_sync
+from services.sync_lease import SyncLease, acquire_sync_lease, lease_held_by
+from services.sync_shards import (
+    POLL_INTERVAL, ShardedSync, merge_pipeline_metrics, merge_write_stats, shard_count_for, split_shards
+)
+from services.telemetry import CACHE_LOOKUPS, current_span, traced, tracer
+from services.sync_logging import FileLogSummary, SUMMARY_EVERY, get_logger, is_quiet
 import os
 from dotenv import load_dotenv
 from utils.firebase_utils import find_firebase_credentials
@@ -22,8 +35,12 @@ sys.path.append(str(backend_service_dir))
 # Now you can import from src
 from src.utils.firebase_utils import find_firebase_credentials
 
-async def process_file(github_service, gemini_service, repo_full_name: str, file_info: Dict) -> Dict:
-    """Process a single file with rate limiting and retries"""
+logger = get_logger(__name__)
+
+@traced('process_file')
+async def process_file(github_service, gemini_service, repo_full_name: str, file_info: Dict,
+                       content: str = None) -> Dict:
+    """Process a single file with rate limiting and retries, fetching its content if not given"""
     max_retries = 3
     retry_delay = 2  # seconds
     
@@ -34,7 +51,8 @@ async def process_file(github_service, gemini_service, repo_full_name: str, file
                 return file_info
                 
             # Get file content
-            content = github_service.get_file_content(repo_full_name, file_info['path'])
+            if content is None:
+                content = github_service.get_file_content(repo_full_name, file_info['path'])
             
             # Generate AI analysis
             analysis_result = await gemini_service.generate_file_summary(content, file_info['path'])
@@ -46,7 +64,8 @@ async def process_file(github_service, gemini_service, repo_full_name: str, file
             file_info['ai_analysis'] = analysis_result['analysis']
             file_info['analysis_metadata'] = {
                 'generated_at': analysis_result['generated_at'],
-                'model_version': analysis_result['model_version']
+                'model_version': analysis_result['model_version'],
+                'usage': analysis_result.get('usage', {})
             }
             
             # Add searchable fields at root level
@@ -67,13 +86,24 @@ async def process_file(github_service, gemini_service, repo_full_name: str, file
             
         except Exception as e:
             if attempt < max_retries - 1:
-                print(f"Error processing {file_info['path']} (attempt {attempt + 1}): {str(e)}")
-                time.sleep(retry_delay)
+                logger.warning('file_analysis_retry', str(e), path=file_info['path'], attempt=attempt + 1)
+                await asyncio.sleep(retry_delay)
             else:
-                print(f"Failed to process {file_info['path']} after {max_retries} attempts: {str(e)}")
+                logger.warning('file_analysis_failed', str(e), path=file_info['path'], attempts=max_retries)
                 file_info['ai_analysis'] = {'error': str(e)}
                 return file_info
 
+async def _call(func, *args, **kwargs):
+    """
+    Call a storage or GitHub method without blocking the event loop
+
+    Methods of the async storage service are awaited; blocking methods run
+    in a worker thread, so the lease and progress heartbeats keep running.
+    """
+    if inspect.iscoroutinefunction(func):
+        return await func(*args, **kwargs)
+    return await asyncio.to_thread(func, *args, **kwargs)
+
 def should_analyze_file(file_path: str) -> bool:
     """Determine if a file should be analyzed"""
     # Skip directories we don't want to analyze
@@ -93,13 +123,114 @@ def should_analyze_file(file_path: str) -> bool:
     
     return Path(file_path).suffix.lower() in valid_extensions
 
+def init_firebase():
+    """Initialize Firebase once, from a credentials file if one is found"""
+    # Find Firebase credentials
+    cred_path = find_firebase_credentials()
+    
+    # Initialize Firebase only if not already initialized
+    if not firebase_admin._apps:
+        if cred_path:
+            # Initialize Firebase with credentials
+            cred = firebase_admin.credentials.Certificate(cred_path)
+            firebase_admin.initialize_app(cred)
+        else:
+            # Initialize with default credentials
+            firebase_admin.initialize_app()
+
+def diff_repository_files(current_files: List[Dict], snapshot) -> tuple:
+    """
+    Compare the files listed from GitHub with the stored snapshot
+
+    Sets each listed file's 'status' ('new', 'modified', 'unchanged' or
+    'unknown'); unchanged files keep their stored 'last_updated'.
+
+    Args:
+        current_files: Files listed from GitHub
+        snapshot: RepositorySnapshot of the stored files
+
+    Returns:
+        Tuple of (files_to_process, unchanged_files, deleted_paths)
+    """
+    current_files_paths = {f['path'] for f in current_files}
+    
+    # Determine which files need processing
+    files_to_process = []
+    unchanged_files = []
+    
+    for file in current_files:
+        existing_file = snapshot.get(file['path'])
+        should_process = False
+        
+        if existing_file is None:
+            # New file
+            logger.debug('file_new', path=file['path'])
+            file['status'] = 'new'
+            should_process = True
+        else:
+            # Check SHA if available
+            existing_sha = existing_file.sha
+            current_sha = file.get('metadata', {}).get('sha')
+            
+            if existing_sha and current_sha:
+                # We have SHAs to compare
+                if existing_sha != current_sha:
+                    logger.debug('file_modified', path=file['path'])
+                    file['status'] = 'modified'
+                    should_process = True
+                else:
+                    # File exists and hasn't changed; its commit info is not fetched again
+                    file['status'] = 'unchanged'
+                    file['last_updated'] = existing_file.last_updated
+                    unchanged_files.append(file)
+            else:
+                # No SHA, process to be safe
+                logger.debug('file_unknown', path=file['path'])
+                file['status'] = 'unknown'
+                should_process = True
+        
+        if should_process:
+            files_to_process.append(file)
+    
+    # Files that no longer exist are marked deleted by store_repository_files
+    deleted_files = []
+    for existing_file in snapshot.records.values():
+        path = existing_file.path
+        if path and path not in current_files_paths:
+            logger.debug('file_deleted', path=path)
+            deleted_files.append(path)
+    
+    return files_to_process, unchanged_files, deleted_files
+
+def split_resumed(unchanged_files: List[Dict], checkpoint: SyncCheckpoint) -> tuple:
+    """
+    Separate the unchanged files an interrupted run stored from the rest
+
+    Files the interrupted run stored match the snapshot loaded for the
+    resumed sync, so diff_repository_files already counts them as unchanged.
+    A completed path that is still to be processed has no stored document at
+    the listed SHA (its write failed, or the file changed since) and is
+    processed again.
+
+    Returns:
+        Tuple of (unchanged_files, resumed_files)
+    """
+    unchanged = [f for f in unchanged_files if not checkpoint.is_completed(f['path'])]
+    resumed = [f for f in unchanged_files if checkpoint.is_completed(f['path'])]
+    return unchanged, resumed
+
+@traced('sync')
 async def process_repository(
     repo_full_name: str, 
     user_id: str, 
     account_id: str, 
     config: dict,
     max_files: int = None,
-    skip_types: set = None
+    skip_types: set = None,
+    resume: bool = False,
+    github_service: GitHubService = None,
+    gemini_service: GeminiService = None,
+    broadcaster=None
 ):
     """
     Process repository files and generate AI analysis
@@ -111,161 +242,740 @@ async def process_repository(
         config: Configuration dictionary
         max_files: Optional maximum number of files to process
         skip_types: Optional set of file extensions to skip
+        resume: Continue the latest unfinished run for the same commit, skipping
+            files it already stored
+        github_service: Optional GitHub client to reuse; created from the
+            account's token if not given
+        gemini_service: Optional Gemini client to reuse
+        broadcaster: Optional ProgressBroadcaster to publish live progress
+            events to, under the repository ID
+
+    With config 'sync_shards' above 1, large syncs are split into up to
+    that many shards by path hash. This process coordinates: it works on
+    shards alongside workers started with join_sharded_sync, then writes
+    tombstones, the manifest and the merged metrics record.
+
+    Only one sync per repository runs at a time, under a lease on the
+    repository document. While another sync holds it, config 'if_running'
+    decides: 'join' (default) waits and returns that sync's result with
+    'joined' set, 'queue' waits and then syncs.
     """
     try:
-        print(f"Processing repository: {repo_full_name}")
+        logger.info('sync_started', f"Processing repository: {repo_full_name}", repository=repo_full_name)
+        current_span().set_attribute('repository', repo_full_name)
+        if config.get('trace_export_path'):
+            tracer.set_export_path(config['trace_export_path'])
         
-        # Find Firebase credentials
-        cred_path = find_firebase_credentials()
-        
-        # Initialize Firebase only if not already initialized
-        if not firebase_admin._apps:
-            if cred_path:
-                # Initialize Firebase with credentials
-                cred = firebase_admin.credentials.Certificate(cred_path)
-                firebase_admin.initialize_app(cred)
-            else:
-                # Initialize with default credentials
-                firebase_admin.initialize_app()
+        init_firebase()
         
         # Initialize services
-        github_service = GitHubService.create_from_account_id(account_id)
-        firestore_service = FirestoreService(config['firebase_project_id'])
-        gemini_service = GeminiService(config['gemini_api_key'])
+        if github_service is None:
+            github_service = GitHubService.create_from_account_id(account_id)
+        firestore_service = FirestoreService(
+            config['firebase_project_id'],
+            initial_ops_per_second=config.get('firestore_initial_ops_per_second', 500),
+            max_ops_per_second=config.get('firestore_max_ops_per_second', 5000),
+            max_write_attempts=config.get('firestore_max_write_attempts', 10),
+            storage_layout=config.get('storage_layout', 'inline'),
+            analysis_codec=config.get('analysis_codec', 'json')
+        )
+        if gemini_service is None:
+            gemini_service = GeminiService(config['gemini_api_key'])
         
-        # Get repository metadata and store it
+        # Snapshot, symbol and file writes on the async client overlap with analysis
+        storage_service = firestore_service
+        if config.get('firestore_async'):
+            storage_service = AsyncFirestoreService(
+                config['firebase_project_id'],
+                max_write_attempts=config.get('firestore_max_write_attempts', 10),
+                storage_layout=config.get('storage_layout', 'inline'),
+                analysis_codec=config.get('analysis_codec', 'json'),
+                max_concurrent_batches=config.get('firestore_max_concurrent_batches', 25)
+            )
+        
+        # One sync per repository at a time; another request joins its result or
+        # queues behind it (config 'if_running'), and crashed syncs' leases expire
         repo_id = repo_full_name.replace('/', '_')
-        repo_metadata = github_service.get_repository_metadata(repo_full_name)
-        repo_ref = firestore_service.store_repository_metadata(repo_id, repo_metadata)
+        if_running = config.get('if_running', 'join')
         
-        # Get existing files from Firestore
-        existing_files = firestore_service.get_repository_files(repo_ref)
-        existing_files_map = {f['path']: f for f in existing_files}
+        def waiting(held: Dict):
+            # Subscribers learn which run this request is waiting for
+            if broadcaster is not None:
+                broadcaster.publish(repo_id, 'joined' if if_running == 'join' else 'queued', {
+                    'status': 'waiting',
+                    'run_id': held.get('run_id'),
+                    'owner': held.get('owner')
+                })
         
-        # Get current files from GitHub
-        print("Fetching repository files...")
-        current_files = github_service.get_repository_files(repo_full_name, skip_types=skip_types, max_files=max_files)
-        current_files_paths = {f['path'] for f in current_files}
+        sync_lease, joined = await acquire_sync_lease(
+            firestore_service.db.collection('repositories').document(repo_id),
+            if_running=if_running,
+            timeout=config.get('sync_lease_timeout'),
+            on_wait=waiting
+        )
+        if joined is not None:
+            if broadcaster is not None:
+                # The joined run may have published on another instance
+                status = 'completed' if joined['status'] == 'success' else 'error'
+                broadcaster.publish(repo_id, status, {**joined, 'status': status})
+            return joined
+        lease_heartbeat = asyncio.create_task(sync_lease.hold())
         
-        # Determine which files need processing
-        files_to_process = []
-        unchanged_files = []
+        # Get repository metadata and store it
+        repo_metadata = await _call(github_service.get_repository_metadata, repo_full_name)
+        repo_ref = await _call(firestore_service.store_repository_metadata, repo_id, repo_metadata)
+        target_commit = await _call(github_service.get_head_commit, repo_full_name,
+                                    repo_metadata.get('default_branch'))
         
-        for file in current_files:
-            existing_file = existing_files_map.get(file['path'])
-            should_process = False
-            
-            if existing_file is None:
-                # New file
-                print(f"New file found: {file['path']}")
-                file['status'] = 'new'
-                should_process = True
-            else:
-                # Check SHA if available
-                existing_sha = existing_file.get('metadata', {}).get('sha')
-                current_sha = file.get('metadata', {}).get('sha')
-                
-                if existing_sha and current_sha:
-                    # We have SHAs to compare
-                    if existing_sha != current_sha:
-                        print(f"SHA changed for file: {file['path']}")
-                        file['status'] = 'modified'
-                        should_process = True
-                    else:
-                        # File exists and hasn't changed
-                        file['status'] = 'unchanged'
-                        unchanged_files.append(file)
-                else:
-                    # No SHA, process to be safe
-                    print(f"No SHA available, processing: {file['path']}")
-                    file['status'] = 'unknown'
-                    should_process = True
-            
-            if should_process:
-                files_to_process.append(file)
+        # Load a single snapshot of stored files, reused by the diff and the store
+        snapshot = await _call(storage_service.load_repository_snapshot, repo_ref)
+        
+        # Get current files from GitHub; a truncated tree falls back to many blocking calls
+        current_files = await _call(
+            github_service.list_repository_files,
+            repo_full_name,
+            ref=target_commit,
+            skip_types=skip_types,
+            max_files=max_files
+        )
+        files_to_process, unchanged_files, deleted_files = diff_repository_files(current_files, snapshot)
         
-        # Mark files that no longer exist as deleted
-        deleted_files = []
-        for path, existing_file in existing_files_map.items():
-            if path not in current_files_paths:
-                print(f"File no longer exists: {path}")
-                existing_file['status'] = 'deleted'
-                deleted_files.append(existing_file)
+        # Pick up an interrupted run for this commit, or checkpoint a new one
+        checkpoint = await _call(SyncCheckpoint.find_resumable, repo_ref, target_commit) if resume else None
+        if checkpoint:
+            await _call(checkpoint.resume)
+            # Only files whose documents were stored are skipped, via the diff
+            _, resumed_files = split_resumed(unchanged_files, checkpoint)
+            logger.info('sync_resume_diff', f"Resuming with {len(resumed_files)} files already stored",
+                        resumed=len(resumed_files),
+                        retried=sum(1 for f in files_to_process if checkpoint.is_completed(f['path'])))
+        else:
+            checkpoint = await _call(SyncCheckpoint.start, repo_ref, target_commit,
+                                     [f['path'] for f in files_to_process])
+        
+        # Analyze the files with the most impact first, so an interrupted or
+        # time-limited sync has refreshed those before the rest
+        if config.get('analysis_order', 'impact') == 'impact':
+            files_to_process = prioritize_files(files_to_process, snapshot)
         
         total_files = len(files_to_process)
-        print(f"Found {total_files} files that need processing out of {len(current_files)} total files")
-        print(f"Found {len(unchanged_files)} unchanged files")
-        print(f"Found {len(deleted_files)} deleted files")
+        CACHE_LOOKUPS.inc(len(unchanged_files), result='hit')
+        CACHE_LOOKUPS.inc(total_files, result='miss')
+        logger.info(
+            'sync_diff',
+            f"Found {total_files} files that need processing out of {len(current_files)} total files",
+            listed=len(current_files),
+            to_process=total_files,
+            unchanged=len(unchanged_files),
+            deleted=len(deleted_files)
+        )
         
-        # Update initial progress
-        firestore_service.update_sync_status(
-            repo_ref, 
+        # Report progress in the background, coalescing updates by time and delta
+        progress_reporter = ProgressReporter(
+            firestore_service,
+            repo_ref,
+            total_files,
+            min_interval=config.get('progress_min_interval', 5.0),
+            min_delta=config.get('progress_min_delta', 0.05),
+            broadcaster=broadcaster,
+            topic=repo_id
+        )
+        await _call(
+            firestore_service.update_sync_status,
+            repo_ref,
             'in_progress',
-            progress={'processed': 0, 'total': total_files}
+            progress=progress_reporter.snapshot()
         )
+        progress_reporter.start()
         
-        # Process only changed files
-        processed_files = []
-        with tqdm(total=total_files, desc="Analyzing files") as pbar:
-            for i, file in enumerate(files_to_process):
-                try:
-                    processed_file = await process_file(
-                        github_service, 
-                        gemini_service, 
-                        repo_full_name, 
-                        file
-                    )
-                    processed_files.append(processed_file)
-                    pbar.update(1)
-                    
-                    # Update progress in Firestore every 10 files or at the end
-                    if (i + 1) % 10 == 0 or (i + 1) == total_files:
-                        try:
-                            firestore_service.update_sync_status(
-                                repo_ref, 
-                                'in_progress',
-                                progress={
-                                    'processed': len(processed_files),
-                                    'total': total_files
-                                }
-                            )
-                        except Exception as e:
-                            print(f"Warning: Failed to update progress: {str(e)}")
-                except Exception as e:
-                    print(f"Error processing file {file['path']}: {str(e)}")
-                    # Add file with error information
-                    file['ai_analysis'] = {'error': str(e)}
-                    processed_files.append(file)
+        # Only the work lists are kept; processed files are released as they are written
+        del current_files
         
-        # Add unchanged files to processed_files
-        processed_files.extend(unchanged_files)
+        # Split large syncs into shards that other workers can claim
+        shard_count = shard_count_for(total_files, config.get('sync_shards', 1))
+        shard_run = None
+        if shard_count > 1:
+            shard_run = await _call(ShardedSync.start, repo_ref, target_commit, shard_count, {
+                'max_files': max_files,
+                'skip_types': sorted(skip_types) if skip_types else None
+            }, lease_run_id=sync_lease.run_id)
         
-        # Add deleted files to processed_files
-        processed_files.extend(deleted_files)
+        # Symbols of files about to be overwritten or tombstoned, for the index delta;
+        # the shard writers load those of their own files
+        previous_symbols = await _call(
+            storage_service.load_previous_symbols,
+            repo_ref,
+            snapshot,
+            ([] if shard_run else [f['path'] for f in files_to_process if f['path'] in snapshot]) + deleted_files
+        )
         
-        # Store all files (processed, unchanged, and deleted)
-        print("\nStoring results in Firestore...")
-        firestore_service.store_repository_files(repo_ref, processed_files)
-        firestore_service.update_sync_status(repo_ref, 'completed')
+        # Stream each result to Firestore as soon as it is ready
+        file_writer = await _call(
+            storage_service.open_file_writer,
+            repo_ref,
+            snapshot,
+            max_pending=config.get('firestore_max_pending_writes', 200),
+            on_flush=checkpoint.save_stored,
+            previous_symbols=previous_symbols
+        )
         
-        print(f"\nCompleted processing {total_files} files")
-        return {
+        # Unchanged files only count towards stats, or restore tombstoned documents
+        if inspect.iscoroutinefunction(file_writer.write):
+            for file in unchanged_files:
+                await file_writer.write(file)
+        else:
+            def write_unchanged():
+                for file in unchanged_files:
+                    file_writer.write(file)
+            # One worker thread for all of them; their flushes wait on the BulkWriter
+            await asyncio.to_thread(write_unchanged)
+        
+        # Changed files flow through fetch -> extract -> analyze -> persist stages
+        # with bounded queues in between, so at most a few queues' worth of
+        # file contents are held in memory at once
+        # One summary record per N files replaces per-file output in quiet mode
+        log_summary = FileLogSummary(logger, total_files, every=config.get('log_summary_every', SUMMARY_EVERY))
+        with tqdm(total=total_files, desc="Analyzing files", disable=is_quiet()) as pbar:
+            if shard_run:
+                # Shard writers store the changed files; this writer only accounts for them
+                for file in files_to_process:
+                    file_writer.mark_stored(file)
+                shard_results = await coordinate_shards(
+                    shard_run,
+                    split_shards(files_to_process, shard_count),
+                    ShardContext(github_service, gemini_service, storage_service, repo_full_name, repo_ref,
+                                 snapshot, target_commit, config, checkpoint, progress_reporter, pbar,
+                                 log_summary, sync_lease)
+                )
+                del files_to_process
+                pipeline_metrics = merge_pipeline_metrics(
+                    [result['pipeline'] for result in shard_results if result['worker'] == shard_run.worker_id]
+                )
+            else:
+                pipeline = build_sync_pipeline(
+                    github_service,
+                    gemini_service,
+                    repo_full_name,
+                    target_commit,
+                    config,
+                    file_writer,
+                    progress_reporter,
+                    pbar,
+                    log_summary,
+                    sync_lease=sync_lease
+                )
+                progress_reporter.stage_metrics = pipeline.metrics
+                # Files are released from the work list as the pipeline takes them
+                files_to_process = deque(files_to_process)
+                await pipeline.run(files_to_process.popleft() for _ in range(total_files))
+                pipeline_metrics = pipeline.metrics()
+        log_summary.report()
+        for stage_name, stage in pipeline_metrics.items():
+            logger.info('pipeline_stage', f"Stage {stage_name}: {stage['processed']} files, "
+                        f"{stage['workers']} workers, {stage['utilisation']:.0%} utilised",
+                        stage=stage_name, **stage)
+        
+        # Tombstone missing files, wait for pending writes and store the summary
+        sync_lease.check()
+        result = await _call(file_writer.close)
+        file_writer = None
+        if shard_run:
+            # The metrics record covers the writes of every shard
+            result['writes'] = merge_write_stats([result['writes']] + [r['writes'] for r in shard_results])
+            result['shards'] = {
+                'run_id': shard_run.run_id,
+                'count': shard_count,
+                'workers': len({r['worker'] for r in shard_results})
+            }
+        await _call(storage_service.store_sync_summary, repo_ref, result)
+        if shard_run:
+            await _call(shard_run.finish, 'completed')
+        await _call(checkpoint.finish, 'completed')
+        await progress_reporter.close('completed')
+        
+        logger.info('sync_completed', f"Completed processing {total_files} files",
+                    repository=repo_full_name, processed=total_files, shards=shard_count)
+        result = {
             'status': 'success',
             'repository': repo_metadata,
             'file_count': total_files,
-            'changed_files': total_files
+            'changed_files': total_files,
+            'shards': shard_count,
+            'pipeline': pipeline_metrics
         }
+        await release_sync_lease(sync_lease, lease_heartbeat, result)
+        return result
         
     except Exception as e:
         import traceback
         error_msg = f"{str(e)}\n{traceback.format_exc()}"
-        print(f"\nError: {error_msg}")
-        if 'repo_ref' in locals() and 'firestore_service' in locals():
-            firestore_service.update_sync_status(repo_ref, 'error', error=error_msg)
-        return {
+        logger.exception('sync_failed', str(e), repository=repo_full_name)
+        # The sync that took the lease over owns the repository's files and status now
+        lease_lost = locals().get('sync_lease') is not None and sync_lease.lost
+        if locals().get('file_writer') is not None and not lease_lost:
+            # Keep the files that finished before the failure
+            try:
+                await _call(file_writer.flush)
+            except Exception as flush_error:
+                logger.warning('flush_failed', f"Failed to flush pending writes: {str(flush_error)}")
+        if locals().get('shard_run') is not None:
+            # Workers stop joining; shards already stored are unchanged for the next sync
+            try:
+                await _call(shard_run.finish, 'failed', error=str(e))
+            except Exception as shard_error:
+                logger.warning('shard_run_failed', f"Failed to close sharded sync: {str(shard_error)}")
+        if locals().get('checkpoint') is not None:
+            # Leave the run resumable from its last saved progress
+            try:
+                await _call(checkpoint.finish, 'failed', error=str(e))
+            except Exception as checkpoint_error:
+                logger.warning('checkpoint_failed', f"Failed to save checkpoint: {str(checkpoint_error)}")
+        if locals().get('progress_reporter') is not None:
+            # Final state carries the progress reached before the failure
+            try:
+                await progress_reporter.close('error', error=error_msg, write=not lease_lost)
+            except Exception as status_error:
+                logger.warning('status_update_failed', f"Failed to update sync status: {str(status_error)}")
+        else:
+            if 'repo_ref' in locals() and 'firestore_service' in locals() and not lease_lost:
+                await _call(firestore_service.update_sync_status, repo_ref, 'error', error=error_msg)
+            if broadcaster is not None:
+                # Subscribers are waiting for a final event
+                broadcaster.publish(repo_full_name.replace('/', '_'), 'error', {'status': 'error', 'error': error_msg})
+        result = {
             'status': 'error',
             'error': error_msg
         }
+        if locals().get('lease_heartbeat') is not None:
+            # Requests that joined this sync get the error too
+            await release_sync_lease(sync_lease, lease_heartbeat, result)
+        return result
+    
+    finally:
+        if locals().get('storage_service') is not None:
+            await close_storage_service(storage_service)
+
+async def close_storage_service(storage_service):
+    """Close an async storage service's client, whose channel is bound to this sync's event loop"""
+    if not isinstance(storage_service, AsyncFirestoreService):
+        return
+    try:
+        await storage_service.close()
+    except Exception as e:
+        logger.warning('storage_close_failed', f"Failed to close async Firestore client: {str(e)}")
+
+async def release_sync_lease(sync_lease: SyncLease, heartbeat: asyncio.Task, result: Dict):
+    """Stop renewing the repository's sync lease and release it with the sync's result"""
+    heartbeat.cancel()
+    if sync_lease.lost:
+        # Joined requests follow the sync that took the lease over
+        return
+    try:
+        await asyncio.to_thread(sync_lease.release, result)
+    except Exception as e:
+        # The lease expires on its own
+        logger.warning('sync_lease_release_failed', f"Failed to release sync lease: {str(e)}",
+                       run_id=sync_lease.run_id)
+
+class ShardContext(NamedTuple):
+    """Services and sync state a worker syncs its claimed shards with"""
+    github_service: GitHubService
+    gemini_service: GeminiService
+    storage_service: object
+    repo_full_name: str
+    repo_ref: object
+    snapshot: object
+    target_commit: str
+    config: dict
+    checkpoint: SyncCheckpoint = None
+    progress_reporter: ProgressReporter = None
+    pbar: object = None
+    log_summary: FileLogSummary = None
+    sync_lease: SyncLease = None
+
+async def sync_shard(context: ShardContext, shard_run: ShardedSync, index: int, files: List[Dict]) -> Dict:
+    """
+    Fetch, analyze and store the files of one claimed shard
+
+    The shard's writer only stores its files and their symbols; tombstones
+    and the manifest are written by the coordinator. The shard's lease is
+    renewed while it runs.
+
+    Returns:
+        Dict with 'processed', 'writes', 'pipeline' and 'worker', recorded on
+        the shard for the coordinator
+    """
+    previous_symbols = await _call(
+        context.storage_service.load_previous_symbols,
+        context.repo_ref,
+        context.snapshot,
+        [f['path'] for f in files if f['path'] in context.snapshot]
+    )
+    file_writer = await _call(
+        context.storage_service.open_file_writer,
+        context.repo_ref,
+        context.snapshot,
+        max_pending=context.config.get('firestore_max_pending_writes', 200),
+        on_flush=context.checkpoint.save_stored if context.checkpoint else None,
+        previous_symbols=previous_symbols,
+        partial=True
+    )
+    pipeline = build_sync_pipeline(
+        context.github_service,
+        context.gemini_service,
+        context.repo_full_name,
+        context.target_commit,
+        context.config,
+        file_writer,
+        context.progress_reporter,
+        context.pbar,
+        context.log_summary,
+        sync_lease=context.sync_lease
+    )
+    if context.progress_reporter is not None:
+        context.progress_reporter.stage_metrics = pipeline.metrics
+    persist = pipeline.stages[-1]
+    heartbeat = asyncio.create_task(shard_run.hold(index, lambda: persist.processed))
+    try:
+        await pipeline.run(files)
+        if context.sync_lease is not None:
+            context.sync_lease.check()
+        result = await _call(file_writer.close)
+    except Exception:
+        # Keep the files that finished before the failure
+        try:
+            await _call(file_writer.flush)
+        except Exception as flush_error:
+            logger.warning('flush_failed', f"Failed to flush pending writes: {str(flush_error)}")
+        raise
+    finally:
+        heartbeat.cancel()
+    return {
+        'processed': len(files),
+        'writes': result['writes'],
+        'pipeline': pipeline.metrics(),
+        'worker': shard_run.worker_id
+    }
+
+async def sync_claimed_shards(shard_run: ShardedSync, shards: List[List[Dict]],
+                              context: ShardContext) -> Dict[int, Dict]:
+    """
+    Claim and sync shards until none are left to claim
+
+    A shard that fails is released, so another worker can retry it. Workers
+    that joined hold no sync lease of their own; they stop claiming once the
+    coordinator's sync no longer holds the repository's lease, and the shard
+    leases keep them from storing a shard another worker has taken over.
+
+    Returns:
+        Dict of shard index to result, for the shards synced here
+    """
+    results = {}
+    while True:
+        if context.sync_lease is None and shard_run.lease_run_id and \
+                not await asyncio.to_thread(lease_held_by, context.repo_ref, shard_run.lease_run_id):
+            logger.warning('shard_run_abandoned', f"Sync {shard_run.lease_run_id} no longer holds the lease",
+                           run_id=shard_run.run_id)
+            return results
+        index = await asyncio.to_thread(shard_run.claim)
+        if index is None:
+            return results
+        try:
+            result = await sync_shard(context, shard_run, index, shards[index])
+        except Exception as e:
+            await asyncio.to_thread(shard_run.release, index, str(e))
+            raise
+        if not await asyncio.to_thread(shard_run.complete, index, result):
+            logger.warning('shard_result_discarded', f"Shard {index} was claimed by another worker",
+                           run_id=shard_run.run_id, shard=index)
+        results[index] = result
+
+async def coordinate_shards(shard_run: ShardedSync, shards: List[List[Dict]], context: ShardContext) -> List[Dict]:
+    """
+    Sync shards alongside the other workers, then wait until all are stored
+
+    Shards whose worker died are claimed again here once their lease
+    expires, and files stored by other workers count towards the sync's
+    progress.
+
+    Returns:
+        The result of every shard
+
+    Raises:
+        RuntimeError: If a shard failed on every attempt
+    """
+    own = await sync_claimed_shards(shard_run, shards, context)
+    reported = 0
+    while True:
+        states = await asyncio.to_thread(shard_run.load_shards)
+        failed = [state['index'] for state in states if state['status'] == 'failed']
+        if failed:
+            raise RuntimeError(f"Shards {failed} of sharded sync {shard_run.run_id} failed")
+        others = sum(state.get('processed', 0) for state in states if state['index'] not in own)
+        if others > reported:
+            context.progress_reporter.update(processed=others - reported)
+            context.pbar.update(others - reported)
+            reported = others
+        if all(state['status'] == 'completed' for state in states):
+            return [state['result'] for state in states]
+        await asyncio.sleep(POLL_INTERVAL)
+        own.update(await sync_claimed_shards(shard_run, shards, context))
+
+@traced('sync_shards')
+async def join_sharded_sync(
+    repo_full_name: str,
+    account_id: str,
+    config: dict,
+    github_service: GitHubService = None,
+    gemini_service: GeminiService = None
+) -> Dict:
+    """
+    Work on the running sharded sync of a repository, if there is one
+
+    Lists and diffs the repository at the run's target commit like its
+    coordinator, then claims and syncs shards until none are left. Status,
+    tombstones, the manifest and the metrics record are left to the
+    coordinator started by process_repository, and so is the repository's
+    sync lease: workers stop claiming shards once the coordinator loses it.
+
+    Args:
+        repo_full_name: Full repository name (owner/repo)
+        account_id: Account ID for GitHub token
+        config: Configuration dictionary
+        github_service: Optional GitHub client to reuse
+        gemini_service: Optional Gemini client to reuse
+
+    Returns:
+        Dict with 'status', 'run_id', 'shards' (the indices synced here) and
+        'changed_files'
+    """
+    try:
+        init_firebase()
+        if github_service is None:
+            github_service = GitHubService.create_from_account_id(account_id)
+        firestore_service = FirestoreService(
+            config['firebase_project_id'],
+            initial_ops_per_second=config.get('firestore_initial_ops_per_second', 500),
+            max_ops_per_second=config.get('firestore_max_ops_per_second', 5000),
+            max_write_attempts=config.get('firestore_max_write_attempts', 10),
+            storage_layout=config.get('storage_layout', 'inline'),
+            analysis_codec=config.get('analysis_codec', 'json')
+        )
+        if gemini_service is None:
+            gemini_service = GeminiService(config['gemini_api_key'])
+        storage_service = firestore_service
+        if config.get('firestore_async'):
+            storage_service = AsyncFirestoreService(
+                config['firebase_project_id'],
+                max_write_attempts=config.get('firestore_max_write_attempts', 10),
+                storage_layout=config.get('storage_layout', 'inline'),
+                analysis_codec=config.get('analysis_codec', 'json'),
+                max_concurrent_batches=config.get('firestore_max_concurrent_batches', 25)
+            )
+        
+        repo_ref = firestore_service.db.collection('repositories').document(repo_full_name.replace('/', '_'))
+        shard_run = await _call(ShardedSync.find_active, repo_ref)
+        if shard_run is None:
+            logger.info('shard_run_not_found', f"No sharded sync running for {repo_full_name}",
+                        repository=repo_full_name)
+            return {'status': 'success', 'run_id': None, 'shards': [], 'changed_files': 0}
+        
+        # List and diff exactly like the coordinator, so every file falls in the same shard
+        snapshot = await _call(storage_service.load_repository_snapshot, repo_ref)
+        skip_types = shard_run.options.get('skip_types')
+        current_files = await _call(
+            github_service.list_repository_files,
+            repo_full_name,
+            ref=shard_run.target_commit,
+            skip_types=set(skip_types) if skip_types else None,
+            max_files=shard_run.options.get('max_files')
+        )
+        # Files other workers already stored show up as unchanged and are skipped
+        files_to_process, _, _ = diff_repository_files(current_files, snapshot)
+        del current_files
+        
+        context = ShardContext(github_service, gemini_service, storage_service, repo_full_name, repo_ref,
+                               snapshot, shard_run.target_commit, config)
+        results = await sync_claimed_shards(
+            shard_run,
+            split_shards(files_to_process, shard_run.shard_count),
+            context
+        )
+        changed_files = sum(result['processed'] for result in results.values())
+        logger.info('shard_sync_completed', f"Synced {len(results)} shards ({changed_files} files) "
+                    f"of sharded sync {shard_run.run_id}",
+                    repository=repo_full_name, run_id=shard_run.run_id, shards=len(results))
+        return {
+            'status': 'success',
+            'run_id': shard_run.run_id,
+            'shards': sorted(results),
+            'changed_files': changed_files
+        }
+    
+    except Exception as e:
+        import traceback
+        logger.exception('shard_sync_failed', str(e), repository=repo_full_name)
+        return {
+            'status': 'error',
+            'error': f"{str(e)}\n{traceback.format_exc()}"
+        }
+    
+    finally:
+        if locals().get('storage_service') is not None:
+            await close_storage_service(storage_service)
+
+def plan_repository(
+    repo_full_name: str,
+    account_id: str,
+    config: dict,
+    max_files: int = None,
+    skip_types: set = None,
+    resume: bool = False,
+    github_service: GitHubService = None
+) -> Dict:
+    """
+    Estimate a sync without running it
+
+    Lists the repository and diffs it against the stored files like
+    process_repository, but fetches no content, calls no model and writes
+    nothing.
+
+    Args:
+        repo_full_name: Full repository name (owner/repo)
+        account_id: Account ID for GitHub token
+        config: Configuration dictionary
+        max_files: Optional maximum number of files to list
+        skip_types: Optional set of file extensions to skip
+        resume: Plan a sync that resumes the latest unfinished run, which
+            skips the files that run already stored
+        github_service: Optional GitHub client to reuse
+
+    Returns:
+        Estimate from estimate_sync, with the repository, target commit,
+        listed file count and the GitHub rate limit
+    """
+    init_firebase()
+    if github_service is None:
+        github_service = GitHubService.create_from_account_id(account_id)
+    firestore_service = FirestoreService(config['firebase_project_id'])
+    
+    repo_ref = firestore_service.db.collection('repositories').document(repo_full_name.replace('/', '_'))
+    repo_metadata = github_service.get_repository_metadata(repo_full_name)
+    target_commit = github_service.get_head_commit(repo_full_name, repo_metadata.get('default_branch'))
+    snapshot = firestore_service.load_repository_snapshot(repo_ref)
+    current_files = github_service.list_repository_files(
+        repo_full_name,
+        ref=target_commit,
+        skip_types=skip_types,
+        max_files=max_files
+    )
+    files_to_process, unchanged_files, deleted_files = diff_repository_files(current_files, snapshot)
+    
+    # Files an interrupted run already stored are skipped by a resumed sync
+    checkpoint = SyncCheckpoint.find_resumable(repo_ref, target_commit) if resume else None
+    resumed = []
+    if checkpoint:
+        unchanged_files, resumed = split_resumed(unchanged_files, checkpoint)
+    
+    plan = estimate_sync(
+        files_to_process,
+        should_analyze_file,
+        lambda path: should_analyze_file(path) or Path(path).suffix.lower() in CODE_METADATA_EXTENSIONS,
+        unchanged=len(unchanged_files),
+        resumed=len(resumed),
+        # Files already tombstoned by an earlier sync are not written again
+        deleted=sum(1 for path in deleted_files if snapshot.get(path).status != 'deleted'),
+        config=config
+    )
+    rate_limit = github_service.get_rate_limit()
+    plan['github']['rate_limit'] = rate_limit
+    # Beyond the remaining budget the sync waits for the hourly reset
+    plan['github']['within_rate_limit'] = plan['github']['calls'] <= rate_limit['remaining']
+    return {
+        'repository': repo_full_name,
+        'target_commit': target_commit,
+        'listed_files': len(current_files),
+        **plan
+    }
+
+def build_sync_pipeline(github_service, gemini_service, repo_full_name: str, ref: str, config: dict,
+                        file_writer, progress_reporter, pbar, log_summary=None,
+                        sync_lease: SyncLease = None) -> SyncPipeline:
+    """
+    Build the staged pipeline that fetches, extracts, analyzes and persists changed files
+
+    Worker counts and the queue size between stages come from the config
+    ('pipeline_fetch_workers', 'pipeline_extract_workers',
+    'pipeline_analyze_workers', 'pipeline_queue_size'). The progress
+    reporter and progress bar are optional; the checkpoint is saved by the
+    file writer's flushes. With the repository's sync lease, nothing more is
+    stored once another sync has taken it over.
+    """
+    def fetch(file: Dict) -> Dict:
+        # Blocking GitHub calls; runs in a worker thread
+        extension = Path(file['path']).suffix.lower()
+        file['last_updated'] = None
+        file['last_commit_message'] = None
+        try:
+            last_commit = github_service.get_last_commit(repo_full_name, file['path'], ref=ref)
+            file['last_updated'] = last_commit['date'] if last_commit else None
+            file['last_commit_message'] = last_commit['message'] if last_commit else None
+            if should_analyze_file(file['path']) or extension in CODE_METADATA_EXTENSIONS:
+                file['content'] = github_service.get_blob_content(repo_full_name, file['metadata']['sha'])
+        except Exception as e:
+            logger.warning('file_fetch_failed', str(e), path=file['path'])
+            file['ai_analysis'] = {'error': str(e)}
+        return file
+
+    def extract(file: Dict) -> Dict:
+        extension = Path(file['path']).suffix.lower()
+        if file.get('content') is not None and extension in CODE_METADATA_EXTENSIONS:
+            try:
+                file.update(github_service.extract_code_metadata(file['content'], extension))
+            except Exception as e:
+                logger.warning('metadata_extraction_failed', str(e), path=file['path'])
+        return file
+
+    async def analyze(file: Dict) -> Dict:
+        content = file.pop('content', None)
+        if content is None:
+            # Content could not be fetched; the error is stored with the file
+            return file
+        try:
+            return await process_file(github_service, gemini_service, repo_full_name, file, content=content)
+        except Exception as e:
+            logger.warning('file_analysis_failed', str(e), path=file['path'])
+            # Store file with error information
+            file['ai_analysis'] = {'error': str(e)}
+            return file
+
+    async def persist(file: Dict):
+        if sync_lease is not None:
+            sync_lease.check()
+        if inspect.iscoroutinefunction(file_writer.write):
+            await file_writer.write(file)
+        else:
+            # The sync writer's flushes wait on the BulkWriter and save the
+            # checkpoint; off the loop they don't stall analysis or heartbeats
+            await asyncio.to_thread(file_writer.write, file)
+        if pbar is not None:
+            pbar.update(1)
+        if log_summary is not None:
+            log_summary.add(file)
+        if progress_reporter is not None:
+            progress_reporter.update(
+                tokens=file.get('analysis_metadata', {}).get('usage', {}).get('total_tokens', 0),
+                path=file['path']
+            )
+        return file
+
+    return SyncPipeline([
+        PipelineStage('fetch', fetch, workers=config.get('pipeline_fetch_workers', 8), blocking=True),
+        PipelineStage('extract', extract, workers=config.get('pipeline_extract_workers', 1), blocking=True),
+        PipelineStage('analyze', analyze, workers=config.get('pipeline_analyze_workers', 4)),
+        # A single writer keeps checkpoint and progress updates in order
+        PipelineStage('persist', persist, workers=1)
+    ], queue_size=config.get('pipeline_queue_size', 50))
 
 def init_firestore_dev(config):
     """Initialize Firestore for development"""
@@ -314,7 +1024,8 @@ def cloud_function_handler(repo_full_name: str, user_id: str, account_id: str):
         'firebase_project_id': 'qap-ai',
         'gemini_api_key': get_secret('GEMINI_API_KEY')
     }
-    return process_repository(repo_full_name, user_id, account_id, config)
+    # Invocations that hit the execution time limit continue on the next call
+    return process_repository(repo_full_name, user_id, account_id, config, resume=True)
 
 if __name__ == '__main__':
     import dotenv
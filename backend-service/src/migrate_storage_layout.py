@@ -0,0 +1,103 @@
+#!/usr/bin/env python3
+import argparse
+import sys
+from pathlib import Path
+import firebase_admin
+from firebase_admin import credentials, firestore
+
+# Add the backend-service directory to the Python path
+backend_service_dir = Path(__file__).resolve().parent.parent
+sys.path.append(str(backend_service_dir))
+
+from src.utils.firebase_utils import find_firebase_credentials
+from src.services.firestore_service import FirestoreService, ANALYSIS_FIELDS, split_file_document
+
+# File documents migrated per page; each page is flushed before the next is read
+PAGE_SIZE = 500
+
+def migrate_repository(firestore_service: FirestoreService, repo_name: str, dry_run: bool = False) -> dict:
+    """
+    Move a repository's file documents to the split storage layout
+
+    Analysis fields are copied to repositories/{repo_id}/analyses/{doc_id}
+    and flushed before they are removed from the file documents, so an
+    interrupted migration never loses data and can simply be run again.
+
+    Args:
+        firestore_service: Firestore service to write with
+        repo_name: Repository name (owner/repo)
+        dry_run: Only count the documents that would be migrated
+
+    Returns:
+        Dict with counts of scanned and migrated file documents
+    """
+    repo_id = repo_name.replace('/', '_')
+    repo_ref = firestore_service.db.collection('repositories').document(repo_id)
+    files_collection = repo_ref.collection('files')
+    analyses_collection = repo_ref.collection('analyses')
+
+    counts = {'scanned': 0, 'migrated': 0}
+    bulk_writer, write_stats = (None, None) if dry_run else firestore_service.open_bulk_writer()
+
+    def migrate_page(page):
+        # Copy analyses first and wait, then strip them from the file documents
+        for doc_id, analysis_document in page:
+            bulk_writer.set(analyses_collection.document(doc_id), analysis_document)
+        bulk_writer.flush()
+        for doc_id, _ in page:
+            stripped = {field: firestore.DELETE_FIELD for field in ANALYSIS_FIELDS}
+            stripped['has_analysis'] = True
+            bulk_writer.update(files_collection.document(doc_id), stripped)
+        bulk_writer.flush()
+
+    page = []
+    for doc in files_collection.stream():
+        counts['scanned'] += 1
+        _, analysis_document = split_file_document(doc.to_dict())
+        if not analysis_document:
+            continue
+        counts['migrated'] += 1
+        if dry_run:
+            continue
+        page.append((doc.id, analysis_document))
+        if len(page) >= PAGE_SIZE:
+            migrate_page(page)
+            page = []
+            print(f"Migrated {counts['migrated']} files...")
+
+    if dry_run:
+        print(f"Dry run: {counts['migrated']} of {counts['scanned']} files would be migrated")
+        return counts
+
+    if page:
+        migrate_page(page)
+    bulk_writer.close()
+
+    repo_ref.set({'metadata': {'storage_layout': 'split'}}, merge=True)
+    writes = write_stats.to_dict()
+    counts['failed_writes'] = writes['failed']
+    print(f"Migrated {counts['migrated']} of {counts['scanned']} files for {repo_name} "
+          f"({writes['failed']} failed writes)")
+    return counts
+
+def parse_args():
+    """Parse command line arguments"""
+    parser = argparse.ArgumentParser(description='Move repositories to the split analysis storage layout')
+    parser.add_argument('repos', nargs='+', help='Repository names (owner/repo)')
+    parser.add_argument('--project-id', default='qap-ai', help='Firebase project ID')
+    parser.add_argument('--dry-run', action='store_true', help='Only report what would be migrated')
+    return parser.parse_args()
+
+if __name__ == '__main__':
+    args = parse_args()
+
+    cred_path = find_firebase_credentials()
+    if not firebase_admin._apps:
+        if cred_path:
+            firebase_admin.initialize_app(credentials.Certificate(cred_path))
+        else:
+            firebase_admin.initialize_app()
+
+    service = FirestoreService(args.project_id)
+    for repo in args.repos:
+        migrate_repository(service, repo, dry_run=args.dry_run)
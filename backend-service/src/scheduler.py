@@ -0,0 +1,241 @@
+#!/usr/bin/env python3
+import argparse
+import asyncio
+import json
+import multiprocessing
+import os
+import sys
+import time
+import traceback
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+from typing import Dict, List
+import firebase_admin
+from firebase_admin import credentials, firestore
+from dotenv import load_dotenv
+
+# Add the backend-service directory to the Python path
+backend_service_dir = Path(__file__).resolve().parent.parent
+sys.path.append(str(backend_service_dir))
+
+from src.utils.firebase_utils import find_firebase_credentials
+from src.main import process_repository
+from services.github_service import GitHubService
+from services.gemini_service import GeminiService
+from services.rate_limits import SharedLimits
+from services.sync_scheduler import FairShareQueue, due_repositories, repository_job, run_report
+from services.sync_logging import configure_logging, get_logger
+
+logger = get_logger(__name__)
+
+# Repositories synced longer ago than this are due for refresh
+DEFAULT_REFRESH_HOURS = 24
+
+# Per-process state of a worker: run config, shared limits and clients
+# reused across the repositories the worker syncs
+_worker = {}
+
+def _init_firebase():
+    cred_path = find_firebase_credentials()
+    if not firebase_admin._apps:
+        if cred_path:
+            firebase_admin.initialize_app(credentials.Certificate(cred_path))
+        else:
+            firebase_admin.initialize_app()
+
+def _init_worker(config: Dict, limits: SharedLimits):
+    # Workers are spawned, so they set up logging from LOG_MODE and LOG_LEVEL themselves
+    configure_logging()
+    _init_firebase()
+    _worker.update(config=config, limits=limits, github={}, gemini=None)
+
+def _worker_services(account_id: str):
+    """GitHub client of the account and the process' Gemini client, created once per worker"""
+    limits = _worker['limits']
+    github_service = _worker['github'].get(account_id)
+    if github_service is None:
+        github_service = GitHubService.create_from_account_id(account_id)
+        limits.apply(account_id, github_service=github_service)
+        _worker['github'][account_id] = github_service
+    if _worker['gemini'] is None:
+        _worker['gemini'] = GeminiService(_worker['config']['gemini_api_key'])
+        limits.apply(gemini_service=_worker['gemini'])
+    return github_service, _worker['gemini']
+
+def sync_repository(job: Dict) -> Dict:
+    """Sync one repository in a worker process; returns its report entry"""
+    started_at = time.monotonic()
+    try:
+        github_service, gemini_service = _worker_services(job['account_id'])
+        result = asyncio.run(process_repository(
+            job['repo'],
+            'scheduler',
+            job['account_id'],
+            _worker['config'],
+            max_files=_worker['config'].get('max_files'),
+            skip_types=_worker['config'].get('skip_types'),
+            # A sync cut short by a previous run continues where it stopped
+            resume=True,
+            github_service=github_service,
+            gemini_service=gemini_service
+        ))
+    except Exception as e:
+        result = {'status': 'error', 'error': f"{str(e)}\n{traceback.format_exc()}"}
+    return _entry(job, result, time.monotonic() - started_at)
+
+def _entry(job: Dict, result: Dict, duration: float) -> Dict:
+    entry = {
+        **job,
+        'status': result['status'],
+        'duration_seconds': round(duration, 3),
+        'changed_files': result.get('changed_files', 0)
+    }
+    if result['status'] != 'success':
+        # The first line is enough for the report; the worker logged the traceback
+        entry['error'] = result.get('error', '').split('\n', 1)[0]
+    if result.get('pipeline'):
+        entry['pipeline'] = result['pipeline']
+    return entry
+
+def run_scheduler(jobs: List[Dict], config: Dict, workers: int = 4, github_requests_per_hour: int = 4500,
+                  model_concurrency: int = 8, model_requests_per_minute: int = None) -> Dict:
+    """
+    Sync repositories across a pool of worker processes
+
+    Jobs are handed out one at a time as workers free up, picking the
+    tenant (account) with the fewest running syncs, so accounts share the
+    pool fairly. Workers draw from shared per-account GitHub budgets and a
+    global model concurrency limit.
+
+    Args:
+        jobs: Dicts with 'repo' (owner/repo) and 'account_id'
+        config: Sync configuration passed to process_repository
+        workers: Number of worker processes
+        github_requests_per_hour: GitHub request budget per account
+        model_concurrency: Model requests in flight across all workers
+        model_requests_per_minute: Optional model request budget across all workers
+
+    Returns:
+        Consolidated run report
+    """
+    started_at = datetime.now(timezone.utc)
+    queue = FairShareQueue()
+    for job in jobs:
+        queue.push(job['account_id'], job)
+    logger.info('scheduler_started', f"Scheduling {len(jobs)} repositories across {workers} workers",
+                repositories=len(jobs), workers=workers)
+
+    entries = []
+    # Workers are spawned rather than forked: gRPC channels of the parent's
+    # Firestore client do not survive a fork
+    context = multiprocessing.get_context('spawn')
+    with context.Manager() as manager:
+        limits = SharedLimits.create(
+            manager,
+            [job['account_id'] for job in jobs],
+            github_requests_per_hour=github_requests_per_hour,
+            model_concurrency=model_concurrency,
+            model_requests_per_minute=model_requests_per_minute
+        )
+        with ProcessPoolExecutor(max_workers=workers, mp_context=context,
+                                 initializer=_init_worker, initargs=(config, limits)) as pool:
+            running = {}
+            while queue or running:
+                while queue and len(running) < workers:
+                    _, job = queue.pop()
+                    logger.info('scheduled_sync_started', f"Starting sync of {job['repo']} for account {job['account_id']}",
+                                repository=job['repo'], account_id=job['account_id'])
+                    running[pool.submit(sync_repository, job)] = job
+                done, _ = wait(running, return_when=FIRST_COMPLETED)
+                for future in done:
+                    job = running.pop(future)
+                    queue.done(job['account_id'])
+                    try:
+                        entry = future.result()
+                    except Exception as e:
+                        # The worker process died, e.g. out of memory
+                        entry = _entry(job, {'status': 'error', 'error': str(e)}, 0.0)
+                    entries.append(entry)
+                    logger.info('scheduled_sync_finished', f"Finished {entry['repo']}: {entry['status']}, "
+                                f"{entry['changed_files']} changed files in {entry['duration_seconds']:.1f}s",
+                                repository=entry['repo'], status=entry['status'],
+                                changed_files=entry['changed_files'], duration_seconds=entry['duration_seconds'])
+
+    report = run_report(entries, started_at, datetime.now(timezone.utc), workers)
+    totals = report['totals']
+    logger.info('scheduler_completed', f"Synced {totals['repositories']} repositories: {totals['succeeded']} succeeded, "
+                f"{totals['failed']} failed, {totals['changed_files']} changed files "
+                f"in {report['duration_seconds']:.1f}s",
+                **totals, duration_seconds=report['duration_seconds'])
+    return report
+
+def listed_repositories(db, repos: List[str], account_id: str = None) -> List[Dict]:
+    """Jobs for repositories given by name, owned by their stored account or the given one"""
+    jobs = []
+    for repo in repos:
+        doc = db.collection('repositories').document(repo.replace('/', '_')).get()
+        job = repository_job(doc.id, doc.to_dict() or {}) if doc.exists else None
+        if job is None and account_id:
+            job = {'repo': repo, 'account_id': account_id}
+        if job is None:
+            logger.warning('repository_skipped', f"Skipping {repo}: no owning account, pass --account-id",
+                           repository=repo)
+            continue
+        job['repo'] = repo
+        jobs.append(job)
+    return jobs
+
+def parse_args():
+    """Parse command line arguments"""
+    parser = argparse.ArgumentParser(description='Sync multiple repositories across worker processes')
+    parser.add_argument('repos', nargs='*', help='Repository names (owner/repo); repositories due for refresh if omitted')
+    parser.add_argument('--account-id', help='Account ID for listed repositories without a stored owner')
+    parser.add_argument('--project-id', default='qap-ai', help='Firebase project ID')
+    parser.add_argument('--refresh-hours', type=float, default=DEFAULT_REFRESH_HOURS,
+                        help='Sync repositories not synced within this many hours')
+    parser.add_argument('--workers', type=int, default=4, help='Number of worker processes')
+    parser.add_argument('--github-requests-per-hour', type=int, default=4500,
+                        help='GitHub request budget per account')
+    parser.add_argument('--model-concurrency', type=int, default=8,
+                        help='Model requests in flight across all workers')
+    parser.add_argument('--model-requests-per-minute', type=int, help='Model request budget across all workers')
+    parser.add_argument('--max-files', type=int, help='Maximum number of files to process per repository')
+    parser.add_argument('--skip-types', help='Comma-separated list of file extensions to skip')
+    parser.add_argument('--async-firestore', action='store_true', help='Use the async Firestore client for file storage')
+    parser.add_argument('--output', help='Write the run report to this JSON file')
+    return parser.parse_args()
+
+if __name__ == '__main__':
+    args = parse_args()
+    load_dotenv()
+    configure_logging()
+
+    _init_firebase()
+    db = firestore.client()
+
+    if args.repos:
+        jobs = listed_repositories(db, args.repos, args.account_id)
+    else:
+        jobs = due_repositories(db, timedelta(hours=args.refresh_hours))
+
+    config = {
+        'environment': os.getenv('ENVIRONMENT', 'development'),
+        'firebase_project_id': args.project_id,
+        'gemini_api_key': os.environ.get('GEMINI_API_KEY'),
+        'firestore_async': args.async_firestore,
+        'max_files': args.max_files,
+        'skip_types': set(args.skip_types.split(',')) if args.skip_types else None
+    }
+    report = run_scheduler(
+        jobs,
+        config,
+        workers=args.workers,
+        github_requests_per_hour=args.github_requests_per_hour,
+        model_concurrency=args.model_concurrency,
+        model_requests_per_minute=args.model_requests_per_minute
+    )
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=2)
+        logger.info('run_report_written', f"Run report written to {args.output}", path=args.output)
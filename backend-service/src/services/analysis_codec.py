@@ -0,0 +1,134 @@
+from typing import Dict, List, Optional
+from collections import Counter
+import hashlib
+import json
+import zlib
+from services.sync_logging import get_logger
+
+# msgpack and zstandard are optional; the 'zstd' codec needs both
+try:
+    import msgpack
+    import zstandard
+except ImportError:
+    msgpack = None
+    zstandard = None
+
+logger = get_logger(__name__)
+
+# 'json' stores the analysis as a plain map, as before. The other codecs store
+# it as bytes in 'ai_analysis_encoded' with 'ai_analysis_codec' describing how.
+CODECS = ('json', 'zlib', 'zstd')
+
+# Analyses collected per sync to train the repository's shared dictionary
+DICTIONARY_SAMPLE_SIZE = 200
+
+# Size of trained dictionaries; zlib only uses the last 32 KiB of a dictionary
+DICTIONARY_SIZE = 32 * 1024
+
+class AnalysisCodec:
+    """
+    Encodes and decodes stored CodeAnalysis payloads.
+
+    'zlib' compresses compact JSON with an optional preset dictionary and
+    needs only the standard library. 'zstd' packs the analysis with msgpack
+    and compresses it with zstandard, optionally using a trained dictionary.
+    Dictionaries are shared per repository and identified by a content hash,
+    so documents written with an older dictionary can still be decoded.
+    """
+
+    def __init__(self, codec: str, dictionary: bytes = None):
+        if codec not in CODECS:
+            raise ValueError(f"Unknown analysis codec: {codec}")
+        if codec == 'zstd' and zstandard is None:
+            raise ValueError("The 'zstd' analysis codec requires the msgpack and zstandard packages")
+        self.codec = codec
+        self.dictionary = dictionary
+        self.dict_id = dictionary_id(dictionary) if dictionary else None
+        self._zstd_compressor = None
+        self._zstd_decompressor = None
+
+    def encode(self, analysis: Dict) -> Dict:
+        """
+        Encode an analysis into the fields stored on the document
+
+        Returns:
+            Dict with 'ai_analysis', or 'ai_analysis_encoded' and 'ai_analysis_codec'
+        """
+        if self.codec == 'json':
+            return {'ai_analysis': analysis}
+        if self.codec == 'zlib':
+            payload = json.dumps(analysis, separators=(',', ':')).encode('utf-8')
+            if self.dictionary:
+                compressor = zlib.compressobj(level=9, zdict=self.dictionary)
+            else:
+                compressor = zlib.compressobj(level=9)
+            encoded = compressor.compress(payload) + compressor.flush()
+        else:
+            encoded = self._zstd().compress(msgpack.packb(analysis, use_bin_type=True))
+        return {
+            'ai_analysis_encoded': encoded,
+            'ai_analysis_codec': {'codec': self.codec, 'dict_id': self.dict_id}
+        }
+
+    def decode(self, encoded: bytes) -> Dict:
+        """Decode bytes written by encode() with this codec and dictionary"""
+        if self.codec == 'zlib':
+            if self.dictionary:
+                decompressor = zlib.decompressobj(zdict=self.dictionary)
+            else:
+                decompressor = zlib.decompressobj()
+            payload = decompressor.decompress(encoded) + decompressor.flush()
+            return json.loads(payload)
+        if self.codec == 'zstd':
+            if self._zstd_decompressor is None:
+                dict_data = zstandard.ZstdCompressionDict(self.dictionary) if self.dictionary else None
+                self._zstd_decompressor = zstandard.ZstdDecompressor(dict_data=dict_data)
+            return msgpack.unpackb(self._zstd_decompressor.decompress(encoded), raw=False)
+        raise ValueError("The 'json' codec does not decode bytes")
+
+    def _zstd(self):
+        if self._zstd_compressor is None:
+            dict_data = zstandard.ZstdCompressionDict(self.dictionary) if self.dictionary else None
+            self._zstd_compressor = zstandard.ZstdCompressor(level=10, dict_data=dict_data)
+        return self._zstd_compressor
+
+def dictionary_id(dictionary: bytes) -> str:
+    return hashlib.sha1(dictionary).hexdigest()[:16]
+
+def train_dictionary(codec: str, samples: List[Dict]) -> Optional[bytes]:
+    """
+    Build a shared dictionary from sample analyses
+
+    zstd dictionaries are trained by zstandard. zlib has no trainer, so its
+    preset dictionary is the most frequent JSON tokens (keys, dependency
+    names, purpose phrases), ordered so the most common come last where
+    zlib can reach them with the shortest distances.
+
+    Returns:
+        Dictionary bytes, or None if there are too few samples
+    """
+    if codec == 'json' or len(samples) < 10:
+        return None
+    if codec == 'zstd':
+        packed = [msgpack.packb(sample, use_bin_type=True) for sample in samples]
+        try:
+            return zstandard.train_dictionary(DICTIONARY_SIZE, packed).as_bytes()
+        except zstandard.ZstdError as e:
+            logger.warning('dictionary_training_failed', f"Could not train analysis dictionary: {str(e)}")
+            return None
+
+    tokens = Counter()
+    for sample in samples:
+        text = json.dumps(sample, separators=(',', ':'))
+        for token in text.split('"'):
+            if 3 < len(token) < 200:
+                tokens[f'"{token}"'] += 1
+    dictionary = b''
+    for token, count in tokens.most_common():
+        if count < 2:
+            break
+        encoded = token.encode('utf-8')
+        if len(dictionary) + len(encoded) > DICTIONARY_SIZE:
+            break
+        dictionary = encoded + dictionary
+    return dictionary or None
@@ -0,0 +1,151 @@
+from collections import Counter
+from datetime import datetime, timezone
+from pathlib import PurePosixPath
+from typing import Dict, Iterable, List, Optional
+import math
+import posixpath
+
+# Weight of each impact signal; every signal scores between 0 and 1
+PRIORITY_WEIGHTS = {
+    'recency': 0.35,
+    'fan_in': 0.35,
+    'entry_point': 0.2,
+    'size': 0.1
+}
+
+# Age at which the recency signal halves
+RECENCY_HALF_LIFE_DAYS = 30
+
+# File size (bytes) at which the size signal halves; small files are
+# cheaper to analyze, so they come first among otherwise equal files
+SIZE_HALF_SCORE_BYTES = 20000
+
+# File stems that start an application or define a package's public surface
+ENTRY_POINT_STEMS = {'main', 'app', 'index', 'cli', 'server', 'manage', 'wsgi', 'asgi', '__main__', '__init__'}
+
+# Module keys of an index or package file also resolve to its directory
+PACKAGE_STEMS = {'index', '__init__'}
+
+def module_keys(path: str) -> List[str]:
+    """Import targets a file answers to: its path without extension, and its directory for index files"""
+    module = PurePosixPath(path).with_suffix('')
+    keys = [str(module)]
+    if module.name in PACKAGE_STEMS and str(module.parent) != '.':
+        keys.append(str(module.parent))
+    return keys
+
+class ImportResolver:
+    """
+    Resolves regex-extracted import specifiers to repository paths.
+
+    Relative JS/TS imports ('./utils') resolve against the importing file's
+    directory. Python dotted modules and aliased imports ('@/lib/api',
+    'services.github_service') match on a unique path suffix; ambiguous or
+    external ones ('react', 'os') resolve to nothing.
+    """
+
+    def __init__(self, paths: Iterable[str]):
+        self._exact: Dict[str, str] = {}
+        self._suffixes: Dict[str, Optional[str]] = {}
+        for path in paths:
+            for key in module_keys(path):
+                self._exact[key] = path
+                parts = key.split('/')
+                for index in range(len(parts)):
+                    suffix = '/'.join(parts[index:])
+                    # None marks a suffix shared by several files
+                    self._suffixes[suffix] = path if self._suffixes.get(suffix, path) == path else None
+
+    def resolve(self, importer: str, specifier: str) -> Optional[str]:
+        if specifier.startswith('.'):
+            target = PurePosixPath(posixpath.normpath(posixpath.join(posixpath.dirname(importer), specifier)))
+            if target.suffix:
+                # Specifiers may spell out the extension ('./utils.js')
+                return self._exact.get(str(target.with_suffix(''))) or self._exact.get(str(target))
+            return self._exact.get(str(target))
+        for prefix in ('@/', '~/'):
+            if specifier.startswith(prefix):
+                specifier = specifier[len(prefix):]
+        if '/' not in specifier:
+            specifier = specifier.replace('.', '/')
+        return self._suffixes.get(specifier)
+
+def import_fan_in(imports_by_path: Dict[str, Iterable[str]], paths: Iterable[str]) -> Counter:
+    """
+    Count how many files import each path
+
+    Args:
+        imports_by_path: Import specifiers of each importing file
+        paths: All paths of the repository
+
+    Returns:
+        Counter of path to the number of distinct files importing it
+    """
+    resolver = ImportResolver(paths)
+    fan_in = Counter()
+    for importer, specifiers in imports_by_path.items():
+        targets = {resolver.resolve(importer, specifier) for specifier in specifiers}
+        targets.discard(None)
+        targets.discard(importer)
+        fan_in.update(targets)
+    return fan_in
+
+def recency_score(last_updated: Optional[str], now: datetime) -> float:
+    """1 for a file updated now, halving every RECENCY_HALF_LIFE_DAYS; 0 if unknown"""
+    if not last_updated:
+        return 0.0
+    try:
+        updated_at = datetime.fromisoformat(last_updated)
+    except (TypeError, ValueError):
+        return 0.0
+    if updated_at.tzinfo is None:
+        updated_at = updated_at.replace(tzinfo=timezone.utc)
+    age_days = max((now - updated_at).total_seconds() / 86400, 0)
+    return 0.5 ** (age_days / RECENCY_HALF_LIFE_DAYS)
+
+def size_score(size: Optional[int]) -> float:
+    """1 for an empty file, 0.5 at SIZE_HALF_SCORE_BYTES, towards 0 for large files"""
+    return 1 / (1 + (size or 0) / SIZE_HALF_SCORE_BYTES)
+
+def is_entry_point(path: str) -> bool:
+    return PurePosixPath(path).stem.lower() in ENTRY_POINT_STEMS
+
+def prioritize_files(files: List[Dict], snapshot, now: datetime = None) -> List[Dict]:
+    """
+    Order files to analyze by expected impact, highest first
+
+    Signals come from the listing and the stored snapshot, so no extra
+    requests are made: how recently the file was updated (new files count
+    as just updated, modified ones by their previous update), how many
+    stored files import it, whether it is an entry point, and its size.
+    Ties keep the listing order.
+
+    Args:
+        files: Files to analyze, as listed from GitHub with their sync 'status'
+        snapshot: RepositorySnapshot of the stored files
+        now: Current time (defaults to now, UTC)
+
+    Returns:
+        New list of the files, sorted by priority
+    """
+    now = now or datetime.now(timezone.utc)
+    records = [record for record in snapshot.records.values() if record.path and record.status != 'deleted']
+    paths = {record.path for record in records} | {file['path'] for file in files}
+    fan_in = import_fan_in({record.path: record.imports for record in records if record.imports}, paths)
+    most_imported = max(fan_in.values(), default=0)
+
+    def score(file: Dict) -> float:
+        if file.get('status') == 'new':
+            recency = 1.0
+        else:
+            record = snapshot.get(file['path'])
+            recency = recency_score(record.last_updated if record else None, now)
+        signals = {
+            'recency': recency,
+            'fan_in': math.log1p(fan_in[file['path']]) / math.log1p(most_imported) if most_imported else 0.0,
+            'entry_point': 1.0 if is_entry_point(file['path']) else 0.0,
+            'size': size_score(file.get('size'))
+        }
+        return sum(PRIORITY_WEIGHTS[name] * value for name, value in signals.items())
+
+    return sorted(files, key=score, reverse=True)
@@ -0,0 +1,359 @@
+from firebase_admin import firestore
+from google.api_core import exceptions as api_exceptions
+from google.cloud import firestore as cloud_firestore
+from typing import Callable, Dict, List, Optional
+import asyncio
+from services.firestore_service import (
+    SNAPSHOT_FIELDS, STORAGE_LAYOUTS, BulkWriteStats, RepositoryFileWriter, RepositorySnapshot,
+    SnapshotRecord, sync_status_update, sync_summary_documents
+)
+from services.analysis_codec import AnalysisCodec
+from services.symbol_index import SYMBOL_FIELDS, extract_symbols
+from services.telemetry import traced
+from services.sync_logging import get_logger
+
+logger = get_logger(__name__)
+
+# Writes per commit; matches the batch size the BulkWriter uses, which keeps
+# commits well under the request size limit even with large analyses
+BATCH_SIZE = 20
+
+# Commit errors that are retried with backoff, as the BulkWriter does
+RETRYABLE_ERRORS = (
+    api_exceptions.Aborted,
+    api_exceptions.DeadlineExceeded,
+    api_exceptions.InternalServerError,
+    api_exceptions.ResourceExhausted,
+    api_exceptions.ServiceUnavailable
+)
+
+class AsyncFirestoreService:
+    """
+    FirestoreService on the async Firestore client.
+
+    Has the same methods as FirestoreService, as coroutines, so storage I/O
+    yields to the event loop and overlaps with file analysis instead of
+    blocking it. Methods accept references from either client; they are
+    re-resolved against the async client by path, so the sync service can
+    still be used for everything off the hot path.
+    """
+
+    def __init__(self, project_id: str, max_write_attempts: int = 10, storage_layout: str = 'inline',
+                 analysis_codec: str = 'json', max_concurrent_batches: int = 25, client=None):
+        """
+        Initialize async Firestore service
+
+        Args:
+            project_id: Firebase project ID
+            max_write_attempts: Attempts per batch before its writes count as failed
+            storage_layout: Layout for repositories indexed for the first time
+            analysis_codec: Codec for stored analyses ('json', 'zlib' or 'zstd')
+            max_concurrent_batches: Batch commits in flight per file writer
+            client: Optional async Firestore client, e.g. one connected to the emulator
+        """
+        if not project_id:
+            raise ValueError("Project ID is required")
+        if storage_layout not in STORAGE_LAYOUTS:
+            raise ValueError(f"Unknown storage layout: {storage_layout}")
+        self.project_id = project_id
+        self.storage_layout = storage_layout
+        self.analysis_codec = AnalysisCodec(analysis_codec).codec
+        self._codec_cache = {}
+        self.max_write_attempts = max_write_attempts
+        self.max_concurrent_batches = max_concurrent_batches
+
+        # A client created here is closed by close(). firebase_admin's cached
+        # async client is not used: its channel stays bound to the first event
+        # loop, and each scheduled sync runs on a new one.
+        self._owns_client = client is None
+        if client is None:
+            import firebase_admin
+
+            if not firebase_admin._apps:
+                # Use Application Default Credentials
+                firebase_admin.initialize_app()
+            client = cloud_firestore.AsyncClient(
+                project=project_id,
+                credentials=firebase_admin.get_app().credential.get_credential()
+            )
+        self.db = client
+
+    async def close(self):
+        """Close the gRPC channel of the client this service created"""
+        if not self._owns_client:
+            return
+        # The GAPIC client, and with it the channel, only exists once a request was made
+        api = getattr(self.db, '_firestore_api_internal', None)
+        if api is not None:
+            await api.transport.close()
+
+    def _ref(self, repo_ref):
+        """Resolve a document reference from either client against the async client"""
+        return self.db.document(repo_ref.path)
+
+    async def store_repository_metadata(self, repo_id: str, metadata: Dict):
+        """Store repository metadata in Firestore"""
+        logger.debug('repository_metadata_stored', repository=repo_id)
+        repo_ref = self.db.collection('repositories').document(repo_id)
+
+        doc = await repo_ref.get(field_paths=['metadata.first_indexed_at'])
+        first_indexed_at = None
+        if doc.exists:
+            first_indexed_at = (doc.to_dict() or {}).get('metadata', {}).get('first_indexed_at')
+
+        await repo_ref.set({
+            'metadata': {
+                **metadata,
+                'sync_status': 'in_progress',
+                'last_synced': firestore.SERVER_TIMESTAMP,
+                'first_indexed_at': first_indexed_at or firestore.SERVER_TIMESTAMP
+            }
+        }, merge=True)
+        return repo_ref
+
+    async def get_repository_files(self, repo_ref) -> List[Dict]:
+        """Get existing repository files from Firestore"""
+        try:
+            return [doc.to_dict() async for doc in self._ref(repo_ref).collection('files').stream()]
+        except Exception as e:
+            logger.error('stored_files_failed', f"Error fetching repository files from Firestore: {str(e)}")
+            return []
+
+    @traced('firestore.load_snapshot')
+    async def load_repository_snapshot(self, repo_ref) -> RepositorySnapshot:
+        """Read the change-detection fields of the repository's file documents"""
+        repo_ref = self._ref(repo_ref)
+        records = {}
+        async for doc in repo_ref.collection('files').select(SNAPSHOT_FIELDS).stream():
+            records[doc.id] = SnapshotRecord.from_document(doc.to_dict())
+        logger.info('snapshot_loaded', f"Loaded snapshot of {len(records)} stored files", files=len(records))
+
+        settings = await self.get_sync_settings(repo_ref)
+        storage_layout = settings.get('storage_layout') or ('inline' if records else self.storage_layout)
+        return RepositorySnapshot(records, storage_layout, manifest=settings.get('manifest'),
+                                  analysis_codec=settings.get('analysis_codec'))
+
+    async def get_sync_settings(self, repo_ref) -> Dict:
+        """Read the storage layout, manifest summary and codec from the repository document"""
+        doc = await self._ref(repo_ref).get(field_paths=[
+            'metadata.storage_layout', 'metadata.manifest', 'metadata.analysis_codec'
+        ])
+        if not doc.exists:
+            return {}
+        return (doc.to_dict() or {}).get('metadata', {})
+
+    async def get_repository_manifest(self, repo_ref) -> Optional[List[Dict]]:
+        """Get the repository's file tree from its manifest chunks, or None without a manifest"""
+        files = []
+        async for chunk in self._ref(repo_ref).collection('manifest').stream():
+            for path, entry in (chunk.to_dict().get('entries') or {}).items():
+                files.append({'path': path, **entry})
+        return files or None
+
+    async def get_analysis_codec(self, repo_ref, codec: str, dict_id: str = None) -> AnalysisCodec:
+        """Get a codec with the repository's shared dictionary, cached by dictionary ID"""
+        repo_ref = self._ref(repo_ref)
+        key = (repo_ref.path, codec, dict_id)
+        if key not in self._codec_cache:
+            dictionary = None
+            if dict_id:
+                doc = await repo_ref.collection('codec_dictionaries').document(dict_id).get()
+                if not doc.exists:
+                    raise ValueError(f"Analysis dictionary {dict_id} not found")
+                dictionary = doc.get('dictionary')
+            self._codec_cache[key] = AnalysisCodec(codec, dictionary)
+        return self._codec_cache[key]
+
+    async def open_analysis_codec(self, repo_ref, snapshot: RepositorySnapshot) -> AnalysisCodec:
+        """Codec for this sync's writes, reusing the repository's dictionary for the same codec"""
+        settings = snapshot.analysis_codec or {}
+        if self.analysis_codec == 'json':
+            return AnalysisCodec('json')
+        if settings.get('codec') == self.analysis_codec:
+            return await self.get_analysis_codec(repo_ref, self.analysis_codec, settings.get('dict_id'))
+        return AnalysisCodec(self.analysis_codec)
+
+    async def store_analysis_dictionary(self, repo_ref, codec: AnalysisCodec):
+        """Store a newly trained shared dictionary for the repository"""
+        repo_ref = self._ref(repo_ref)
+        await repo_ref.collection('codec_dictionaries').document(codec.dict_id).set({
+            'codec': codec.codec,
+            'dictionary': codec.dictionary,
+            'created_at': firestore.SERVER_TIMESTAMP
+        })
+        self._codec_cache[(repo_ref.path, codec.codec, codec.dict_id)] = codec
+
+    async def decode_analysis(self, repo_ref, file_data: Dict) -> Dict:
+        """Replace an encoded analysis on a file document with the decoded 'ai_analysis'"""
+        encoded = file_data.pop('ai_analysis_encoded', None)
+        codec_info = file_data.pop('ai_analysis_codec', None)
+        if encoded is not None and codec_info:
+            codec = await self.get_analysis_codec(repo_ref, codec_info['codec'], codec_info.get('dict_id'))
+            file_data['ai_analysis'] = codec.decode(encoded)
+        return file_data
+
+    async def get_file(self, repo_ref, doc_id: str, include_analysis: bool = True) -> Optional[Dict]:
+        """Get a file document, loading and decoding its analysis like FirestoreService.get_file"""
+        repo_ref = self._ref(repo_ref)
+        doc = await repo_ref.collection('files').document(doc_id).get()
+        if not doc.exists:
+            return None
+        file_data = doc.to_dict()
+        if include_analysis and file_data.get('has_analysis'):
+            analysis = await repo_ref.collection('analyses').document(doc_id).get()
+            if analysis.exists:
+                file_data.update(analysis.to_dict())
+        if include_analysis:
+            await self.decode_analysis(repo_ref, file_data)
+        return file_data
+
+    async def open_file_writer(self, repo_ref, snapshot: RepositorySnapshot, max_pending: int = 200,
+                               on_flush: Callable[[List[str]], None] = None,
+                               previous_symbols: Dict[str, Dict] = None,
+                               partial: bool = False) -> 'AsyncRepositoryFileWriter':
+        """Open a streaming writer for this sync's file documents"""
+        repo_ref = self._ref(repo_ref)
+        codec = await self.open_analysis_codec(repo_ref, snapshot)
+        return AsyncRepositoryFileWriter(self, repo_ref, snapshot, max_pending=max_pending, on_flush=on_flush,
+                                         previous_symbols=previous_symbols, codec=codec, partial=partial)
+
+    async def load_previous_symbols(self, repo_ref, snapshot: RepositorySnapshot,
+                                    paths: List[str]) -> Dict[str, Dict]:
+        """Read the indexed symbols of files that are about to be overwritten or tombstoned"""
+        repo_ref = self._ref(repo_ref)
+        collection = repo_ref.collection('analyses' if snapshot.storage_layout == 'split' else 'files')
+        paths_by_doc_id = {
+            RepositorySnapshot.doc_id(path): path for path in paths
+            if path in snapshot and snapshot.get(path).status != 'deleted'
+        }
+        doc_ids = list(paths_by_doc_id)
+        previous = {}
+        for index in range(0, len(doc_ids), 300):
+            refs = [collection.document(doc_id) for doc_id in doc_ids[index:index + 300]]
+            async for doc in self.db.get_all(refs, field_paths=list(SYMBOL_FIELDS)):
+                if doc.exists:
+                    previous[paths_by_doc_id[doc.id]] = extract_symbols(doc.to_dict())
+        return previous
+
+    async def store_repository_files(self, repo_ref, files: List[Dict], snapshot: RepositorySnapshot = None):
+        """Store repository files metadata in Firestore with metrics"""
+        logger.debug('store_files', files=len(files))
+        if snapshot is None:
+            snapshot = await self.load_repository_snapshot(repo_ref)
+
+        file_writer = await self.open_file_writer(repo_ref, snapshot)
+        for file in files:
+            await file_writer.write(file)
+        await self.store_sync_summary(repo_ref, await file_writer.close())
+
+    @traced('firestore.store_summary')
+    async def store_sync_summary(self, repo_ref, result: Dict):
+        """Store the metrics document and repository counters for a finished sync"""
+        repo_ref = self._ref(repo_ref)
+        stats = result['stats']
+        metrics_data, repo_data = sync_summary_documents(result)
+        await asyncio.gather(
+            repo_ref.collection('metrics').document().set(metrics_data),
+            repo_ref.set(repo_data, merge=True)
+        )
+        logger.info('sync_stored', f"Sync completed: {stats['new']} new, {stats['updated']} updated, "
+                    f"{stats['unchanged']} unchanged, {stats['deleted']} deleted, "
+                    f"{stats['restored']} restored", **stats)
+
+    async def update_sync_status(self, repo_ref, status: str, error: str = None, progress: dict = None):
+        """Update repository sync status"""
+        logger.debug('sync_status', status=status)
+        await self._ref(repo_ref).set(sync_status_update(status, error, progress), merge=True)
+
+class AsyncRepositoryFileWriter(RepositoryFileWriter):
+    """
+    RepositoryFileWriter for the async Firestore client.
+
+    Queued writes are committed in batches of ``BATCH_SIZE`` by background
+    tasks, at most ``max_concurrent_batches`` at a time, so the caller keeps
+    analysing files while earlier documents are stored. write() only waits
+    once ``max_pending`` writes are outstanding, and on_flush still runs
+    after the flushed writes are stored.
+    """
+
+    def __init__(self, service: AsyncFirestoreService, *args, **kwargs):
+        self.batch = []
+        self.commits = set()
+        self.semaphore = asyncio.Semaphore(service.max_concurrent_batches)
+        super().__init__(service, *args, **kwargs)
+
+    def _open_bulk_writer(self, service):
+        return None, BulkWriteStats(service.max_write_attempts)
+
+    def _queue(self, doc_ref, data: Dict, merge: bool = False):
+        self.batch.append((doc_ref, data, merge))
+        if len(self.batch) >= BATCH_SIZE:
+            self._start_commit()
+
+    def _set(self, doc_ref, data: Dict, merge: bool = False):
+        # Flushing is awaited by write() and close(), never from here
+        self._queue(doc_ref, data, merge=merge)
+        self.pending += 1
+
+    def _start_commit(self):
+        operations, self.batch = self.batch, []
+        task = asyncio.create_task(self._commit(operations))
+        self.commits.add(task)
+        task.add_done_callback(self.commits.discard)
+
+    @traced('firestore.commit')
+    async def _commit(self, operations: List[tuple]):
+        async with self.semaphore:
+            attempts = 0
+            while True:
+                attempts += 1
+                batch = self.service.db.batch()
+                for doc_ref, data, merge in operations:
+                    batch.set(doc_ref, data, merge=merge)
+                try:
+                    await batch.commit()
+                    self.write_stats.on_batch_result(len(operations))
+                    return
+                except RETRYABLE_ERRORS as e:
+                    if not self.write_stats.on_batch_error(len(operations), attempts, str(e.code),
+                                                           [doc_ref for doc_ref, _, _ in operations]):
+                        logger.error('write_failed', f"Failed to write {len(operations)} documents after "
+                                     f"{attempts} attempts: {str(e)}", documents=len(operations), attempts=attempts)
+                        return
+                    await asyncio.sleep(min(0.1 * 2 ** attempts, 10))
+                except Exception as e:
+                    code = str(getattr(e, 'code', type(e).__name__))
+                    self.write_stats.on_batch_error(len(operations), self.write_stats.max_attempts, code,
+                                                    [doc_ref for doc_ref, _, _ in operations])
+                    logger.error('write_failed', f"Failed to write {len(operations)} documents: {str(e)}",
+                                 documents=len(operations))
+                    return
+
+    async def write(self, file: Dict):
+        """Queue a file document, skipping files that have not changed"""
+        super().write(file)
+        if self.pending >= self.max_pending:
+            await self.flush()
+
+    @traced('firestore.flush')
+    async def flush(self):
+        """Wait until every queued write has been committed or given up on"""
+        self._queue_symbol_writes()
+        if self.batch:
+            self._start_commit()
+        if self.commits:
+            await asyncio.gather(*self.commits)
+        self.pending = 0
+        if self.on_flush:
+            # Saving the checkpoint is a blocking Firestore write
+            await asyncio.to_thread(self.on_flush, self._stored_paths())
+
+    @traced('firestore.close')
+    async def close(self) -> Dict:
+        """Tombstone stored files that were not written in this sync and wait for all writes"""
+        self._queue_closing_writes()
+        await self.flush()
+        trained = self._train_dictionary()
+        if trained:
+            await self.service.store_analysis_dictionary(self.repo_ref, trained)
+        return self._result(trained)
@@ -1,13 +1,260 @@
 from firebase_admin import credentials, firestore
+from google.cloud.firestore_v1.bulk_writer import BulkWriterOptions, BulkRetry, SendMode
 from datetime import datetime
-from typing import Dict, List
+from typing import Any, Callable, Dict, List, NamedTuple, Optional, Tuple
+import threading
+import time
+from services.repository_manifest import ManifestUpdate, manifest_entry, deleted_entry, read_manifest
+from services.analysis_codec import AnalysisCodec, DICTIONARY_SAMPLE_SIZE, train_dictionary
+from services.symbol_index import SymbolIndexUpdate, SYMBOL_FIELDS, extract_symbols
+from services.telemetry import traced
+from services.sync_logging import get_logger
+
+logger = get_logger(__name__)
+
+# Fields requested when reading file documents for change detection and
+# analysis ordering ('imports' is only on file documents in the inline layout)
+SNAPSHOT_FIELDS = ['path', 'metadata.sha', 'size', 'last_updated', 'status', 'first_indexed_at', 'imports']
+
+# Storage layouts for file documents. 'inline' keeps the analysis on the file
+# document; 'split' moves it to repositories/{repo_id}/analyses/{doc_id}.
+STORAGE_LAYOUTS = ('inline', 'split')
+
+# File document fields that live in the analysis document under the split layout
+ANALYSIS_FIELDS = [
+    'ai_analysis', 'ai_analysis_encoded', 'ai_analysis_codec', 'analysis_metadata',
+    'imports', 'functions', 'classes', 'exports', 'state_management', 'modification_points'
+]
+
+def split_file_document(document: Dict) -> tuple:
+    """
+    Split a full file document into its slim file document and its analysis
+    document for the split storage layout.
+
+    Returns:
+        Tuple of (file_document, analysis_document)
+    """
+    file_document = {k: v for k, v in document.items() if k not in ANALYSIS_FIELDS}
+    analysis_document = {k: document[k] for k in ANALYSIS_FIELDS if k in document}
+    file_document['has_analysis'] = bool(analysis_document)
+    return file_document, analysis_document
+
+def sync_summary_documents(result: Dict) -> tuple:
+    """
+    Build the metrics document and repository update for a finished sync
+
+    Args:
+        result: Result of RepositoryFileWriter.close()
+
+    Returns:
+        Tuple of (metrics_document, repository_update)
+    """
+    stats = result['stats']
+    active_files = result['active_files']
+    storage_layout = result.get('storage_layout', 'inline')
+
+    update_metadata = {}
+    if result.get('analysis_codec'):
+        update_metadata['analysis_codec'] = result['analysis_codec']
+    if result.get('manifest'):
+        update_metadata['manifest'] = {
+            **result['manifest'],
+            'updated_at': firestore.SERVER_TIMESTAMP
+        }
+
+    metrics_document = {
+        'timestamp': firestore.SERVER_TIMESTAMP,
+        'stats': stats,
+        'writes': result['writes'],
+        'totals': {
+            'active_files': active_files,
+            'deleted_files': stats['deleted'],
+            'total_files': active_files + stats['deleted']
+        }
+    }
+    if result.get('shards'):
+        # Sharded syncs record how the changed files were split across workers
+        metrics_document['shards'] = result['shards']
+    repository_update = {
+        'metadata': {
+            'last_sync_stats': stats,
+            'last_synced': firestore.SERVER_TIMESTAMP,
+            'sync_status': 'completed',
+            'storage_layout': storage_layout,
+            'file_counts': {
+                'active': active_files,
+                'deleted': stats['deleted'],
+                'total': active_files + stats['deleted']
+            },
+            **update_metadata
+        }
+    }
+    return metrics_document, repository_update
+
+def sync_status_update(status: str, error: str = None, progress: dict = None) -> Dict:
+    """Repository update for a sync status change"""
+    update_data = {
+        'metadata': {
+            'sync_status': status,
+            'last_synced': firestore.SERVER_TIMESTAMP
+        }
+    }
+
+    if error:
+        update_data['metadata']['error'] = error
+
+    if progress:
+        update_data['metadata']['progress'] = progress
+        update_data['metadata']['progress_updated_at'] = firestore.SERVER_TIMESTAMP
+    return update_data
+
+class SnapshotRecord(NamedTuple):
+    """Change-detection fields of a stored file document"""
+    path: Optional[str]
+    sha: Optional[str]
+    size: Optional[int]
+    last_updated: Optional[str]
+    status: Optional[str]
+    first_indexed_at: Any
+    imports: Tuple[str, ...] = ()
+
+    @classmethod
+    def from_document(cls, data: Dict) -> 'SnapshotRecord':
+        """Build a record from a (projected) file document"""
+        return cls(
+            path=data.get('path'),
+            sha=data.get('metadata', {}).get('sha'),
+            size=data.get('size'),
+            last_updated=data.get('last_updated'),
+            status=data.get('status'),
+            first_indexed_at=data.get('first_indexed_at'),
+            imports=tuple(item for item in data.get('imports') or [] if isinstance(item, str))
+        )
+
+class RepositorySnapshot:
+    """
+    Compact view of a repository's file documents, loaded once per sync.
+
+    Holds only the fields needed to diff the repository against GitHub and
+    to decide what to write back, keyed by Firestore document ID, plus the
+    storage layout, manifest summary and analysis codec recorded on the
+    repository.
+    """
+
+    def __init__(self, records: Dict[str, SnapshotRecord] = None, storage_layout: str = 'inline',
+                 manifest: Dict = None, analysis_codec: Dict = None):
+        self.records = records or {}
+        self.storage_layout = storage_layout
+        self.manifest = manifest
+        self.analysis_codec = analysis_codec
+
+    @staticmethod
+    def doc_id(path: str) -> str:
+        """Firestore document ID used for a file path"""
+        return path.replace('/', '_')
+
+    def get(self, path: str) -> Optional[SnapshotRecord]:
+        """Get the stored record for a file path, if any"""
+        return self.records.get(self.doc_id(path))
+
+    def __contains__(self, path: str) -> bool:
+        return self.doc_id(path) in self.records
+
+    def __len__(self) -> int:
+        return len(self.records)
+
+class BulkWriteStats:
+    """
+    Thread-safe counters for one BulkWriter run.
+
+    Registered as the writer's success and error callbacks, which are invoked
+    from the writer's worker threads. Failed writes are retried until they
+    have been attempted ``max_attempts`` times; the references of writes
+    given up on are kept in ``failed_references``.
+    """
+
+    def __init__(self, max_attempts: int):
+        self.max_attempts = max_attempts
+        self.started_at = time.monotonic()
+        self.succeeded = 0
+        self.failed = 0
+        self.retried = 0
+        self.errors = {}
+        self.failed_references = set()
+        self._lock = threading.Lock()
+
+    def on_write_result(self, reference, result, bulk_writer):
+        with self._lock:
+            self.succeeded += 1
+
+    def on_write_error(self, failure, bulk_writer) -> bool:
+        with self._lock:
+            if failure.attempts < self.max_attempts:
+                self.retried += 1
+                return True
+            self.failed += 1
+            self.failed_references.add(failure.operation.reference)
+            code = str(failure.code)
+            self.errors[code] = self.errors.get(code, 0) + 1
+        logger.error('write_failed', f"Failed to write {failure.operation.reference.path} after "
+                     f"{failure.attempts} attempts: {failure.message}",
+                     document=failure.operation.reference.path, attempts=failure.attempts)
+        return False
+
+    def on_batch_result(self, count: int):
+        """Record a committed batch of ``count`` writes"""
+        with self._lock:
+            self.succeeded += count
+
+    def on_batch_error(self, count: int, attempts: int, code: str, references: List = ()) -> bool:
+        """Record a failed batch commit of the given documents; returns whether to retry it"""
+        with self._lock:
+            if attempts < self.max_attempts:
+                self.retried += count
+                return True
+            self.failed += count
+            self.failed_references.update(references)
+            self.errors[code] = self.errors.get(code, 0) + count
+        return False
+
+    def to_dict(self) -> Dict:
+        with self._lock:
+            duration = time.monotonic() - self.started_at
+            return {
+                'succeeded': self.succeeded,
+                'failed': self.failed,
+                'retried': self.retried,
+                'errors_by_code': dict(self.errors),
+                'duration_seconds': round(duration, 3),
+                'ops_per_second': round(self.succeeded / duration, 1) if duration > 0 else 0
+            }
 
 class FirestoreService:
-    def __init__(self, project_id: str):
-        """Initialize Firestore service"""
+    def __init__(self, project_id: str, initial_ops_per_second: int = 500,
+                 max_ops_per_second: int = 5000, max_write_attempts: int = 10,
+                 storage_layout: str = 'inline', analysis_codec: str = 'json'):
+        """
+        Initialize Firestore service
+
+        Args:
+            project_id: Firebase project ID
+            initial_ops_per_second: Starting write rate for bulk writes
+            max_ops_per_second: Write rate the bulk writer may ramp up to
+            max_write_attempts: Attempts per write before it counts as failed
+            storage_layout: Layout for repositories indexed for the first time
+            analysis_codec: Codec for stored analyses ('json', 'zlib' or 'zstd')
+        """
         if not project_id:
             raise ValueError("Project ID is required")
+        if storage_layout not in STORAGE_LAYOUTS:
+            raise ValueError(f"Unknown storage layout: {storage_layout}")
         self.project_id = project_id
+        self.storage_layout = storage_layout
+        self.analysis_codec = AnalysisCodec(analysis_codec).codec
+        self._codec_cache = {}
+        self.initial_ops_per_second = initial_ops_per_second
+        self.max_ops_per_second = max_ops_per_second
+        self.max_write_attempts = max_write_attempts
         
         # Initialize Firestore client
         import firebase_admin
@@ -19,9 +266,28 @@ class FirestoreService:
         
         self.db = firestore.client()
 
+    def open_bulk_writer(self):
+        """
+        Create a parallel BulkWriter with this service's ramp-up, throughput
+        and retry settings.
+
+        Returns:
+            Tuple of (bulk_writer, BulkWriteStats)
+        """
+        bulk_writer = self.db.bulk_writer(BulkWriterOptions(
+            initial_ops_per_second=self.initial_ops_per_second,
+            max_ops_per_second=self.max_ops_per_second,
+            mode=SendMode.parallel,
+            retry=BulkRetry.exponential
+        ))
+        write_stats = BulkWriteStats(self.max_write_attempts)
+        bulk_writer.on_write_result(write_stats.on_write_result)
+        bulk_writer.on_write_error(write_stats.on_write_error)
+        return bulk_writer, write_stats
+
     def store_repository_metadata(self, repo_id: str, metadata: Dict) -> firestore.DocumentReference:
         """Store repository metadata in Firestore"""
-        print(f"Storing metadata for repository: {repo_id}")
+        logger.debug('repository_metadata_stored', repository=repo_id)
         repo_ref = self.db.collection('repositories').document(repo_id)
         
         # Get existing document
@@ -52,153 +318,195 @@ class FirestoreService:
             files = files_collection.stream()
             return [doc.to_dict() for doc in files]
         except Exception as e:
-            print(f"Error fetching repository files from Firestore: {str(e)}")
+            logger.error('stored_files_failed', f"Error fetching repository files from Firestore: {str(e)}")
             return []
 
-    def store_repository_files(self, repo_ref: firestore.DocumentReference, files: List[Dict]):
-        """Store repository files metadata in Firestore with metrics"""
-        print(f"Processing {len(files)} files for repository")
-        
-        files_collection = repo_ref.collection('files')
-        metrics_collection = repo_ref.collection('metrics')
-        
-        # Initialize batch
-        batch = self.db.batch()
-        batch_size = 0
-        max_batch_size = 500
-        
-        # Initialize stats
-        stats = {
-            'new': 0,
-            'updated': 0,
-            'unchanged': 0,
-            'deleted': 0,
-            'restored': 0
+    @traced('firestore.load_snapshot')
+    def load_repository_snapshot(self, repo_ref: firestore.DocumentReference) -> RepositorySnapshot:
+        """
+        Read the change-detection fields of the repository's file documents.
+
+        Uses a field projection so the bulky analysis payloads are never
+        transferred or deserialized, and streams the results into a map of
+        compact records.
+        """
+        records = {}
+        query = repo_ref.collection('files').select(SNAPSHOT_FIELDS)
+        for doc in query.stream():
+            records[doc.id] = SnapshotRecord.from_document(doc.to_dict())
+        logger.info('snapshot_loaded', f"Loaded snapshot of {len(records)} stored files", files=len(records))
+
+        # Repositories indexed before layouts were recorded use 'inline'; ones
+        # without any files yet get this service's default layout
+        settings = self.get_sync_settings(repo_ref)
+        storage_layout = settings.get('storage_layout') or ('inline' if records else self.storage_layout)
+        return RepositorySnapshot(records, storage_layout, manifest=settings.get('manifest'),
+                                  analysis_codec=settings.get('analysis_codec'))
+
+    def get_sync_settings(self, repo_ref: firestore.DocumentReference) -> Dict:
+        """Read the storage layout, manifest summary and codec from the repository document"""
+        doc = repo_ref.get(field_paths=[
+            'metadata.storage_layout', 'metadata.manifest', 'metadata.analysis_codec'
+        ])
+        if not doc.exists:
+            return {}
+        return (doc.to_dict() or {}).get('metadata', {})
+
+    def get_repository_manifest(self, repo_ref: firestore.DocumentReference) -> Optional[List[Dict]]:
+        """
+        Get the repository's file tree from its manifest chunks
+
+        Returns:
+            List of entries with 'path', 'language', 'size', 'status' and
+            'sha', or None if no manifest has been written yet
+        """
+        return read_manifest(repo_ref)
+
+    def get_analysis_codec(self, repo_ref: firestore.DocumentReference, codec: str,
+                           dict_id: str = None) -> AnalysisCodec:
+        """Get a codec with the repository's shared dictionary, cached by dictionary ID"""
+        key = (repo_ref.path, codec, dict_id)
+        if key not in self._codec_cache:
+            dictionary = None
+            if dict_id:
+                doc = repo_ref.collection('codec_dictionaries').document(dict_id).get()
+                if not doc.exists:
+                    raise ValueError(f"Analysis dictionary {dict_id} not found")
+                dictionary = doc.get('dictionary')
+            self._codec_cache[key] = AnalysisCodec(codec, dictionary)
+        return self._codec_cache[key]
+
+    def open_analysis_codec(self, repo_ref: firestore.DocumentReference,
+                            snapshot: RepositorySnapshot) -> AnalysisCodec:
+        """Codec for this sync's writes, reusing the repository's dictionary for the same codec"""
+        settings = snapshot.analysis_codec or {}
+        if self.analysis_codec == 'json':
+            return AnalysisCodec('json')
+        if settings.get('codec') == self.analysis_codec:
+            return self.get_analysis_codec(repo_ref, self.analysis_codec, settings.get('dict_id'))
+        return AnalysisCodec(self.analysis_codec)
+
+    def store_analysis_dictionary(self, repo_ref: firestore.DocumentReference, codec: AnalysisCodec):
+        """Store a newly trained shared dictionary for the repository"""
+        repo_ref.collection('codec_dictionaries').document(codec.dict_id).set({
+            'codec': codec.codec,
+            'dictionary': codec.dictionary,
+            'created_at': firestore.SERVER_TIMESTAMP
+        })
+        self._codec_cache[(repo_ref.path, codec.codec, codec.dict_id)] = codec
+
+    def decode_analysis(self, repo_ref: firestore.DocumentReference, file_data: Dict) -> Dict:
+        """Replace an encoded analysis on a file document with the decoded 'ai_analysis'"""
+        encoded = file_data.pop('ai_analysis_encoded', None)
+        codec_info = file_data.pop('ai_analysis_codec', None)
+        if encoded is not None and codec_info:
+            codec = self.get_analysis_codec(repo_ref, codec_info['codec'], codec_info.get('dict_id'))
+            file_data['ai_analysis'] = codec.decode(encoded)
+        return file_data
+
+    def get_file(self, repo_ref: firestore.DocumentReference, doc_id: str,
+                 include_analysis: bool = True) -> Optional[Dict]:
+        """
+        Get a file document, loading its analysis document under the split layout
+        and decoding an encoded analysis. Without include_analysis, encoded
+        analyses are left as they are and never decoded.
+
+        Args:
+            repo_ref: Reference to repository document
+            doc_id: File document ID
+            include_analysis: Whether to load the separate analysis document
+        """
+        doc = repo_ref.collection('files').document(doc_id).get()
+        if not doc.exists:
+            return None
+        file_data = doc.to_dict()
+        if include_analysis and file_data.get('has_analysis'):
+            analysis = repo_ref.collection('analyses').document(doc_id).get()
+            if analysis.exists:
+                file_data.update(analysis.to_dict())
+        if include_analysis:
+            self.decode_analysis(repo_ref, file_data)
+        return file_data
+
+    def open_file_writer(self, repo_ref: firestore.DocumentReference, snapshot: RepositorySnapshot,
+                         max_pending: int = 200, on_flush: Callable[[List[str]], None] = None,
+                         previous_symbols: Dict[str, Dict] = None, partial: bool = False) -> 'RepositoryFileWriter':
+        """Open a streaming writer for this sync's file documents"""
+        return RepositoryFileWriter(self, repo_ref, snapshot, max_pending=max_pending, on_flush=on_flush,
+                                    previous_symbols=previous_symbols, partial=partial)
+
+    def load_previous_symbols(self, repo_ref: firestore.DocumentReference, snapshot: RepositorySnapshot,
+                              paths: List[str]) -> Dict[str, Dict]:
+        """
+        Read the indexed symbols of files that are about to be overwritten or
+        tombstoned, so the symbol index can drop entries that disappear.
+
+        Args:
+            repo_ref: Reference to repository document
+            snapshot: Snapshot of the repository's stored files
+            paths: Paths of modified and deleted files
+
+        Returns:
+            Dict of path to {symbol: kinds}
+        """
+        # Symbol fields live on the analysis document under the split layout
+        collection = repo_ref.collection('analyses' if snapshot.storage_layout == 'split' else 'files')
+        paths_by_doc_id = {
+            RepositorySnapshot.doc_id(path): path for path in paths
+            if path in snapshot and snapshot.get(path).status != 'deleted'
         }
+        doc_ids = list(paths_by_doc_id)
+        previous = {}
+        for index in range(0, len(doc_ids), 300):
+            refs = [collection.document(doc_id) for doc_id in doc_ids[index:index + 300]]
+            for doc in self.db.get_all(refs, field_paths=list(SYMBOL_FIELDS)):
+                if doc.exists:
+                    previous[paths_by_doc_id[doc.id]] = extract_symbols(doc.to_dict())
+        return previous
+
+    def store_repository_files(self, repo_ref: firestore.DocumentReference, files: List[Dict],
+                               snapshot: RepositorySnapshot = None):
+        """
+        Store repository files metadata in Firestore with metrics
 
-        # Get existing files for comparison
-        existing_files = {}
-        for doc in files_collection.stream():
-            existing_files[doc.id] = doc.to_dict()
+        Args:
+            repo_ref: Reference to repository document
+            files: File metadata dicts to store
+            snapshot: Snapshot loaded at the start of the sync; read from
+                Firestore if not provided
+        """
+        logger.debug('store_files', files=len(files))
 
-        # Track which files still exist
-        processed_files = set()
-        
+        # Reuse the sync's snapshot of existing files for comparison
+        if snapshot is None:
+            snapshot = self.load_repository_snapshot(repo_ref)
+
+        file_writer = self.open_file_writer(repo_ref, snapshot)
         for file in files:
-            # Create document ID from path
-            doc_id = file['path'].replace('/', '_')
-            processed_files.add(doc_id)
-            
-            file_ref = files_collection.document(doc_id)
-            
-            # Check if file exists and has changed
-            if doc_id in existing_files:
-                existing_file = existing_files[doc_id]
-                
-                # Check if file was previously deleted
-                if existing_file.get('status') == 'deleted':
-                    stats['restored'] += 1
-                else:
-                    # Compare relevant fields to detect changes
-                    has_changed = (
-                        file.get('metadata', {}).get('sha') != existing_file.get('metadata', {}).get('sha') or
-                        file.get('size') != existing_file.get('size') or
-                        file.get('last_updated') != existing_file.get('last_updated')
-                    )
-                    
-                    if not has_changed:
-                        stats['unchanged'] += 1
-                        continue
-                    
-                    stats['updated'] += 1
-            else:
-                stats['new'] += 1
-            
-            # Store data optimized for querying
-            batch.set(file_ref, {
-                'name': file['name'],
-                'path': file['path'],
-                'language': file['language'],
-                'size': file['size'],
-                'last_updated': file['last_updated'],
-                'last_commit_message': file.get('last_commit_message', ''),
-                
-                # Original code metadata
-                'imports': file.get('imports', []),
-                'functions': file.get('functions', []),
-                'classes': file.get('classes', []),
-                'exports': file.get('exports', []),
-                
-                # New AI analysis fields
-                'summary': file.get('summary', ''),
-                'primary_features': file.get('primary_features', []),
-                'state_management': file.get('state_management', []),
-                'modification_points': file.get('modification_points', []),
-                
-                # Detailed analysis in a subcollection
-                'ai_analysis': file.get('ai_analysis', {}),
-                'analysis_metadata': file.get('analysis_metadata', {}),
-                
-                # Important: Store metadata including SHA
-                'metadata': {
-                    'sha': file.get('metadata', {}).get('sha'),
-                    'type': file.get('metadata', {}).get('type'),
-                    'content_type': file.get('metadata', {}).get('content_type')
-                },
-                
-                'status': file.get('status', 'active'),
-                'updated_at': firestore.SERVER_TIMESTAMP,
-                'first_indexed_at': existing_files.get(doc_id, {}).get('first_indexed_at') or firestore.SERVER_TIMESTAMP
-            })
-            
-            batch_size += 1
-            if batch_size >= max_batch_size:
-                batch.commit()
-                batch = self.db.batch()
-                batch_size = 0
+            file_writer.write(file)
+        self.store_sync_summary(repo_ref, file_writer.close())
+
+    @traced('firestore.store_summary')
+    def store_sync_summary(self, repo_ref: firestore.DocumentReference, result: Dict):
+        """
+        Store the metrics document and repository counters for a finished sync
+
+        Args:
+            repo_ref: Reference to repository document
+            result: Result of RepositoryFileWriter.close()
+        """
+        stats = result['stats']
+        metrics_data, repo_data = sync_summary_documents(result)
 
-        # Handle deleted files
-        for doc_id in existing_files:
-            if doc_id not in processed_files:
-                stats['deleted'] += 1
-                files_collection.document(doc_id).set({
-                    'status': 'deleted',
-                    'deleted_at': firestore.SERVER_TIMESTAMP
-                }, merge=True)
-
-        # Commit any remaining changes
-        if batch_size > 0:
-            batch.commit()
-            
         # Store sync metrics
-        metrics_ref = metrics_collection.document()
-        metrics_ref.set({
-            'timestamp': firestore.SERVER_TIMESTAMP,
-            'stats': stats,
-            'totals': {
-                'active_files': len(processed_files),
-                'deleted_files': stats['deleted'],
-                'total_files': len(processed_files) + stats['deleted']
-            }
-        })
+        repo_ref.collection('metrics').document().set(metrics_data)
         
         # Update repository metadata
-        repo_ref.set({
-            'metadata': {
-                'last_sync_stats': stats,
-                'last_synced': firestore.SERVER_TIMESTAMP,
-                'sync_status': 'completed',
-                'file_counts': {
-                    'active': len(processed_files),
-                    'deleted': stats['deleted'],
-                    'total': len(processed_files) + stats['deleted']
-                }
-            }
-        }, merge=True)
+        repo_ref.set(repo_data, merge=True)
         
-        print(f"Sync completed: {stats['new']} new, {stats['updated']} updated, "
-              f"{stats['unchanged']} unchanged, {stats['deleted']} deleted, "
-              f"{stats['restored']} restored")
+        logger.info('sync_stored', f"Sync completed: {stats['new']} new, {stats['updated']} updated, "
+                    f"{stats['unchanged']} unchanged, {stats['deleted']} deleted, "
+                    f"{stats['restored']} restored", **stats)
 
     def update_sync_status(self, repo_ref: firestore.DocumentReference, status: str, error: str = None, progress: dict = None):
         """
@@ -210,19 +518,276 @@ class FirestoreService:
             error: Optional error message
             progress: Optional dict with progress info {'processed': int, 'total': int}
         """
-        print(f"Updating sync status to: {status}")
-        update_data = {
-            'metadata': {
-                'sync_status': status,
-                'last_synced': firestore.SERVER_TIMESTAMP
-            }
+        logger.debug('sync_status', status=status)
+        repo_ref.set(sync_status_update(status, error, progress), merge=True)
+
+class RepositoryFileWriter:
+    """
+    Streams file documents to Firestore as files finish processing.
+
+    Writes go through a BulkWriter, which sends them in the background. At
+    most ``max_pending`` writes are buffered before the writer blocks on a
+    flush, so memory stays flat however large the repository is and work
+    that has been flushed survives a crash later in the sync. ``on_flush`` is
+    called after every flush with the paths written since the previous one
+    whose documents were all stored; paths with a failed write are left out.
+
+    Symbol index changes for the written files are queued with each flush,
+    so the index stays in step with the file documents.
+
+    A ``partial`` writer stores one shard of a sharded sync: close() leaves
+    tombstones, the manifest and dictionary training to the coordinator,
+    which accounts for the shard's files with mark_stored().
+    """
+
+    def __init__(self, service: FirestoreService, repo_ref: firestore.DocumentReference,
+                 snapshot: RepositorySnapshot, max_pending: int = 200,
+                 on_flush: Callable[[List[str]], None] = None, previous_symbols: Dict[str, Dict] = None,
+                 codec: AnalysisCodec = None, partial: bool = False):
+        self.files_collection = repo_ref.collection('files')
+        self.symbol_collection = service.db.collection('symbol_index')
+        self.symbols = SymbolIndexUpdate(repo_ref.id, previous_symbols)
+        self.analyses_collection = repo_ref.collection('analyses')
+        self.manifest_collection = repo_ref.collection('manifest')
+        self.snapshot = snapshot
+        self.manifest = ManifestUpdate(snapshot.manifest)
+        self.service = service
+        self.repo_ref = repo_ref
+        self.codec = codec or service.open_analysis_codec(repo_ref, snapshot)
+        self.dictionary_samples = []
+        self.max_pending = max_pending
+        self.on_flush = on_flush
+        self.partial = partial
+        self.bulk_writer, self.write_stats = self._open_bulk_writer(service)
+        self.pending = 0
+        self.seen = set()
+        # Paths written since the last flush, with the documents they were written to
+        self.unflushed = {}
+        self.stats = {
+            'new': 0,
+            'updated': 0,
+            'unchanged': 0,
+            'deleted': 0,
+            'restored': 0
         }
-        
-        if error:
-            update_data['metadata']['error'] = error
+
+    def write(self, file: Dict):
+        """Queue a file document, skipping files that have not changed"""
+        doc_id = RepositorySnapshot.doc_id(file['path'])
+        self.seen.add(doc_id)
+
+        # Check if file exists and has changed
+        existing_file = self.snapshot.records.get(doc_id)
+        if existing_file is not None:
+            # Check if file was previously deleted
+            if existing_file.status == 'deleted':
+                self.stats['restored'] += 1
+            else:
+                # Compare relevant fields to detect changes
+                has_changed = (
+                    file.get('metadata', {}).get('sha') != existing_file.sha or
+                    file.get('size') != existing_file.size or
+                    file.get('last_updated') != existing_file.last_updated
+                )
+
+                if not has_changed:
+                    self.stats['unchanged'] += 1
+                    self.manifest.add(file['path'], {
+                        **manifest_entry(file),
+                        'status': existing_file.status or 'active'
+                    }, changed=False)
+                    self.unflushed[file['path']] = []
+                    return
+
+                self.stats['updated'] += 1
+        else:
+            self.stats['new'] += 1
+        self.manifest.add(file['path'], manifest_entry(file), changed=True)
+        self.symbols.file_changed(file['path'], file)
+
+        document = self.build_file_document(file, existing_file)
+        analysis = document.pop('ai_analysis')
+        if analysis and self.codec.codec != 'json':
+            document.update(self.codec.encode(analysis))
+            # Sample analyses to train a shared dictionary for later syncs
+            if self.codec.dictionary is None and len(self.dictionary_samples) < DICTIONARY_SAMPLE_SIZE:
+                self.dictionary_samples.append(analysis)
+        else:
+            document['ai_analysis'] = analysis
+        references = [self.files_collection.document(doc_id)]
+        if self.snapshot.storage_layout == 'split':
+            # Keep the file document slim; the analysis is loaded on demand
+            document, analysis_document = split_file_document(document)
+            if analysis_document:
+                references.append(self.analyses_collection.document(doc_id))
+                self._set(references[-1], analysis_document)
+        self._set(references[0], document)
+        # Recorded after queueing, so a flush never reports a write still to be sent
+        self.unflushed[file['path']] = references
+
+    def mark_stored(self, file: Dict):
+        """Count a changed file another shard's writer stored, without writing it"""
+        doc_id = RepositorySnapshot.doc_id(file['path'])
+        self.seen.add(doc_id)
+        existing_file = self.snapshot.records.get(doc_id)
+        if existing_file is None:
+            self.stats['new'] += 1
+        elif existing_file.status == 'deleted':
+            self.stats['restored'] += 1
+        else:
+            self.stats['updated'] += 1
+        self.manifest.add(file['path'], manifest_entry(file), changed=True)
+
+    @staticmethod
+    def build_file_document(file: Dict, existing_file: Optional[SnapshotRecord]) -> Dict:
+        """Build the stored document for a file, optimized for querying"""
+        return {
+            'name': file['name'],
+            'path': file['path'],
+            'language': file['language'],
+            'size': file['size'],
+            'last_updated': file.get('last_updated'),
+            'last_commit_message': file.get('last_commit_message', ''),
+            
+            # Original code metadata
+            'imports': file.get('imports', []),
+            'functions': file.get('functions', []),
+            'classes': file.get('classes', []),
+            'exports': file.get('exports', []),
+            
+            # New AI analysis fields
+            'summary': file.get('summary', ''),
+            'primary_features': file.get('primary_features', []),
+            'state_management': file.get('state_management', []),
+            'modification_points': file.get('modification_points', []),
             
-        if progress:
-            update_data['metadata']['progress'] = progress
-            update_data['metadata']['progress_updated_at'] = firestore.SERVER_TIMESTAMP
+            # Detailed analysis in a subcollection
+            'ai_analysis': file.get('ai_analysis', {}),
+            'analysis_metadata': file.get('analysis_metadata', {}),
             
-        repo_ref.set(update_data, merge=True)
\ No newline at end of file
+            # Important: Store metadata including SHA
+            'metadata': {
+                'sha': file.get('metadata', {}).get('sha'),
+                'type': file.get('metadata', {}).get('type'),
+                'content_type': file.get('metadata', {}).get('content_type')
+            },
+            
+            'status': file.get('status', 'active'),
+            'updated_at': firestore.SERVER_TIMESTAMP,
+            'first_indexed_at': (existing_file and existing_file.first_indexed_at) or firestore.SERVER_TIMESTAMP
+        }
+
+    def _open_bulk_writer(self, service):
+        return service.open_bulk_writer()
+
+    def _queue(self, doc_ref, data: Dict, merge: bool = False):
+        self.bulk_writer.set(doc_ref, data, merge=merge)
+
+    def _set(self, doc_ref, data: Dict, merge: bool = False):
+        self._queue(doc_ref, data, merge=merge)
+        self.pending += 1
+        if self.pending >= self.max_pending:
+            self.flush()
+
+    def _stored_paths(self) -> List[str]:
+        """Take the paths written since the last flush whose documents were all stored"""
+        written, self.unflushed = self.unflushed, {}
+        failed = self.write_stats.failed_references
+        return [path for path, references in written.items()
+                if not any(reference in failed for reference in references)]
+
+    def _queue_symbol_writes(self):
+        for symbol_doc_id, data in self.symbols.plan():
+            self._queue(self.symbol_collection.document(symbol_doc_id), data, merge=True)
+        self.symbols.changes = {}
+
+    @traced('firestore.flush')
+    def flush(self):
+        """Block until every queued write has been sent or given up on"""
+        self._queue_symbol_writes()
+        self.bulk_writer.flush()
+        self.pending = 0
+        if self.on_flush:
+            self.on_flush(self._stored_paths())
+
+    @traced('firestore.close')
+    def close(self) -> Dict:
+        """
+        Tombstone stored files that were not written in this sync and wait
+        for all writes to finish.
+
+        Returns:
+            Dict with 'stats', 'writes', 'active_files', 'storage_layout',
+            'manifest' and 'analysis_codec'
+        """
+        self._queue_closing_writes()
+
+        # Wait for all writes, including retries, to finish
+        self.bulk_writer.close()
+        trained = self._train_dictionary()
+        if trained:
+            self.service.store_analysis_dictionary(self.repo_ref, trained)
+        if self.on_flush:
+            self.on_flush(self._stored_paths())
+        return self._result(trained)
+
+    def _queue_closing_writes(self):
+        """Queue tombstones, the remaining symbol index changes and the manifest"""
+        if self.partial:
+            # The coordinator of the sharded sync writes tombstones and the manifest
+            self._queue_symbol_writes()
+            return
+
+        # Handle deleted files
+        for doc_id, record in self.snapshot.records.items():
+            if doc_id not in self.seen:
+                self.stats['deleted'] += 1
+                # Existing tombstones keep their original deleted_at, so they can expire
+                if record.status != 'deleted':
+                    self._set(self.files_collection.document(doc_id), {
+                        'status': 'deleted',
+                        'deleted_at': firestore.SERVER_TIMESTAMP
+                    }, merge=True)
+                if record.path:
+                    self.manifest.add(record.path, deleted_entry(record.path, record.sha, record.size),
+                                      changed=record.status != 'deleted')
+                    self.symbols.file_deleted(record.path)
+        self._queue_symbol_writes()
+
+        # Merge changed entries into the manifest, or rewrite it when rebuilding
+        for manifest_chunk_id, entries, merge in self.manifest.plan():
+            self._set(self.manifest_collection.document(manifest_chunk_id), {'entries': entries}, merge=merge)
+
+    def _result(self, trained: Optional[AnalysisCodec]) -> Dict:
+        writes = self.write_stats.to_dict()
+        logger.info('writes_finished', f"Wrote {writes['succeeded']} documents in {writes['duration_seconds']}s "
+                    f"({writes['ops_per_second']} ops/s, {writes['retried']} retried, {writes['failed']} failed)",
+                    **writes)
+
+        return {
+            'stats': dict(self.stats),
+            'writes': writes,
+            'active_files': len(self.seen),
+            'storage_layout': self.snapshot.storage_layout,
+            'manifest': self.manifest.metadata(),
+            'analysis_codec': self._codec_info(trained)
+        }
+
+    def _train_dictionary(self) -> Optional[AnalysisCodec]:
+        """Train a shared dictionary if this sync collected samples; the caller stores it"""
+        if self.codec.codec == 'json' or self.partial or not self.dictionary_samples:
+            return None
+        dictionary = train_dictionary(self.codec.codec, self.dictionary_samples)
+        if not dictionary:
+            return None
+        trained = AnalysisCodec(self.codec.codec, dictionary)
+        logger.info('dictionary_trained', f"Storing {len(dictionary)} byte {trained.codec} dictionary {trained.dict_id}",
+                    codec=trained.codec, dict_id=trained.dict_id, size=len(dictionary))
+        return trained
+
+    def _codec_info(self, trained: Optional[AnalysisCodec]) -> Optional[Dict]:
+        """Codec settings recorded on the repository for the next sync"""
+        if self.codec.codec == 'json':
+            return None
+        codec = trained or self.codec
+        return {'codec': codec.codec, 'dict_id': codec.dict_id}
@@ -1,12 +1,13 @@
 import google.generativeai as genai
 from datetime import datetime, UTC
 import json
-import logging
 import os
 from typing import Dict, Any, TypedDict, List, Optional
 import asyncio
+from services.telemetry import MODEL_TOKENS, span
+from services.sync_logging import get_logger
 
-logger = logging.getLogger(__name__)
+logger = get_logger(__name__)
 
 class StateInteractions(TypedDict):
     reads: List[str]
@@ -65,21 +66,22 @@ class GeminiService:
         if not api_key:
             raise ValueError("Gemini API key is required")
             
-        print(f"\nDebug: Initializing GeminiService")
-        print(f"Debug: API key length: {len(api_key)}")
-        print(f"Debug: API key first/last 4 chars: {api_key[:4]}...{api_key[-4:]}")
+        logger.debug('gemini_initializing', api_key_length=len(api_key))
         
         try:
             genai.configure(api_key=api_key)
             # Test the configuration with a simple generation
             model = genai.GenerativeModel('gemini-1.5-pro')
             response = model.generate_content("Test connection")
-            print("Debug: Successfully tested Gemini API connection")
+            logger.debug('gemini_connection_tested')
         except Exception as e:
-            print(f"Debug: Error configuring Gemini: {str(e)}")
+            logger.error('gemini_configuration_failed', f"Error configuring Gemini: {str(e)}")
             raise
             
         self.model = genai.GenerativeModel('gemini-1.5-pro')
+        # Optional limits shared with other syncs (see services.rate_limits)
+        self.concurrency_limit = None
+        self.rate_limiter = None
         
     def create_analysis_prompt(self, file_path: str, content: str) -> str:
         """
@@ -157,46 +159,71 @@ CODE CONTENT:
 
 Return only valid JSON matching the structure exactly.'''
 
+    @staticmethod
+    def get_usage(response) -> Dict:
+        """Token counts reported for a response, if the SDK provides them"""
+        usage = getattr(response, 'usage_metadata', None)
+        if not usage:
+            return {}
+        return {
+            'prompt_tokens': getattr(usage, 'prompt_token_count', 0),
+            'response_tokens': getattr(usage, 'candidates_token_count', 0),
+            'total_tokens': getattr(usage, 'total_token_count', 0)
+        }
+
+    def _generate(self, prompt: str):
+        """Blocking model call, within the shared request budget and concurrency limit"""
+        if self.rate_limiter is not None:
+            self.rate_limiter.acquire()
+        if self.concurrency_limit is None:
+            return self.model.generate_content(prompt)
+        with self.concurrency_limit:
+            return self.model.generate_content(prompt)
+
     async def generate_file_summary(self, content: str, file_path: str) -> Dict:
         """Generate structured summary for a file using Gemini"""
         try:
-            print(f"\nDebug: Generating summary for {file_path}")
             prompt = self.create_analysis_prompt(file_path, content)
-            print("Debug: Created prompt")
+            logger.debug('model_request', path=file_path, prompt_chars=len(prompt))
             
             # Make the generate_content call properly awaitable
-            response = await asyncio.to_thread(self.model.generate_content, prompt)
-            print("Debug: Received response from Gemini")
+            with span('gemini.generate', path=file_path):
+                response = await asyncio.to_thread(self._generate, prompt)
+            usage = self.get_usage(response)
+            logger.debug('model_response', path=file_path, **usage)
+            MODEL_TOKENS.inc(usage.get('prompt_tokens', 0), kind='prompt')
+            MODEL_TOKENS.inc(usage.get('response_tokens', 0), kind='response')
             
             # Parse the response as JSON
             analysis = response.text
             if isinstance(analysis, str):
-                # Try to clean the response before parsing
-                analysis = analysis.strip()
-                if analysis.startswith('```json'):
-                    analysis = analysis.split('```json')[1]
-                if analysis.endswith('```'):
-                    analysis = analysis.rsplit('```', 1)[0]
-                analysis = analysis.strip()
-                
-                print("Debug: Cleaned response:")
-                print(analysis)
-                
-                analysis = json.loads(analysis)
-                print("Debug: Successfully parsed JSON response")
+                with span('gemini.parse', path=file_path):
+                    # Try to clean the response before parsing
+                    analysis = analysis.strip()
+                    if analysis.startswith('```json'):
+                        analysis = analysis.split('```json')[1]
+                    if analysis.endswith('```'):
+                        analysis = analysis.rsplit('```', 1)[0]
+                    analysis = analysis.strip()
+                    logger.debug('model_response_cleaned', path=file_path, response=analysis)
+                    
+                    analysis = json.loads(analysis)
             
             return {
                 'analysis': analysis,
                 'generated_at': datetime.now(UTC).isoformat(),
-                'model_version': 'gemini-1.5-pro'
+                'model_version': 'gemini-1.5-pro',
+                'usage': usage
             }
             
         except Exception as e:
-            print(f"Debug: Error in generate_file_summary: {str(e)}")
-            if 'response' in locals():
-                print(f"Debug: Response type: {type(response.text)}")
-                print(f"Debug: Response content:")
-                print(response.text)
+            logger.warning(
+                'model_response_invalid',
+                f"Error generating summary for {file_path}: {str(e)}",
+                path=file_path,
+                # Truncated outside verbose mode
+                response=response.text if 'response' in locals() else None
+            )
             return {
                 'error': str(e),
                 'generated_at': datetime.now(UTC).isoformat()
@@ -1,12 +1,21 @@
 from github import Github
-from typing import List, Dict, Set
+from typing import List, Dict, Optional, Set
 from firebase_admin import firestore
 from dotenv import load_dotenv
 import os
 import hashlib
 from datetime import datetime
 import re
+import base64
+import threading
 from pathlib import Path
+from services.telemetry import traced
+from services.sync_logging import get_logger
+
+# Extensions whose imports, functions, classes and exports are extracted
+CODE_METADATA_EXTENSIONS = ['.ts', '.tsx', '.js', '.jsx', '.py']
+
+logger = get_logger(__name__)
 
 class GitHubService:
     @classmethod
@@ -54,18 +63,21 @@ class GitHubService:
     def __init__(self, token: str):
         if not token:
             raise ValueError("GitHub token is required")
-        print("Initializing GitHub client with token")
         self.github = Github(token)
+        self._repos = {}
+        self._repos_lock = threading.Lock()
+        # Optional TokenBucket shared with other syncs (see services.rate_limits)
+        self.rate_limiter = None
         
         # Verify authentication
         try:
             user = self.github.get_user()
-            print(f"Authenticated as GitHub user: {user.login}")
+            logger.info('github_authenticated', f"Authenticated as GitHub user: {user.login}")
         except Exception as e:
-            print(f"Failed to authenticate with GitHub: {str(e)}")
+            logger.error('github_authentication_failed', f"Failed to authenticate with GitHub: {str(e)}")
             raise
 
-    def _get_contents_recursive(self, repo, path, contents):
+    def _get_contents_recursive(self, repo, path, contents, ref: str = None):
         """
         Recursively get all files in a repository
         
@@ -73,17 +85,19 @@ class GitHubService:
             repo: GitHub repository object
             path: Path to get contents from
             contents: List to append contents to
+            ref: Commit SHA or branch to read (default branch if not given)
         """
         try:
-            items = repo.get_contents(path)
+            items = repo.get_contents(path, ref=ref) if ref else repo.get_contents(path)
             for item in items:
                 if item.type == "dir":
-                    self._get_contents_recursive(repo, item.path, contents)
+                    self._get_contents_recursive(repo, item.path, contents, ref=ref)
                 else:
                     # Get the last commit for this file
                     try:
                         # Just get commits without limiting parameters
-                        commits = list(repo.get_commits(path=item.path))
+                        commits = list(repo.get_commits(sha=ref, path=item.path) if ref
+                                       else repo.get_commits(path=item.path))
                         # Take the first one if available
                         last_commit = commits[0].commit if commits else None
                         
@@ -97,7 +111,7 @@ class GitHubService:
                                 content = item.decoded_content.decode('utf-8')
                                 code_metadata = self.extract_code_metadata(content, file_extension)
                             except Exception as e:
-                                print(f"Error extracting code metadata for {item.path}: {str(e)}")
+                                logger.warning('metadata_extraction_failed', str(e), path=item.path)
                         
                         # Store searchable fields at root level for better query performance
                         file_data = {
@@ -124,10 +138,11 @@ class GitHubService:
                         
                         contents.append(file_data)
                     except Exception as e:
-                        print(f"Error processing file {item.path}: {str(e)}")
+                        logger.warning('file_listing_failed', str(e), path=item.path)
         except Exception as e:
-            print(f"Error accessing path {path}: {str(e)}")
+            logger.warning('path_listing_failed', str(e), path=path)
 
+    @traced('extract_metadata')
     def extract_code_metadata(self, content: str, file_extension: str) -> Dict:
         """Extract code metadata like imports, functions, classes etc."""
         metadata = {
@@ -176,7 +191,8 @@ class GitHubService:
 
         return metadata
 
-    def get_repository_files(self, repo_full_name: str, skip_types: set = None, max_files: int = None) -> List[Dict]:
+    def get_repository_files(self, repo_full_name: str, skip_types: set = None, max_files: int = None,
+                             ref: str = None) -> List[Dict]:
         """
         Fetch all files from a GitHub repository with code metadata
         
@@ -184,6 +200,7 @@ class GitHubService:
             repo_full_name: Repository full name (owner/repo)
             skip_types: Optional set of file extensions to skip
             max_files: Optional maximum number of files to process
+            ref: Commit SHA or branch to read (default branch if not given)
             
         Returns:
             List of file metadata dictionaries
@@ -193,7 +210,7 @@ class GitHubService:
             contents = []
             
             # Use recursive method to get all files
-            self._get_contents_recursive(repo, "", contents)
+            self._get_contents_recursive(repo, "", contents, ref=ref)
             
             # Filter by file extension if needed
             if skip_types:
@@ -206,12 +223,108 @@ class GitHubService:
             return contents
             
         except Exception as e:
-            print(f"Error fetching repository contents: {str(e)}")
+            logger.error('repository_contents_failed', f"Error fetching repository contents: {str(e)}",
+                         repository=repo_full_name)
             raise
 
+    def _throttle(self):
+        """Wait for the shared request budget, if one is set"""
+        if self.rate_limiter is not None:
+            self.rate_limiter.acquire()
+
+    def _get_repo(self, repo_full_name: str):
+        """Repository object, fetched once per service and shared by worker threads"""
+        with self._repos_lock:
+            if repo_full_name not in self._repos:
+                self._throttle()
+                self._repos[repo_full_name] = self.github.get_repo(repo_full_name)
+            return self._repos[repo_full_name]
+
+    @traced('github.list_files')
+    def list_repository_files(self, repo_full_name: str, ref: str = None, skip_types: set = None,
+                              max_files: int = None) -> List[Dict]:
+        """
+        List a repository's files from its git tree in a single request
+
+        Unlike get_repository_files, no content or commit history is fetched;
+        entries carry the path, size and blob SHA needed for change detection.
+
+        Args:
+            repo_full_name: Repository full name (owner/repo)
+            ref: Commit SHA or branch to list (default branch if not given)
+            skip_types: Optional set of file extensions to skip
+            max_files: Optional maximum number of files to list
+
+        Returns:
+            List of file metadata dictionaries
+        """
+        try:
+            repo = self._get_repo(repo_full_name)
+            self._throttle()
+            tree = repo.get_git_tree(ref or repo.default_branch, recursive=True)
+            if tree.raw_data.get('truncated'):
+                logger.info('git_tree_truncated', f"Git tree of {repo_full_name} is truncated, listing contents recursively")
+                return self.get_repository_files(repo_full_name, skip_types=skip_types, max_files=max_files, ref=ref)
+
+            files = []
+            for entry in tree.tree:
+                if entry.type != 'blob':
+                    continue
+                file_extension = Path(entry.path).suffix.lower()
+                language = file_extension.lstrip('.') if file_extension else None
+                if skip_types and language and language in skip_types:
+                    continue
+                files.append({
+                    'name': Path(entry.path).name,
+                    'path': entry.path,
+                    'language': language,
+                    'size': entry.size,
+                    'metadata': {
+                        'sha': entry.sha,
+                        'type': 'file',
+                        'content_type': 'code' if file_extension in CODE_METADATA_EXTENSIONS else 'other'
+                    }
+                })
+                if max_files and len(files) >= max_files:
+                    break
+            return files
+        except Exception as e:
+            logger.error('repository_listing_failed', f"Error listing repository files: {str(e)}",
+                         repository=repo_full_name)
+            raise
+
+    @traced('github.last_commit')
+    def get_last_commit(self, repo_full_name: str, file_path: str, ref: str = None) -> Optional[Dict]:
+        """
+        Get the date and message of the last commit that touched a file
+
+        Returns:
+            Dict with 'date' (ISO format) and 'message', or None
+        """
+        repo = self._get_repo(repo_full_name)
+        self._throttle()
+        commits = repo.get_commits(sha=ref or repo.default_branch, path=file_path)
+        # Only the first page is requested
+        for commit in commits[:1]:
+            return {
+                'date': commit.commit.author.date.isoformat() if commit.commit.author else None,
+                'message': commit.commit.message
+            }
+        return None
+
+    @traced('github.fetch_content')
+    def get_blob_content(self, repo_full_name: str, sha: str) -> str:
+        """Fetch a file's content by blob SHA; blobs are not limited to 1 MB like contents"""
+        repo = self._get_repo(repo_full_name)
+        self._throttle()
+        blob = repo.get_git_blob(sha)
+        return base64.b64decode(blob.content).decode('utf-8')
+
+    @traced('github.repository_metadata')
     def get_repository_metadata(self, repo_full_name: str) -> Dict:
         """Get basic repository metadata"""
         try:
+            self._throttle()
             repo = self.github.get_repo(repo_full_name)
             return {
                 'name': repo.name,
@@ -226,9 +339,31 @@ class GitHubService:
                 'forks': repo.forks_count
             }
         except Exception as e:
-            print(f"Error fetching repository metadata: {str(e)}")
+            logger.error('repository_metadata_failed', f"Error fetching repository metadata: {str(e)}",
+                         repository=repo_full_name)
+            raise
+
+    @traced('github.head_commit')
+    def get_head_commit(self, repo_full_name: str, branch: str = None) -> str:
+        """Get the SHA of the latest commit on a branch (default branch if not given)"""
+        try:
+            repo = self._get_repo(repo_full_name)
+            self._throttle()
+            return repo.get_branch(branch or repo.default_branch).commit.sha
+        except Exception as e:
+            logger.error('head_commit_failed', f"Error fetching head commit: {str(e)}", repository=repo_full_name)
             raise
 
+    def get_rate_limit(self) -> Dict:
+        """Remaining core API requests of the token and when the budget resets"""
+        core = self.github.get_rate_limit().core
+        return {
+            'limit': core.limit,
+            'remaining': core.remaining,
+            'reset': core.reset.isoformat() if core.reset else None
+        }
+
+    @traced('github.fetch_content')
     def get_file_content(self, repo_full_name: str, file_path: str) -> str:
         """Fetch content of a specific file - useful for AI analysis later"""
         try:
@@ -236,5 +371,5 @@ class GitHubService:
             file_content = repo.get_contents(file_path)
             return file_content.decoded_content.decode('utf-8')
         except Exception as e:
-            print(f"Error fetching file content: {str(e)}")
+            logger.warning('file_fetch_failed', f"Error fetching file content: {str(e)}", path=file_path)
             raise
\ No newline at end of file
@@ -0,0 +1,275 @@
+from datetime import datetime, UTC
+from typing import Callable, Dict, List, Optional, Tuple
+import json
+import os
+import socket
+import sqlite3
+import threading
+import time
+import uuid
+from services.sync_logging import get_logger
+
+logger = get_logger(__name__)
+
+# Seconds between heartbeats of running jobs
+HEARTBEAT_INTERVAL = 30
+
+# Running jobs without a heartbeat for this long belong to a dead worker
+# and are queued again
+STALE_AFTER = 120
+
+# Attempts before a job whose workers keep dying is marked failed
+MAX_ATTEMPTS = 3
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    id TEXT PRIMARY KEY,
+    kind TEXT NOT NULL,
+    dedupe_key TEXT,
+    payload TEXT NOT NULL,
+    status TEXT NOT NULL,
+    result TEXT,
+    error TEXT,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    worker TEXT,
+    created_at REAL NOT NULL,
+    started_at REAL,
+    finished_at REAL,
+    heartbeat_at REAL
+);
+-- Only queued and running jobs are de-duplicated
+CREATE UNIQUE INDEX IF NOT EXISTS jobs_active_dedupe_key
+    ON jobs (dedupe_key) WHERE status IN ('queued', 'running');
+CREATE INDEX IF NOT EXISTS jobs_status_created_at ON jobs (status, created_at);
+"""
+
+def _timestamp(value: Optional[float]) -> Optional[str]:
+    return datetime.fromtimestamp(value, UTC).isoformat() if value is not None else None
+
+class JobQueue:
+    """
+    Durable job queue in a local SQLite database.
+
+    Jobs survive restarts: queued jobs wait in the database, and jobs left
+    running by a crashed worker are queued again once their heartbeat goes
+    stale. At most one queued or running job exists per ``dedupe_key``
+    (enforced by a partial unique index), so concurrent requests for the
+    same work share one job. Each call opens its own connection, so the
+    queue can be used from any thread or process on the host.
+    """
+
+    def __init__(self, path: str, stale_after: float = STALE_AFTER, max_attempts: int = MAX_ATTEMPTS):
+        self.path = path
+        self.stale_after = stale_after
+        self.max_attempts = max_attempts
+        self.worker_id = f"{socket.gethostname()}:{os.getpid()}"
+        connection = self._connect()
+        try:
+            connection.execute('PRAGMA journal_mode=WAL')
+            connection.executescript(SCHEMA)
+        finally:
+            connection.close()
+
+    def _connect(self) -> sqlite3.Connection:
+        # Transactions are opened explicitly with BEGIN IMMEDIATE
+        connection = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+        connection.row_factory = sqlite3.Row
+        return connection
+
+    def _transaction(self, work: Callable[[sqlite3.Connection], object]):
+        connection = self._connect()
+        try:
+            connection.execute('BEGIN IMMEDIATE')
+            try:
+                result = work(connection)
+            except Exception:
+                connection.execute('ROLLBACK')
+                raise
+            connection.execute('COMMIT')
+            return result
+        finally:
+            connection.close()
+
+    @staticmethod
+    def _job(row: Optional[sqlite3.Row]) -> Optional[Dict]:
+        if row is None:
+            return None
+        return {
+            'id': row['id'],
+            'kind': row['kind'],
+            'status': row['status'],
+            'payload': json.loads(row['payload']),
+            'result': json.loads(row['result']) if row['result'] else None,
+            'error': row['error'],
+            'attempts': row['attempts'],
+            'created_at': _timestamp(row['created_at']),
+            'started_at': _timestamp(row['started_at']),
+            'finished_at': _timestamp(row['finished_at'])
+        }
+
+    def enqueue(self, kind: str, payload: Dict, dedupe_key: str = None) -> Tuple[Dict, bool]:
+        """
+        Queue a job, unless an active job with the same dedupe key exists
+
+        Returns:
+            Tuple of (job dict, whether a new job was created)
+        """
+        def work(connection):
+            if dedupe_key is not None:
+                existing = connection.execute(
+                    "SELECT * FROM jobs WHERE dedupe_key = ? AND status IN ('queued', 'running')",
+                    (dedupe_key,)
+                ).fetchone()
+                if existing is not None:
+                    return self._job(existing), False
+            job_id = uuid.uuid4().hex
+            connection.execute(
+                "INSERT INTO jobs (id, kind, dedupe_key, payload, status, created_at) VALUES (?, ?, ?, ?, 'queued', ?)",
+                (job_id, kind, dedupe_key, json.dumps(payload), time.time())
+            )
+            return self._job(connection.execute("SELECT * FROM jobs WHERE id = ?", (job_id,)).fetchone()), True
+        return self._transaction(work)
+
+    def claim(self) -> Optional[Dict]:
+        """Take the oldest queued job and mark it running; None if there is none"""
+        def work(connection):
+            now = time.time()
+            self._recover_stale(connection, now)
+            row = connection.execute(
+                "SELECT * FROM jobs WHERE status = 'queued' ORDER BY created_at LIMIT 1"
+            ).fetchone()
+            if row is None:
+                return None
+            connection.execute(
+                "UPDATE jobs SET status = 'running', worker = ?, attempts = attempts + 1, "
+                "started_at = ?, heartbeat_at = ? WHERE id = ?",
+                (self.worker_id, now, now, row['id'])
+            )
+            return self._job(connection.execute("SELECT * FROM jobs WHERE id = ?", (row['id'],)).fetchone())
+        return self._transaction(work)
+
+    def _recover_stale(self, connection: sqlite3.Connection, now: float):
+        cutoff = now - self.stale_after
+        connection.execute(
+            "UPDATE jobs SET status = 'failed', finished_at = ?, error = 'Worker stopped responding' "
+            "WHERE status = 'running' AND heartbeat_at < ? AND attempts >= ?",
+            (now, cutoff, self.max_attempts)
+        )
+        connection.execute(
+            "UPDATE jobs SET status = 'queued', worker = NULL WHERE status = 'running' AND heartbeat_at < ?",
+            (cutoff,)
+        )
+
+    def heartbeat(self, job_ids: List[str]):
+        """Record that running jobs are still being worked on"""
+        if not job_ids:
+            return
+        placeholders = ', '.join('?' for _ in job_ids)
+        self._transaction(lambda connection: connection.execute(
+            f"UPDATE jobs SET heartbeat_at = ? WHERE status = 'running' AND id IN ({placeholders})",
+            (time.time(), *job_ids)
+        ))
+
+    def complete(self, job_id: str, result: Dict = None):
+        self._finish(job_id, 'succeeded', result=result)
+
+    def fail(self, job_id: str, error: str, result: Dict = None):
+        self._finish(job_id, 'failed', result=result, error=error)
+
+    def _finish(self, job_id: str, status: str, result: Dict = None, error: str = None):
+        self._transaction(lambda connection: connection.execute(
+            "UPDATE jobs SET status = ?, result = ?, error = ?, finished_at = ? WHERE id = ?",
+            (status, json.dumps(result) if result is not None else None, error, time.time(), job_id)
+        ))
+
+    def get(self, job_id: str) -> Optional[Dict]:
+        """Get a job by ID, or None"""
+        connection = self._connect()
+        try:
+            return self._job(connection.execute("SELECT * FROM jobs WHERE id = ?", (job_id,)).fetchone())
+        finally:
+            connection.close()
+
+class JobWorkerPool:
+    """
+    Background threads draining a JobQueue.
+
+    ``handler`` receives a job's payload and returns its result dict;
+    raising marks the job failed. At most ``workers`` jobs run at once, so
+    request handlers only ever pay for the enqueue. Running jobs are
+    heartbeated so other processes sharing the database do not reclaim them.
+    """
+
+    def __init__(self, queue: JobQueue, handler: Callable[[Dict], Dict], workers: int = 2,
+                 poll_interval: float = 5.0, heartbeat_interval: float = HEARTBEAT_INTERVAL):
+        self.queue = queue
+        self.handler = handler
+        self.workers = workers
+        self.poll_interval = poll_interval
+        self.heartbeat_interval = heartbeat_interval
+        self._wake = threading.Event()
+        self._stopping = threading.Event()
+        self._running: Dict[str, Dict] = {}
+        self._lock = threading.Lock()
+        self._threads: List[threading.Thread] = []
+
+    def start(self):
+        """Start the worker and heartbeat threads; calling it again does nothing"""
+        if self._threads:
+            return
+        for index in range(self.workers):
+            self._threads.append(threading.Thread(target=self._work, name=f'job-worker-{index}', daemon=True))
+        self._threads.append(threading.Thread(target=self._heartbeat, name='job-heartbeat', daemon=True))
+        for thread in self._threads:
+            thread.start()
+
+    def notify(self):
+        """Wake idle workers, e.g. after queueing a job"""
+        self._wake.set()
+
+    def stop(self, timeout: float = None):
+        """Stop taking jobs and wait for running ones to finish"""
+        self._stopping.set()
+        self._wake.set()
+        for thread in self._threads:
+            thread.join(timeout)
+        self._threads = []
+
+    def _work(self):
+        while not self._stopping.is_set():
+            try:
+                job = self.queue.claim()
+            except Exception as e:
+                logger.error('job_claim_failed', f"Error claiming job: {str(e)}")
+                job = None
+            if job is None:
+                self._wake.wait(self.poll_interval)
+                self._wake.clear()
+                continue
+            self._run(job)
+
+    def _run(self, job: Dict):
+        with self._lock:
+            self._running[job['id']] = job
+        try:
+            result = self.handler(job['payload'])
+            self.queue.complete(job['id'], result)
+        except Exception as e:
+            logger.error('job_failed', f"Job {job['id']} failed: {str(e)}", job_id=job['id'])
+            self.queue.fail(job['id'], str(e))
+        finally:
+            with self._lock:
+                self._running.pop(job['id'], None)
+
+    def _heartbeat(self):
+        while not self._stopping.wait(self.heartbeat_interval):
+            with self._lock:
+                job_ids = list(self._running)
+            try:
+                self.queue.heartbeat(job_ids)
+            except Exception as e:
+                logger.warning('job_heartbeat_failed', f"Error recording job heartbeat: {str(e)}")
+
+    def running_jobs(self) -> List[str]:
+        with self._lock:
+            return list(self._running)
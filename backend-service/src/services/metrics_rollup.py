@@ -0,0 +1,93 @@
+from firebase_admin import firestore
+from datetime import datetime, timedelta
+from typing import Dict, Iterable, List
+
+# Aggregate collections under the repository document, by period
+ROLLUP_COLLECTIONS = {
+    'daily': 'metrics_daily',
+    'weekly': 'metrics_weekly'
+}
+
+# Summed counters of the per-sync metrics documents
+STAT_FIELDS = ('new', 'updated', 'unchanged', 'deleted', 'restored')
+WRITE_FIELDS = ('succeeded', 'failed', 'retried', 'duration_seconds')
+
+def period_start(timestamp: datetime, period: str) -> str:
+    """
+    ID of the aggregate a timestamp falls into: its UTC date for 'daily',
+    the date of the Monday starting its ISO week for 'weekly'
+    """
+    day = timestamp.date()
+    if period == 'weekly':
+        day -= timedelta(days=day.weekday())
+    return day.isoformat()
+
+def rollup_source(data: Dict) -> Dict:
+    """
+    Normalize a per-sync metrics document or a daily aggregate into the
+    counts, totals and timestamp that are rolled up
+    """
+    if 'sync_count' in data:
+        return {
+            'sync_count': data['sync_count'],
+            'stats': data.get('stats') or {},
+            'writes': data.get('writes') or {},
+            'totals': data.get('latest_totals'),
+            'timestamp': data.get('latest_timestamp')
+        }
+    return {
+        'sync_count': 1,
+        'stats': data.get('stats') or {},
+        'writes': data.get('writes') or {},
+        'totals': data.get('totals'),
+        'timestamp': data.get('timestamp')
+    }
+
+def group_by_period(documents: Iterable[tuple], period: str, timestamp_field: str) -> Dict[str, List[tuple]]:
+    """Group (reference, data) pairs by the aggregate they roll up into"""
+    groups: Dict[str, List[tuple]] = {}
+    for reference, data in documents:
+        timestamp = data.get(timestamp_field)
+        if timestamp is None:
+            continue
+        groups.setdefault(period_start(timestamp, period), []).append((reference, data))
+    return groups
+
+def rollup_update(start: str, period: str, documents: List[Dict]) -> Dict:
+    """
+    Build the merge update that adds documents to a period's aggregate
+
+    Counters use increment transforms, so the same aggregate can be updated
+    by several compaction runs. The latest totals are kept from the newest
+    document.
+
+    Args:
+        start: Period start date (the aggregate's document ID)
+        period: 'daily' or 'weekly'
+        documents: Metrics documents or daily aggregates in the period
+
+    Returns:
+        Dict to set with merge=True
+    """
+    sources = [rollup_source(data) for data in documents]
+    update = {
+        'period': period,
+        'period_start': start,
+        'sync_count': firestore.Increment(sum(source['sync_count'] for source in sources)),
+        'stats': {
+            field: firestore.Increment(sum(source['stats'].get(field, 0) for source in sources))
+            for field in STAT_FIELDS
+        },
+        'writes': {
+            field: firestore.Increment(sum(source['writes'].get(field, 0) for source in sources))
+            for field in WRITE_FIELDS
+        },
+        'updated_at': firestore.SERVER_TIMESTAMP
+    }
+    dated = [source for source in sources if source['timestamp'] is not None]
+    if dated:
+        latest = max(dated, key=lambda source: source['timestamp'])
+        update['latest_timestamp'] = latest['timestamp']
+        if latest['totals'] is not None:
+            update['latest_totals'] = latest['totals']
+    return update
@@ -0,0 +1,103 @@
+from collections import deque
+from typing import Dict, List, Optional
+import itertools
+import json
+import threading
+
+# Events buffered per subscriber; a subscriber that falls further behind
+# loses its oldest events rather than slowing the publisher
+MAX_PENDING_EVENTS = 100
+
+# Event types that end a sync's stream
+TERMINAL_EVENTS = ('completed', 'error')
+
+class Subscription:
+    """
+    One subscriber's bounded buffer of events for a topic.
+
+    Filled by ProgressBroadcaster.publish() and drained by get(), which a
+    streaming response calls from its own thread.
+    """
+
+    def __init__(self, broadcaster: 'ProgressBroadcaster', topic: str, max_pending: int):
+        self.broadcaster = broadcaster
+        self.topic = topic
+        self.dropped = 0
+        self._events = deque(maxlen=max_pending)
+        self._condition = threading.Condition()
+
+    def push(self, event: Dict):
+        with self._condition:
+            if len(self._events) == self._events.maxlen:
+                self.dropped += 1
+            self._events.append(event)
+            self._condition.notify()
+
+    def get(self, timeout: float = None) -> Optional[Dict]:
+        """Next event, waiting up to ``timeout`` seconds; None if there was none"""
+        with self._condition:
+            if not self._condition.wait_for(lambda: self._events, timeout):
+                return None
+            return self._events.popleft()
+
+    def close(self):
+        self.broadcaster.unsubscribe(self)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+class ProgressBroadcaster:
+    """
+    In-process fan-out of sync progress events to any number of subscribers.
+
+    publish() never waits for subscribers: each has a bounded buffer that
+    drops its oldest events when full, so a slow client only misses
+    intermediate progress, never the final event, and never slows the sync.
+    The last event of each topic is kept so new subscribers start from the
+    current state, unless it is the final event of a finished sync: a new
+    subscriber waits for the next sync rather than ending on an old result.
+    """
+
+    def __init__(self, max_pending: int = MAX_PENDING_EVENTS):
+        self.max_pending = max_pending
+        self._subscriptions: Dict[str, List[Subscription]] = {}
+        self._last_events: Dict[str, Dict] = {}
+        self._ids = itertools.count(1)
+        self._lock = threading.Lock()
+
+    def subscribe(self, topic: str) -> Subscription:
+        subscription = Subscription(self, topic, self.max_pending)
+        with self._lock:
+            self._subscriptions.setdefault(topic, []).append(subscription)
+            last_event = self._last_events.get(topic)
+        if last_event is not None and last_event['event'] not in TERMINAL_EVENTS:
+            subscription.push(last_event)
+        return subscription
+
+    def unsubscribe(self, subscription: Subscription):
+        with self._lock:
+            subscriptions = self._subscriptions.get(subscription.topic, [])
+            if subscription in subscriptions:
+                subscriptions.remove(subscription)
+            if not subscriptions:
+                self._subscriptions.pop(subscription.topic, None)
+
+    def publish(self, topic: str, event_type: str, data: Dict):
+        """Send an event to every subscriber of the topic; never blocks on subscribers"""
+        event = {'id': next(self._ids), 'event': event_type, 'data': data}
+        with self._lock:
+            self._last_events[topic] = event
+            subscriptions = list(self._subscriptions.get(topic, []))
+        for subscription in subscriptions:
+            subscription.push(event)
+
+    def subscriber_count(self, topic: str) -> int:
+        with self._lock:
+            return len(self._subscriptions.get(topic, []))
+
+def format_sse(event: Dict) -> str:
+    """Encode an event in the Server-Sent Events wire format"""
+    return f"id: {event['id']}\nevent: {event['event']}\ndata: {json.dumps(event['data'])}\n\n"
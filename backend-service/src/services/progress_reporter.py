@@ -0,0 +1,130 @@
+from datetime import datetime, timedelta, UTC
+from typing import Callable, Dict, Optional
+import asyncio
+import time
+from services.sync_logging import get_logger
+
+logger = get_logger(__name__)
+
+class ProgressReporter:
+    """
+    Reports sync progress to the repository document off the hot path.
+
+    update() only records counters. A background task writes the latest
+    state when at least ``min_interval`` seconds have passed or progress has
+    moved by ``min_delta`` (a fraction of the total) since the last write,
+    coalescing everything in between into one update. Writes run in a worker
+    thread, or on the async client with AsyncFirestoreService, so they never
+    block the event loop, and close() always writes the final state, on
+    completion or on error.
+
+    With a ProgressBroadcaster, every update is also published under
+    ``topic`` as a 'file' event, and the final state as a 'completed' or
+    'error' event, for live streaming without Firestore reads.
+    """
+
+    def __init__(self, firestore_service, repo_ref, total: int,
+                 min_interval: float = 5.0, min_delta: float = 0.05, poll_interval: float = 0.5,
+                 stage_metrics: Callable[[], Dict] = None, broadcaster=None, topic: str = None):
+        self.firestore_service = firestore_service
+        self.repo_ref = repo_ref
+        self.total = total
+        self.min_interval = min_interval
+        self.min_delta = min_delta
+        self.poll_interval = poll_interval
+        self.stage_metrics = stage_metrics
+        self.broadcaster = broadcaster
+        self.topic = topic
+        self.processed = 0
+        self.tokens = 0
+        self.started_at = time.monotonic()
+        self._reported_processed = 0
+        self._reported_at = self.started_at
+        self._task: Optional[asyncio.Task] = None
+
+    def start(self):
+        """Start the background reporting task; call from inside the event loop"""
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+            if self.broadcaster is not None:
+                self.broadcaster.publish(self.topic, 'started', self.snapshot(stages=False))
+
+    def update(self, processed: int = 1, tokens: int = 0, path: str = None):
+        """Record finished files and model tokens; never blocks"""
+        self.processed += processed
+        self.tokens += tokens
+        if self.broadcaster is not None:
+            self.broadcaster.publish(self.topic, 'file', {'path': path, **self.snapshot(stages=False)})
+
+    def snapshot(self, stages: bool = True) -> Dict:
+        """Current progress with throughput and ETA"""
+        elapsed = max(time.monotonic() - self.started_at, 1e-6)
+        files_per_second = self.processed / elapsed
+        remaining = max(self.total - self.processed, 0)
+        eta_seconds = remaining / files_per_second if files_per_second > 0 else None
+        progress = {
+            'processed': self.processed,
+            'total': self.total,
+            'percent': round(100 * self.processed / self.total, 1) if self.total else 100.0,
+            'elapsed_seconds': round(elapsed, 1),
+            'files_per_second': round(files_per_second, 3),
+            'tokens': self.tokens,
+            'tokens_per_second': round(self.tokens / elapsed, 1),
+            'eta_seconds': round(eta_seconds, 1) if eta_seconds is not None else None,
+            'projected_finish': (
+                (datetime.now(UTC) + timedelta(seconds=eta_seconds)).isoformat()
+                if eta_seconds is not None else None
+            )
+        }
+        if stages and self.stage_metrics:
+            # Per-stage queue depths and utilisation show where the sync is waiting
+            progress['stages'] = self.stage_metrics()
+        return progress
+
+    def _due(self) -> bool:
+        if self.processed == self._reported_processed:
+            return False
+        if time.monotonic() - self._reported_at >= self.min_interval:
+            return True
+        delta = (self.processed - self._reported_processed) / self.total if self.total else 1.0
+        return delta >= self.min_delta
+
+    async def _write(self, status: str, error: str = None):
+        progress = self.snapshot()
+        self._reported_processed = self.processed
+        self._reported_at = time.monotonic()
+        if self.broadcaster is not None and status != 'in_progress':
+            self.broadcaster.publish(self.topic, status, {'status': status, 'error': error, **progress})
+        if asyncio.iscoroutinefunction(self.firestore_service.update_sync_status):
+            await self.firestore_service.update_sync_status(self.repo_ref, status, error=error, progress=progress)
+            return
+        await asyncio.to_thread(
+            self.firestore_service.update_sync_status,
+            self.repo_ref,
+            status,
+            error=error,
+            progress=progress
+        )
+
+    async def _run(self):
+        while True:
+            await asyncio.sleep(self.poll_interval)
+            if self._due():
+                try:
+                    await self._write('in_progress')
+                except Exception as e:
+                    logger.warning('progress_update_failed', f"Failed to update progress: {str(e)}")
+
+    async def close(self, status: str = 'completed', error: str = None, write: bool = True):
+        """Stop reporting and write the final state; without ``write`` only subscribers get it"""
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        if write:
+            await self._write(status, error=error)
+        elif self.broadcaster is not None:
+            self.broadcaster.publish(self.topic, status, {'status': status, 'error': error, **self.snapshot()})
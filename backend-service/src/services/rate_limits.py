@@ -0,0 +1,93 @@
+from typing import Dict, Iterable, Optional
+import threading
+import time
+
+# Requests a GitHub budget allows in a burst before refilling at its rate
+GITHUB_BURST = 50
+
+class TokenBucket:
+    """
+    Blocking token bucket for request budgets.
+
+    The lock and state default to in-process objects; pass a multiprocessing
+    manager's Lock and dict to share one budget between worker processes.
+    acquire() blocks the calling thread, so call it from worker threads
+    rather than from the event loop.
+    """
+
+    def __init__(self, rate: float, capacity: float = None, lock=None, state=None):
+        if rate <= 0:
+            raise ValueError("Rate must be positive")
+        self.rate = rate
+        self.capacity = capacity or max(rate, 1)
+        self._lock = lock if lock is not None else threading.Lock()
+        self._state = state if state is not None else {}
+        self._state.update(tokens=self.capacity, updated_at=time.time())
+
+    def acquire(self, tokens: float = 1):
+        """Wait until ``tokens`` are available and take them"""
+        while True:
+            with self._lock:
+                now = time.time()
+                elapsed = max(now - self._state['updated_at'], 0)
+                available = min(self.capacity, self._state['tokens'] + elapsed * self.rate)
+                if available >= tokens:
+                    self._state.update(tokens=available - tokens, updated_at=now)
+                    return
+                wait = (tokens - available) / self.rate
+            time.sleep(wait)
+
+class SharedLimits:
+    """
+    Rate-limit budgets and model concurrency shared by every worker of a
+    scheduler run.
+
+    GitHub budgets are per account, since each account syncs with its own
+    token; model limits are global.
+
+    Attributes:
+        github: Dict of account ID to TokenBucket for GitHub API requests
+        model_slots: Semaphore bounding concurrent model requests
+        model_requests: Optional TokenBucket for model requests
+    """
+
+    def __init__(self, github: Dict[str, TokenBucket], model_slots,
+                 model_requests: Optional[TokenBucket] = None):
+        self.github = github
+        self.model_slots = model_slots
+        self.model_requests = model_requests
+
+    @classmethod
+    def create(cls, manager, account_ids: Iterable[str], github_requests_per_hour: int = 4500,
+               model_concurrency: int = 8, model_requests_per_minute: int = None) -> 'SharedLimits':
+        """
+        Create limits backed by a multiprocessing manager, so they can be
+        passed to worker processes
+
+        Args:
+            manager: multiprocessing Manager
+            account_ids: Accounts whose GitHub tokens are used in the run
+            github_requests_per_hour: GitHub request budget per account
+            model_concurrency: Model requests in flight across all workers
+            model_requests_per_minute: Optional model request budget across all workers
+
+        Returns:
+            SharedLimits instance
+        """
+        github = {
+            account_id: TokenBucket(github_requests_per_hour / 3600, capacity=GITHUB_BURST,
+                                    lock=manager.Lock(), state=manager.dict())
+            for account_id in set(account_ids)
+        }
+        model_requests = None
+        if model_requests_per_minute:
+            model_requests = TokenBucket(model_requests_per_minute / 60, lock=manager.Lock(), state=manager.dict())
+        return cls(github, manager.BoundedSemaphore(model_concurrency), model_requests)
+
+    def apply(self, account_id: str = None, github_service=None, gemini_service=None):
+        """Make services draw from these limits"""
+        if github_service is not None:
+            github_service.rate_limiter = self.github.get(account_id)
+        if gemini_service is not None:
+            gemini_service.concurrency_limit = self.model_slots
+            gemini_service.rate_limiter = self.model_requests
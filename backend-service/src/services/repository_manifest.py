@@ -0,0 +1,110 @@
+from typing import Dict, Iterable, List, Optional
+from pathlib import Path
+import math
+import zlib
+
+# Target number of entries per manifest chunk when the manifest is (re)built
+ENTRIES_PER_CHUNK = 2000
+
+# Chunks are rebuilt into more chunks once they average more entries than this,
+# keeping every chunk far below the 1 MiB document limit
+MAX_ENTRIES_PER_CHUNK = 4000
+
+def chunk_count_for(entry_count: int) -> int:
+    """Number of chunks to use for a manifest with this many entries"""
+    return max(1, math.ceil(entry_count / ENTRIES_PER_CHUNK))
+
+def chunk_index(path: str, chunk_count: int) -> int:
+    """Stable chunk index for a path"""
+    return zlib.crc32(path.encode('utf-8')) % chunk_count
+
+def chunk_id(index: int) -> str:
+    return f'chunk_{index:04d}'
+
+def manifest_entry(file: Dict) -> Dict:
+    """Compact manifest entry for a file metadata dict"""
+    return {
+        'language': file.get('language'),
+        'size': file.get('size'),
+        'status': file.get('status', 'active'),
+        'sha': file.get('metadata', {}).get('sha')
+    }
+
+def deleted_entry(path: str, sha: Optional[str], size: Optional[int]) -> Dict:
+    """Manifest entry for a file that no longer exists"""
+    suffix = Path(path).suffix.lower()
+    return {
+        'language': suffix.lstrip('.') if suffix else None,
+        'size': size,
+        'status': 'deleted',
+        'sha': sha
+    }
+
+class ManifestUpdate:
+    """
+    Collects manifest entries during a sync and plans the chunk writes.
+
+    The manifest lives at repositories/{repo_id}/manifest/chunk_NNNN, each
+    chunk holding an 'entries' map of path to language, size, status and
+    SHA. Paths are assigned to chunks by a stable hash. Normally only the
+    entries that changed in this sync are merged into their chunks. The
+    whole manifest is rewritten when it does not exist yet or has outgrown
+    its chunk count, so every seen entry is kept until the sync closes.
+    """
+
+    def __init__(self, manifest: Optional[Dict] = None):
+        self.chunk_count = (manifest or {}).get('chunk_count')
+        self.entries = {}
+        self.changed = set()
+
+    def add(self, path: str, entry: Dict, changed: bool):
+        """Record the current entry for a path"""
+        self.entries[path] = entry
+        if changed:
+            self.changed.add(path)
+
+    def plan(self) -> List[tuple]:
+        """
+        Plan the chunk writes for this sync
+
+        Returns:
+            List of (chunk_id, entries, merge) tuples; merge is False when
+            the chunk is rewritten as part of a rebuild
+        """
+        entry_count = len(self.entries)
+        rebuild = (
+            not self.chunk_count or
+            entry_count > self.chunk_count * MAX_ENTRIES_PER_CHUNK
+        )
+        if rebuild:
+            self.chunk_count = chunk_count_for(entry_count)
+            paths: Iterable[str] = self.entries.keys()
+        else:
+            paths = self.changed
+
+        chunks = {index: {} for index in range(self.chunk_count)} if rebuild else {}
+        for path in paths:
+            chunks.setdefault(chunk_index(path, self.chunk_count), {})[path] = self.entries[path]
+
+        return [(chunk_id(index), entries, not rebuild) for index, entries in sorted(chunks.items())]
+
+    def metadata(self) -> Dict:
+        """Manifest summary stored on the repository document"""
+        return {
+            'chunk_count': self.chunk_count,
+            'entry_count': len(self.entries)
+        }
+
+def read_manifest(repo_ref) -> Optional[List[Dict]]:
+    """
+    Read a repository's manifest as a list of entries with their paths
+
+    Returns:
+        List of dicts with 'path', 'language', 'size', 'status' and 'sha',
+        or None if the repository has no manifest yet
+    """
+    files = []
+    for chunk in repo_ref.collection('manifest').stream():
+        for path, entry in (chunk.to_dict().get('entries') or {}).items():
+            files.append({'path': path, **entry})
+    return files or None
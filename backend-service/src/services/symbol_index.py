@@ -0,0 +1,149 @@
+from firebase_admin import firestore
+from typing import Dict, List, Optional, Set
+import hashlib
+
+# File fields that feed the index, and the kind recorded for each
+SYMBOL_FIELDS = {
+    'imports': 'import',
+    'functions': 'function',
+    'classes': 'class',
+    'exports': 'export'
+}
+
+# Longest symbol indexed; longer values are regex noise, not identifiers
+MAX_SYMBOL_LENGTH = 200
+
+# Index documents per (repository, symbol), split by path hash, so common
+# symbols such as '__init__' or 'main' stay well under the 1 MiB document limit
+SYMBOL_BUCKETS = 32
+
+# Paths returned per (repository, symbol) by search_symbols
+MAX_PATHS_PER_SYMBOL = 100
+
+def extract_symbols(file: Dict) -> Dict[str, List[str]]:
+    """
+    Map each symbol a file defines or imports to its sorted kinds
+
+    Accepts both the regex-extracted string lists and the AI analysis
+    entries (dicts with 'name' or 'path') stored in the same fields.
+    """
+    symbols: Dict[str, Set[str]] = {}
+    for field, kind in SYMBOL_FIELDS.items():
+        for item in file.get(field) or []:
+            if isinstance(item, dict):
+                item = item.get('name') or item.get('path')
+            if isinstance(item, str) and 0 < len(item) <= MAX_SYMBOL_LENGTH:
+                symbols.setdefault(item, set()).add(kind)
+    return {symbol: sorted(kinds) for symbol, kinds in symbols.items()}
+
+def symbol_bucket(path: str) -> int:
+    """Bucket of a file path within a symbol's index documents"""
+    return int(hashlib.sha1(path.encode('utf-8')).hexdigest()[:8], 16) % SYMBOL_BUCKETS
+
+def symbol_doc_id(repo_id: str, symbol: str, bucket: int) -> str:
+    """Index document ID; each symbol is sharded per repository and path bucket"""
+    return f"{repo_id}_{hashlib.sha1(symbol.encode('utf-8')).hexdigest()[:20]}_{bucket:02d}"
+
+class SymbolIndexUpdate:
+    """
+    Per-sync delta for the cross-repository symbol index.
+
+    The index lives in the top-level 'symbol_index' collection with one
+    document per (repository, symbol, path bucket), holding 'symbol',
+    'symbol_lower', 'repo_id', 'bucket' and an 'entries' map of path to
+    kinds. The entries map is excluded from indexing. Only
+    files that changed in the sync are recorded here; their previous
+    symbols, read before the file documents are overwritten, tell which
+    entries to remove.
+    """
+
+    def __init__(self, repo_id: str, previous: Dict[str, Dict[str, List[str]]] = None):
+        self.repo_id = repo_id
+        self.previous = previous or {}
+        self.changes: Dict[str, Dict[str, Optional[List[str]]]] = {}
+
+    def file_changed(self, path: str, file: Dict):
+        """Record the current symbols of a new or modified file"""
+        current = extract_symbols(file)
+        for symbol in self.previous.get(path, {}):
+            if symbol not in current:
+                self.changes.setdefault(symbol, {})[path] = None
+        for symbol, kinds in current.items():
+            if self.previous.get(path, {}).get(symbol) != kinds:
+                self.changes.setdefault(symbol, {})[path] = kinds
+
+    def file_deleted(self, path: str):
+        """Remove every entry of a deleted file"""
+        for symbol in self.previous.get(path, {}):
+            self.changes.setdefault(symbol, {})[path] = None
+
+    def plan(self) -> List[tuple]:
+        """
+        Plan the index writes for this sync
+
+        Returns:
+            List of (doc_id, data) tuples to set with merge=True
+        """
+        writes = []
+        for symbol, entries in self.changes.items():
+            buckets: Dict[int, Dict] = {}
+            for path, kinds in entries.items():
+                buckets.setdefault(symbol_bucket(path), {})[path] = \
+                    firestore.DELETE_FIELD if kinds is None else kinds
+            for bucket, bucket_entries in sorted(buckets.items()):
+                writes.append((symbol_doc_id(self.repo_id, symbol, bucket), {
+                    'symbol': symbol,
+                    'symbol_lower': symbol.lower(),
+                    'repo_id': self.repo_id,
+                    'bucket': bucket,
+                    'entries': bucket_entries,
+                    'updated_at': firestore.SERVER_TIMESTAMP
+                }))
+        return writes
+
+def search_symbols(db, prefix: str, kind: str = None, repo_id: str = None, limit: int = 50,
+                   max_paths: int = MAX_PATHS_PER_SYMBOL) -> List[Dict]:
+    """
+    Find files that define or import symbols starting with a prefix
+
+    Args:
+        db: Firestore client
+        prefix: Case-insensitive symbol prefix
+        kind: Optional kind filter ('import', 'function', 'class', 'export')
+        repo_id: Optional repository ID to search in
+        limit: Maximum number of index documents to read
+        max_paths: Maximum number of paths returned per symbol and repository
+
+    Returns:
+        List of dicts with 'symbol', 'repo_id', 'path' and 'kinds'
+    """
+    prefix = prefix.lower()
+    query = db.collection('symbol_index')
+    if repo_id:
+        query = query.where('repo_id', '==', repo_id)
+    query = query.where('symbol_lower', '>=', prefix) \
+        .where('symbol_lower', '<', prefix + '\uf8ff') \
+        .order_by('symbol_lower') \
+        .limit(limit)
+
+    results = []
+    path_counts: Dict[tuple, int] = {}
+    for doc in query.stream():
+        data = doc.to_dict()
+        # Unbucketed documents from before path buckets are no longer kept up to date
+        if 'bucket' not in data:
+            continue
+        key = (data['repo_id'], data['symbol'])
+        for path, kinds in sorted((data.get('entries') or {}).items()):
+            if kind and kind not in kinds:
+                continue
+            if path_counts.get(key, 0) >= max_paths:
+                break
+            path_counts[key] = path_counts.get(key, 0) + 1
+            results.append({
+                'symbol': data['symbol'],
+                'repo_id': data['repo_id'],
+                'path': path,
+                'kinds': kinds
+            })
+    return results
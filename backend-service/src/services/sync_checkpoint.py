@@ -0,0 +1,145 @@
+from firebase_admin import firestore
+from typing import Dict, List, Optional, Set
+import uuid
+from services.sync_logging import get_logger
+
+logger = get_logger(__name__)
+
+# Paths stored per checkpoint chunk document, well under the 1 MiB document limit
+CHUNK_SIZE = 5000
+
+# Run statuses that can be picked up again by a later sync
+RESUMABLE_STATUSES = ('in_progress', 'failed')
+
+class SyncCheckpoint:
+    """
+    Durable progress record for one sync run.
+
+    Stored at repositories/{repo_id}/sync_runs/{run_id}. The run document
+    holds the target commit and status; the paths the run has to process
+    and the paths it has finished are kept in 'pending' and 'completed'
+    chunk subcollections so large repositories stay under document size
+    limits. Paths are recorded as completed by save_stored() once the file
+    writer has flushed them, so a path whose write failed is never counted
+    as done.
+    """
+
+    def __init__(self, run_ref, target_commit: str, pending_paths: List[str],
+                 completed_paths: Set[str] = None, completed_chunks: int = 0):
+        self.run_ref = run_ref
+        self.run_id = run_ref.id
+        self.target_commit = target_commit
+        self.pending_paths = pending_paths
+        self.completed_paths = completed_paths or set()
+        self.completed_chunks = completed_chunks
+        self._unsaved = []
+
+    @classmethod
+    def start(cls, repo_ref, target_commit: str, pending_paths: List[str]) -> 'SyncCheckpoint':
+        """Create the checkpoint record for a new sync run"""
+        run_ref = repo_ref.collection('sync_runs').document(uuid.uuid4().hex)
+        run_ref.set({
+            'target_commit': target_commit,
+            'status': 'in_progress',
+            'pending_count': len(pending_paths),
+            'completed_count': 0,
+            'started_at': firestore.SERVER_TIMESTAMP,
+            'updated_at': firestore.SERVER_TIMESTAMP
+        })
+        for index in range(0, len(pending_paths), CHUNK_SIZE):
+            run_ref.collection('pending').document(f'{index // CHUNK_SIZE:05d}').set({
+                'paths': pending_paths[index:index + CHUNK_SIZE]
+            })
+        logger.info('sync_run_started', f"Started sync run {run_ref.id} at commit {target_commit}",
+                    run_id=run_ref.id, commit=target_commit, pending=len(pending_paths))
+        return cls(run_ref, target_commit, pending_paths)
+
+    @classmethod
+    def find_resumable(cls, repo_ref, target_commit: str) -> Optional['SyncCheckpoint']:
+        """
+        Load the most recent unfinished run for the same target commit
+
+        Only reads; call resume() on the result to take the run over.
+
+        Returns:
+            SyncCheckpoint with its pending and completed paths, or None
+        """
+        # Runs without a start time (legacy documents) are left out by the ordering
+        runs = repo_ref.collection('sync_runs') \
+            .where('target_commit', '==', target_commit) \
+            .where('status', 'in', list(RESUMABLE_STATUSES)) \
+            .order_by('started_at', direction=firestore.Query.DESCENDING) \
+            .limit(1) \
+            .stream()
+        latest = next(iter(runs), None)
+        if latest is None:
+            return None
+
+        pending_paths = []
+        for chunk in latest.reference.collection('pending').stream():
+            pending_paths.extend(chunk.get('paths'))
+
+        completed_paths = set()
+        completed_chunks = 0
+        for chunk in latest.reference.collection('completed').stream():
+            completed_paths.update(chunk.get('paths'))
+            completed_chunks += 1
+
+        return cls(latest.reference, target_commit, pending_paths,
+                   completed_paths=completed_paths, completed_chunks=completed_chunks)
+
+    def resume(self) -> 'SyncCheckpoint':
+        """Mark a run found by find_resumable as in progress again"""
+        logger.info('sync_run_resumed', f"Resuming sync run {self.run_id}: {len(self.completed_paths)} of "
+                    f"{len(self.pending_paths)} files already completed",
+                    run_id=self.run_id, completed=len(self.completed_paths), pending=len(self.pending_paths))
+        self.run_ref.set({
+            'status': 'in_progress',
+            'resumed_at': firestore.SERVER_TIMESTAMP
+        }, merge=True)
+        return self
+
+    def is_completed(self, path: str) -> bool:
+        return path in self.completed_paths
+
+    def mark_completed(self, path: str):
+        """Record a finished path; it is saved on the next save()"""
+        self.completed_paths.add(path)
+        self._unsaved.append(path)
+
+    def save(self):
+        """Persist completed paths recorded since the last save"""
+        if not self._unsaved:
+            return
+        paths, self._unsaved = self._unsaved, []
+        chunk_id = f'{self.completed_chunks:05d}'
+        self.run_ref.collection('completed').document(chunk_id).set({'paths': paths})
+        self.completed_chunks += 1
+        self.run_ref.set({
+            'completed_count': len(self.completed_paths),
+            'updated_at': firestore.SERVER_TIMESTAMP
+        }, merge=True)
+
+    def save_stored(self, paths: List[str]):
+        """Record the paths a file writer flush stored and save them"""
+        for path in paths:
+            self.mark_completed(path)
+        self.save()
+
+    def finish(self, status: str, error: str = None):
+        """
+        Save outstanding progress and close the run
+
+        Args:
+            status: 'completed', or 'failed' to leave the run resumable
+            error: Optional error message
+        """
+        self.save()
+        update_data: Dict = {
+            'status': status,
+            'finished_at': firestore.SERVER_TIMESTAMP,
+            'updated_at': firestore.SERVER_TIMESTAMP
+        }
+        if error:
+            update_data['error'] = error
+        self.run_ref.set(update_data, merge=True)
@@ -0,0 +1,224 @@
+from datetime import datetime, timedelta, UTC
+from firebase_admin import firestore
+from typing import Callable, Dict, Optional, Tuple
+import asyncio
+import os
+import socket
+import time
+import uuid
+from services.sync_logging import get_logger
+
+logger = get_logger(__name__)
+
+# Leases not renewed for this long belong to a crashed sync and are taken over
+LEASE_SECONDS = 120
+
+# Seconds between lease renewals while a sync runs
+HEARTBEAT_INTERVAL = 30
+
+# Seconds between checks while waiting for another sync of the repository
+POLL_INTERVAL = 5
+
+# What a sync does when the repository is already being synced: 'join'
+# waits for the running sync and returns its result, 'queue' waits for it
+# and then syncs again
+IF_RUNNING_MODES = ('join', 'queue')
+
+def lease_is_live(lease: Optional[Dict], now: datetime) -> bool:
+    """Whether a stored lease is still held, i.e. renewed within its expiry"""
+    return bool(lease) and lease.get('expires_at') is not None and lease['expires_at'] > now
+
+def lease_held_by(repo_ref, run_id: str) -> bool:
+    """Whether the sync with this run ID still holds the repository's live lease"""
+    doc = repo_ref.get(field_paths=['sync_lease'])
+    held = ((doc.to_dict() or {}) if doc.exists else {}).get('sync_lease')
+    return lease_is_live(held, datetime.now(UTC)) and held.get('run_id') == run_id
+
+def joined_result(last_run: Dict) -> Dict:
+    """Result of process_repository for a request that joined another sync"""
+    result = {
+        'status': last_run.get('status', 'error'),
+        'joined': True,
+        'run_id': last_run.get('run_id'),
+        'file_count': last_run.get('file_count', 0),
+        'changed_files': last_run.get('changed_files', 0)
+    }
+    if result['status'] != 'success':
+        result['error'] = last_run.get('error') or 'Joined sync did not succeed'
+    return result
+
+class SyncLease:
+    """
+    Exclusive right to sync one repository.
+
+    Held in the 'sync_lease' field of the repository document with its
+    run ID, owner and expiry. The holder renews the lease while it syncs
+    and clears it on release, recording the run's outcome in
+    'last_sync_run' so requests that waited for it can return the same
+    result. A lease that is not renewed expires, so a crashed sync blocks
+    the repository for at most ``lease_seconds``. Once another sync has
+    taken the lease over, ``lost`` is set and check() raises, so this sync
+    stops writing.
+    """
+
+    def __init__(self, repo_ref, lease_seconds: float = LEASE_SECONDS):
+        self.repo_ref = repo_ref
+        self.run_id = uuid.uuid4().hex
+        self.owner = f"{socket.gethostname()}:{os.getpid()}"
+        self.lease_seconds = lease_seconds
+        self.lost = False
+
+    def _lease(self) -> Dict:
+        now = datetime.now(UTC)
+        return {
+            'run_id': self.run_id,
+            'owner': self.owner,
+            'expires_at': now + timedelta(seconds=self.lease_seconds),
+            'renewed_at': now
+        }
+
+    def try_acquire(self, join_run_id: str = None) -> Tuple[bool, Dict]:
+        """
+        Take the lease if no live sync holds it
+
+        Args:
+            join_run_id: Run ID of a sync being waited for; once it has
+                finished, the lease is left alone so its result can be joined
+
+        Returns:
+            Tuple of (whether the lease was taken, stored 'sync_lease' and
+            'last_sync_run' fields)
+        """
+        @firestore.transactional
+        def work(transaction) -> Tuple[bool, Dict]:
+            doc = self.repo_ref.get(field_paths=['sync_lease', 'last_sync_run'], transaction=transaction)
+            state = (doc.to_dict() or {}) if doc.exists else {}
+            last_run = state.get('last_sync_run') or {}
+            if join_run_id and last_run.get('run_id') == join_run_id:
+                return False, state
+            held = state.get('sync_lease')
+            if lease_is_live(held, datetime.now(UTC)) and held.get('run_id') != self.run_id:
+                return False, state
+            if held:
+                logger.warning('sync_lease_reclaimed', f"Taking over expired sync lease of run {held.get('run_id')}",
+                               repository=self.repo_ref.id, run_id=held.get('run_id'), owner=held.get('owner'))
+            transaction.set(self.repo_ref, {'sync_lease': self._lease()}, merge=True)
+            return True, state
+
+        return work(firestore.client().transaction())
+
+    def renew(self) -> bool:
+        """Extend the lease; returns False if another sync has taken it over"""
+        @firestore.transactional
+        def work(transaction) -> bool:
+            doc = self.repo_ref.get(field_paths=['sync_lease'], transaction=transaction)
+            held = ((doc.to_dict() or {}) if doc.exists else {}).get('sync_lease') or {}
+            if held.get('run_id') != self.run_id:
+                return False
+            transaction.update(self.repo_ref, {'sync_lease': self._lease()})
+            return True
+
+        return work(firestore.client().transaction())
+
+    def check(self):
+        """Raise if another sync has taken the lease over"""
+        if self.lost:
+            raise RuntimeError(f"Sync lease of run {self.run_id} was taken over by another sync")
+
+    async def hold(self, interval: float = HEARTBEAT_INTERVAL):
+        """
+        Renew the lease every ``interval`` seconds until cancelled or lost
+
+        A lost lease is not taken back: the sync fails at its next check().
+        """
+        while True:
+            await asyncio.sleep(interval)
+            try:
+                if not await asyncio.to_thread(self.renew):
+                    self.lost = True
+                    logger.error('sync_lease_lost', f"Sync lease of run {self.run_id} was taken over",
+                                 repository=self.repo_ref.id, run_id=self.run_id)
+                    return
+            except Exception as e:
+                logger.warning('sync_lease_renew_failed', f"Failed to renew sync lease: {str(e)}",
+                               repository=self.repo_ref.id, run_id=self.run_id)
+
+    def release(self, result: Dict):
+        """
+        Clear the lease and record the run's outcome for joined requests
+
+        Args:
+            result: Result of process_repository
+        """
+        last_run = {
+            'run_id': self.run_id,
+            'owner': self.owner,
+            'status': result['status'],
+            'file_count': result.get('file_count', 0),
+            'changed_files': result.get('changed_files', 0),
+            'finished_at': firestore.SERVER_TIMESTAMP
+        }
+        if result.get('error'):
+            last_run['error'] = result['error'].split('\n', 1)[0]
+
+        @firestore.transactional
+        def work(transaction):
+            doc = self.repo_ref.get(field_paths=['sync_lease'], transaction=transaction)
+            held = ((doc.to_dict() or {}) if doc.exists else {}).get('sync_lease') or {}
+            update = {'last_sync_run': last_run}
+            # A lease taken over after this one expired stays with its new holder
+            if held.get('run_id') == self.run_id:
+                update['sync_lease'] = firestore.DELETE_FIELD
+            transaction.update(self.repo_ref, update)
+
+        work(firestore.client().transaction())
+
+async def acquire_sync_lease(repo_ref, if_running: str = 'join', poll_interval: float = POLL_INTERVAL,
+                             timeout: float = None, on_wait: Callable[[Dict], None] = None
+                             ) -> Tuple[Optional[SyncLease], Optional[Dict]]:
+    """
+    Take the repository's sync lease, waiting while another sync holds it
+
+    Args:
+        repo_ref: Reference to repository document
+        if_running: 'join' to return the running sync's result once it
+            finishes, or 'queue' to wait for it and then take the lease
+        poll_interval: Seconds between checks of the running sync
+        timeout: Optional seconds to wait before giving up
+        on_wait: Optional callback given the held lease whenever this sync
+            starts waiting for another run
+
+    Returns:
+        Tuple of (lease, None) once this sync holds the lease, or
+        (None, result) after joining another sync
+
+    Raises:
+        TimeoutError: If the lease could not be taken within ``timeout``
+    """
+    if if_running not in IF_RUNNING_MODES:
+        raise ValueError(f"Unknown if_running mode: {if_running}")
+    lease = SyncLease(repo_ref)
+    started_at = time.monotonic()
+    waiting_for = None
+    while True:
+        acquired, state = await asyncio.to_thread(
+            lease.try_acquire, waiting_for if if_running == 'join' else None
+        )
+        if acquired:
+            return lease, None
+        last_run = state.get('last_sync_run') or {}
+        if if_running == 'join' and waiting_for and last_run.get('run_id') == waiting_for:
+            logger.info('sync_joined', f"Joined sync run {waiting_for}: {last_run.get('status')}",
+                        repository=repo_ref.id, run_id=waiting_for, status=last_run.get('status'))
+            return None, joined_result(last_run)
+        held = state.get('sync_lease') or {}
+        if held.get('run_id') != waiting_for:
+            # Follows the lease if the sync waited for crashed and another took over
+            waiting_for = held.get('run_id')
+            logger.info('sync_running', f"Repository is being synced by run {waiting_for}, waiting for it",
+                        repository=repo_ref.id, run_id=waiting_for, owner=held.get('owner'), mode=if_running)
+            if on_wait is not None:
+                on_wait(held)
+        if timeout is not None and time.monotonic() - started_at >= timeout:
+            raise TimeoutError(f"Repository {repo_ref.id} is still being synced by run {waiting_for}")
+        await asyncio.sleep(poll_interval)
@@ -0,0 +1,274 @@
+from logging.handlers import QueueHandler, QueueListener
+from typing import Dict, Optional
+import atexit
+import copy
+import json
+import logging
+import os
+import queue
+import sys
+import threading
+import time
+
+# Logging modes: 'verbose' writes text records in full, 'quiet' writes JSON
+# lines with per-file warnings sampled and long fields truncated
+LOG_MODES = ('verbose', 'quiet')
+
+# Longest string field written in quiet mode
+MAX_FIELD_LENGTH = 200
+
+# Loggers of the sync code; the level applies to these, while other
+# libraries log at INFO (verbose) or WARNING (quiet)
+SYNC_LOGGERS = ('services', 'main', 'src', '__main__')
+
+# Files per progress summary record
+SUMMARY_EVERY = 100
+
+# Per-file events kept 1 in N times in quiet mode; errors are never sampled
+QUIET_SAMPLE_RATES = {
+    'file_fetch_failed': 10,
+    'file_analysis_retry': 10,
+    'file_analysis_failed': 10,
+    'metadata_extraction_failed': 10,
+    'model_response_invalid': 10
+}
+
+# Attributes every LogRecord has, so the rest are event fields
+_RECORD_ATTRIBUTES = set(vars(logging.makeLogRecord({}))) | {'message', 'asctime', 'event', 'fields'}
+
+_listener: Optional[QueueListener] = None
+_mode = 'verbose'
+
+def _truncate(value, max_length: Optional[int]):
+    if max_length and isinstance(value, str) and len(value) > max_length:
+        return f'{value[:max_length]}... [{len(value) - max_length} more chars]'
+    return value
+
+class EventLogger:
+    """
+    Logs named events with fields, e.g. ``log.debug('file_new', path=path)``.
+
+    Fields are only formatted when the level is enabled, so disabled debug
+    events on hot paths cost one level check.
+    """
+
+    def __init__(self, name: str):
+        self.logger = logging.getLogger(name)
+
+    def log(self, level: int, event: str, message: str = None, exc_info=None, **fields):
+        if self.logger.isEnabledFor(level):
+            self.logger.log(level, message or event, exc_info=exc_info,
+                            extra={'event': event, 'fields': fields})
+
+    def debug(self, event: str, message: str = None, **fields):
+        self.log(logging.DEBUG, event, message, **fields)
+
+    def info(self, event: str, message: str = None, **fields):
+        self.log(logging.INFO, event, message, **fields)
+
+    def warning(self, event: str, message: str = None, **fields):
+        self.log(logging.WARNING, event, message, **fields)
+
+    def error(self, event: str, message: str = None, **fields):
+        self.log(logging.ERROR, event, message, **fields)
+
+    def exception(self, event: str, message: str = None, **fields):
+        self.log(logging.ERROR, event, message, exc_info=True, **fields)
+
+def get_logger(name: str) -> EventLogger:
+    return EventLogger(name)
+
+def _fields(record: logging.LogRecord) -> Dict:
+    fields = dict(getattr(record, 'fields', None) or {})
+    # Plain logger calls may pass fields through ``extra``
+    fields.update((key, value) for key, value in vars(record).items() if key not in _RECORD_ATTRIBUTES)
+    return fields
+
+class JsonFormatter(logging.Formatter):
+    """One JSON object per record, with 'severity' as read by Cloud Logging"""
+
+    def __init__(self, max_field_length: Optional[int] = MAX_FIELD_LENGTH):
+        super().__init__()
+        self.max_field_length = max_field_length
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            'severity': record.levelname,
+            'time': self.formatTime(record),
+            'logger': record.name,
+            'event': getattr(record, 'event', None),
+            'message': _truncate(record.getMessage(), self.max_field_length)
+        }
+        for key, value in _fields(record).items():
+            entry[key] = _truncate(value, self.max_field_length)
+        if record.exc_info and not record.exc_text:
+            record.exc_text = self.formatException(record.exc_info)
+        if record.exc_text:
+            entry['exception'] = record.exc_text
+        return json.dumps(entry, default=str)
+
+class TextFormatter(logging.Formatter):
+    """Human-readable records: the message followed by key=value fields"""
+
+    def __init__(self, max_field_length: Optional[int] = None):
+        super().__init__('%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+        self.max_field_length = max_field_length
+
+    def formatMessage(self, record: logging.LogRecord) -> str:
+        text = super().formatMessage(record)
+        fields = ' '.join(f'{key}={_truncate(value, self.max_field_length)}'
+                          for key, value in _fields(record).items())
+        return f'{text} {fields}' if fields else text
+
+class SamplingFilter(logging.Filter):
+    """
+    Keeps the first and then every Nth record of each sampled event.
+
+    Kept records carry 'sample_rate' and, once records were dropped,
+    'suppressed' with the number dropped since the previous kept one.
+    Records at ERROR and above always pass.
+    """
+
+    def __init__(self, rates: Dict[str, int]):
+        super().__init__()
+        self.rates = rates
+        self.seen: Dict[str, int] = {}
+        self.suppressed: Dict[str, int] = {}
+        self._lock = threading.Lock()
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        event = getattr(record, 'event', None)
+        rate = self.rates.get(event)
+        if not rate or record.levelno >= logging.ERROR:
+            return True
+        with self._lock:
+            count = self.seen.get(event, 0)
+            self.seen[event] = count + 1
+            if count % rate:
+                self.suppressed[event] = self.suppressed.get(event, 0) + 1
+                return False
+            suppressed = self.suppressed.pop(event, 0)
+        record.fields = dict(getattr(record, 'fields', None) or {}, sample_rate=rate)
+        if suppressed:
+            record.fields['suppressed'] = suppressed
+        return True
+
+class AsyncQueueHandler(QueueHandler):
+    """QueueHandler that keeps event fields and exception text for the listener's formatter"""
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        record = copy.copy(record)
+        record.msg = record.getMessage()
+        record.args = None
+        if record.exc_info:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+def configure_logging(mode: str = None, level: str = None, stream=None) -> str:
+    """
+    Route all logging through a background thread with the mode's format
+
+    Callers log through a queue and never wait on terminal or Cloud
+    Logging I/O. In 'quiet' mode records are JSON lines, per-file warnings
+    are sampled and long fields truncated; 'verbose' writes text records
+    in full. Per-file events are DEBUG, so at the default INFO level a
+    sync logs one 'sync_progress' summary per N files instead.
+
+    Args:
+        mode: 'verbose' or 'quiet' (default: LOG_MODE, else 'verbose')
+        level: Level name for the sync loggers (default: LOG_LEVEL, else
+            INFO); DEBUG logs every event in full in either mode
+        stream: Stream to write to (default: stdout)
+
+    Returns:
+        The mode in effect
+    """
+    global _listener, _mode
+    mode = mode or os.environ.get('LOG_MODE', 'verbose')
+    if mode not in LOG_MODES:
+        raise ValueError(f"Unknown log mode: {mode}")
+    level = (level or os.environ.get('LOG_LEVEL') or 'INFO').upper()
+    full_detail = mode == 'verbose' or level == 'DEBUG'
+
+    handler = logging.StreamHandler(stream or sys.stdout)
+    if mode == 'quiet':
+        handler.setFormatter(JsonFormatter(None if full_detail else MAX_FIELD_LENGTH))
+    else:
+        handler.setFormatter(TextFormatter())
+
+    queue_handler = AsyncQueueHandler(queue.SimpleQueue())
+    if not full_detail:
+        queue_handler.addFilter(SamplingFilter(QUIET_SAMPLE_RATES))
+
+    if _listener is not None:
+        _listener.stop()
+    _listener = QueueListener(queue_handler.queue, handler)
+    _listener.start()
+
+    root = logging.getLogger()
+    for existing in list(root.handlers):
+        root.removeHandler(existing)
+    root.addHandler(queue_handler)
+    root.setLevel(logging.INFO if mode == 'verbose' else logging.WARNING)
+    for name in SYNC_LOGGERS:
+        logging.getLogger(name).setLevel(level)
+    _mode = mode
+    return mode
+
+def is_quiet() -> bool:
+    """Whether logging was configured in quiet mode, so interactive output should be skipped"""
+    return _mode == 'quiet'
+
+def flush_logging():
+    """Write out every queued record; logging keeps working afterwards"""
+    if _listener is not None:
+        _listener.stop()
+        _listener.start()
+
+atexit.register(flush_logging)
+
+class FileLogSummary:
+    """
+    Aggregates per-file results into one 'sync_progress' record per N files.
+
+    Each file is also logged as a 'file_stored' debug event, so full
+    per-file detail is available by lowering the level.
+    """
+
+    def __init__(self, log: EventLogger, total: int, every: int = SUMMARY_EVERY):
+        self.log = log
+        self.total = total
+        self.every = max(1, every)
+        self.processed = 0
+        self.errors = 0
+        self.tokens = 0
+        self.started_at = time.monotonic()
+        self._reported = 0
+
+    def add(self, file: Dict):
+        analysis = file.get('ai_analysis')
+        failed = isinstance(analysis, dict) and 'error' in analysis
+        tokens = file.get('analysis_metadata', {}).get('usage', {}).get('total_tokens', 0)
+        self.processed += 1
+        self.errors += failed
+        self.tokens += tokens
+        self.log.debug('file_stored', path=file['path'], failed=failed, tokens=tokens)
+        if self.processed - self._reported >= self.every:
+            self.report()
+
+    def report(self):
+        """Log the totals so far, unless nothing changed since the last report"""
+        if self.processed == self._reported:
+            return
+        self._reported = self.processed
+        elapsed = time.monotonic() - self.started_at
+        self.log.info(
+            'sync_progress',
+            f"Processed {self.processed}/{self.total} files",
+            processed=self.processed,
+            total=self.total,
+            errors=self.errors,
+            tokens=self.tokens,
+            files_per_second=round(self.processed / elapsed, 2) if elapsed > 0 else 0.0
+        )
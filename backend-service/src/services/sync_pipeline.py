@@ -0,0 +1,132 @@
+from typing import Any, Callable, Dict, Iterable, List, Optional
+import asyncio
+import inspect
+import time
+from services.telemetry import span
+
+# Sentinel passed down the queues once the previous stage has finished
+_DONE = object()
+
+class PipelineStage:
+    """
+    One stage of a SyncPipeline.
+
+    ``handler`` receives an item and returns the item for the next stage,
+    or None to drop it. Blocking handlers (e.g. PyGithub calls) run in a
+    worker thread. Exceptions are not caught: they stop the pipeline, so
+    handlers deal with per-item failures themselves.
+    """
+
+    def __init__(self, name: str, handler: Callable[[Any], Any], workers: int = 1,
+                 queue_size: int = None, blocking: bool = False):
+        if workers < 1:
+            raise ValueError(f"Stage {name} needs at least one worker")
+        self.name = name
+        self.handler = handler
+        self.workers = workers
+        self.queue_size = queue_size
+        self.blocking = blocking
+        self.queue: Optional[asyncio.Queue] = None
+        self.processed = 0
+        self.dropped = 0
+        self.busy = 0
+        self.busy_seconds = 0.0
+
+    async def handle(self, item):
+        if self.blocking:
+            return await asyncio.to_thread(self.handler, item)
+        result = self.handler(item)
+        if inspect.isawaitable(result):
+            result = await result
+        return result
+
+class SyncPipeline:
+    """
+    Staged producer/consumer pipeline with bounded queues.
+
+    Each stage reads from its own bounded queue with its own workers and
+    feeds the next stage's queue, so network, model and storage work
+    overlap while a full queue makes earlier stages wait (backpressure),
+    capping how many items are in memory. metrics() reports per-stage queue
+    depth, busy workers and utilisation to show the bottleneck.
+    """
+
+    def __init__(self, stages: List[PipelineStage], queue_size: int = 50):
+        if not stages:
+            raise ValueError("A pipeline needs at least one stage")
+        self.stages = stages
+        self.queue_size = queue_size
+        self.started_at = None
+        self.finished_at = None
+
+    async def run(self, items: Iterable):
+        """Feed items through every stage; returns once the last stage has drained"""
+        for stage in self.stages:
+            stage.queue = asyncio.Queue(maxsize=stage.queue_size or self.queue_size)
+        self.started_at = time.monotonic()
+        try:
+            async with asyncio.TaskGroup() as group:
+                for index, stage in enumerate(self.stages):
+                    following = self.stages[index + 1] if index + 1 < len(self.stages) else None
+                    workers = [group.create_task(self._work(stage, following)) for _ in range(stage.workers)]
+                    group.create_task(self._close_after(workers, following))
+                group.create_task(self._feed(items))
+        except ExceptionGroup as errors:
+            # Surface the failing stage's own error rather than the task group's
+            raise errors.exceptions[0]
+        finally:
+            self.finished_at = time.monotonic()
+
+    async def _feed(self, items: Iterable):
+        first = self.stages[0]
+        for item in items:
+            await first.queue.put(item)
+        for _ in range(first.workers):
+            await first.queue.put(_DONE)
+
+    async def _close_after(self, workers: List[asyncio.Task], following: Optional[PipelineStage]):
+        # The next stage finishes once every worker of this stage has
+        for worker in workers:
+            await worker
+        if following is not None:
+            for _ in range(following.workers):
+                await following.queue.put(_DONE)
+
+    async def _work(self, stage: PipelineStage, following: Optional[PipelineStage]):
+        while True:
+            item = await stage.queue.get()
+            if item is _DONE:
+                return
+            stage.busy += 1
+            started_at = time.monotonic()
+            try:
+                with span(f'pipeline.{stage.name}'):
+                    result = await stage.handle(item)
+            finally:
+                stage.busy -= 1
+                stage.busy_seconds += time.monotonic() - started_at
+            stage.processed += 1
+            if result is None:
+                stage.dropped += 1
+            elif following is not None:
+                await following.queue.put(result)
+
+    def metrics(self) -> Dict[str, Dict]:
+        """Per-stage queue depth, busy workers, throughput and utilisation"""
+        if self.started_at is None:
+            elapsed = 0.0
+        else:
+            elapsed = (self.finished_at or time.monotonic()) - self.started_at
+        return {
+            stage.name: {
+                'workers': stage.workers,
+                'queue_depth': stage.queue.qsize() if stage.queue else 0,
+                'queue_size': stage.queue.maxsize if stage.queue else 0,
+                'busy': stage.busy,
+                'processed': stage.processed,
+                'dropped': stage.dropped,
+                'busy_seconds': round(stage.busy_seconds, 3),
+                'utilisation': round(stage.busy_seconds / (stage.workers * elapsed), 3) if elapsed > 0 else 0.0
+            }
+            for stage in self.stages
+        }
@@ -0,0 +1,123 @@
+from typing import Callable, Dict, List
+
+# Model every file analysis is sent to (see GeminiService)
+DEFAULT_MODEL = 'gemini-1.5-pro'
+
+# USD per million tokens; prompts above the long-context threshold are
+# billed at the long-context rates
+MODEL_PRICING = {
+    'gemini-1.5-pro': {
+        'prompt': 1.25,
+        'response': 5.00,
+        'long_context_threshold': 128000,
+        'long_context_prompt': 2.50,
+        'long_context_response': 10.00
+    }
+}
+
+# Rough size of a token in source code
+CHARS_PER_TOKEN = 4
+
+# Tokens of the analysis prompt around the file content
+PROMPT_OVERHEAD_TOKENS = 500
+
+# Typical size of a structured file analysis
+RESPONSE_TOKENS_PER_FILE = 900
+
+# Latency assumptions for the duration estimate
+GITHUB_SECONDS_PER_CALL = 0.3
+MODEL_SECONDS_PER_REQUEST = 2.0
+MODEL_RESPONSE_TOKENS_PER_SECOND = 60
+
+# GitHub calls made once per sync: repository, metadata, head commit and tree
+GITHUB_CALLS_PER_SYNC = 4
+
+def estimate_tokens(size: int) -> int:
+    """Prompt tokens for analyzing a file of ``size`` bytes"""
+    return PROMPT_OVERHEAD_TOKENS + (size or 0) // CHARS_PER_TOKEN
+
+def model_cost(prompt_tokens: int, response_tokens: int, model: str = DEFAULT_MODEL) -> float:
+    """USD cost of one request"""
+    pricing = MODEL_PRICING[model]
+    long_context = prompt_tokens > pricing['long_context_threshold']
+    prompt_rate = pricing['long_context_prompt'] if long_context else pricing['prompt']
+    response_rate = pricing['long_context_response'] if long_context else pricing['response']
+    return (prompt_tokens * prompt_rate + response_tokens * response_rate) / 1_000_000
+
+def estimate_sync(files_to_process: List[Dict], should_analyze: Callable[[str], bool],
+                  fetches_content: Callable[[str], bool], unchanged: int, resumed: int, deleted: int,
+                  config: Dict = None) -> Dict:
+    """
+    Estimate the API calls, tokens, cost and duration of a sync
+
+    Uses only the listing and the diff against the stored files: sizes
+    stand in for content, and latencies are averages, so the numbers are
+    estimates to decide whether to run, sample or batch a sync.
+
+    Args:
+        files_to_process: New and modified files, as listed from GitHub
+        should_analyze: Whether a path is sent to the model
+        fetches_content: Whether a path's content is fetched
+        unchanged: Files whose stored analysis is reused
+        resumed: Files already stored by an interrupted run that would be resumed
+        deleted: Stored files no longer in the repository
+        config: Sync configuration; pipeline worker counts and 'model'
+
+    Returns:
+        Dict with file counts, cache hits, GitHub calls, per-model tokens
+        and cost, Firestore writes, the estimated duration and its bottleneck stage
+    """
+    config = config or {}
+    model = config.get('model', DEFAULT_MODEL)
+    fetch_workers = config.get('pipeline_fetch_workers', 8)
+    analyze_workers = config.get('pipeline_analyze_workers', 4)
+
+    analyzed = [f for f in files_to_process if should_analyze(f['path'])]
+    fetched = sum(1 for f in files_to_process if fetches_content(f['path']))
+    prompt_tokens = [estimate_tokens(f.get('size')) for f in analyzed]
+    response_tokens = RESPONSE_TOKENS_PER_FILE * len(analyzed)
+    cost = sum(model_cost(tokens, RESPONSE_TOKENS_PER_FILE, model) for tokens in prompt_tokens)
+
+    # One last-commit lookup per changed file, plus the blob when content is needed
+    github_calls = GITHUB_CALLS_PER_SYNC + len(files_to_process) + fetched
+    fetch_seconds = (len(files_to_process) + fetched) * GITHUB_SECONDS_PER_CALL / fetch_workers
+    model_seconds = len(analyzed) * (
+        MODEL_SECONDS_PER_REQUEST + RESPONSE_TOKENS_PER_FILE / MODEL_RESPONSE_TOKENS_PER_SECOND
+    ) / analyze_workers
+    # Stages overlap, so the slowest one sets the pace
+    stage_seconds = {'fetch': fetch_seconds, 'analyze': model_seconds}
+    bottleneck = max(stage_seconds, key=stage_seconds.get)
+
+    hits = unchanged + resumed
+    lookups = hits + len(files_to_process)
+    return {
+        'files': {
+            'to_process': len(files_to_process),
+            'analyzed': len(analyzed),
+            'unchanged': unchanged,
+            'resumed': resumed,
+            'deleted': deleted
+        },
+        'cache': {
+            'hits': hits,
+            'misses': len(files_to_process),
+            'hit_ratio': round(hits / lookups, 3) if lookups else 1.0
+        },
+        'github': {'calls': github_calls},
+        'models': {
+            model: {
+                'requests': len(analyzed),
+                'prompt_tokens': sum(prompt_tokens),
+                'response_tokens': response_tokens,
+                'cost_usd': round(cost, 4)
+            }
+        },
+        # File documents and tombstones; the summary and index writes are small
+        'firestore': {'writes': len(files_to_process) + deleted},
+        'cost_usd': round(cost, 4),
+        'duration_seconds': {
+            **{name: round(seconds, 1) for name, seconds in stage_seconds.items()},
+            'total': round(GITHUB_CALLS_PER_SYNC * GITHUB_SECONDS_PER_CALL + stage_seconds[bottleneck], 1)
+        },
+        'bottleneck': bottleneck
+    }
@@ -0,0 +1,237 @@
+from collections import Counter
+from typing import Dict, List, Optional, Tuple
+import asyncio
+import cProfile
+import io
+import json
+import os
+import pstats
+import sys
+import threading
+import time
+import tracemalloc
+from services.telemetry import tracer
+
+# Seconds between stack samples for the flame graph
+SAMPLE_INTERVAL = 0.005
+
+# Seconds between event loop lag probes
+LAG_PROBE_INTERVAL = 0.05
+
+# Stack depth recorded per allocation
+TRACEMALLOC_FRAMES = 10
+
+# Entries listed in the report for functions and allocation sites
+TOP_ENTRIES = 25
+
+def _frame_name(frame) -> str:
+    code = frame.f_code
+    return f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})"
+
+def _percentile(values: List[float], fraction: float) -> float:
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))]
+
+def _union_seconds(intervals: List[Tuple[int, int]]) -> float:
+    """Wall time covered by possibly overlapping (start_ns, end_ns) intervals"""
+    total = 0
+    current_start = current_end = None
+    for start, end in sorted(intervals):
+        if current_end is None or start > current_end:
+            if current_end is not None:
+                total += current_end - current_start
+            current_start, current_end = start, end
+        else:
+            current_end = max(current_end, end)
+    if current_end is not None:
+        total += current_end - current_start
+    return total / 1e9
+
+class StackSampler:
+    """
+    Samples the stacks of every thread at a fixed interval.
+
+    Samples include threads that are waiting, so the result is a wall-clock
+    profile: time spent blocked on GitHub, Gemini or Firestore shows up
+    alongside CPU time. Stacks are counted in the collapsed format read by
+    flamegraph.pl, speedscope and similar tools.
+    """
+
+    def __init__(self, interval: float = SAMPLE_INTERVAL):
+        self.interval = interval
+        self.stacks = Counter()
+        self.samples = 0
+        self._stop = threading.Event()
+        self._thread = None
+
+    def start(self):
+        self._thread = threading.Thread(target=self._run, name='stack-sampler', daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+
+    def _run(self):
+        own_id = threading.get_ident()
+        while not self._stop.wait(self.interval):
+            names = {thread.ident: thread.name for thread in threading.enumerate()}
+            for thread_id, frame in sys._current_frames().items():
+                if thread_id == own_id:
+                    continue
+                stack = []
+                while frame is not None:
+                    stack.append(_frame_name(frame))
+                    frame = frame.f_back
+                stack.append(names.get(thread_id, str(thread_id)))
+                self.stacks[';'.join(reversed(stack))] += 1
+            self.samples += 1
+
+    def collapsed(self) -> str:
+        return ''.join(f'{stack} {count}\n' for stack, count in self.stacks.most_common())
+
+class SyncProfiler:
+    """
+    Profiles one sync run.
+
+    Between start() and stop() it records a cProfile CPU profile of the
+    event loop thread, sampled stacks of all threads, event loop lag,
+    wall time per traced operation (pipeline stages, GitHub, Gemini and
+    Firestore calls) and memory allocations. write_report() saves them
+    to a directory:
+
+        report.json      summary: stages, loop lag, top functions, peak memory
+                         and top allocation sites
+        profile.prof     cProfile data, for pstats or snakeviz
+        stacks.collapsed sampled stacks, for flamegraph.pl or speedscope
+
+    Must be started from the event loop that runs the sync.
+    """
+
+    def __init__(self, sample_interval: float = SAMPLE_INTERVAL, lag_interval: float = LAG_PROBE_INTERVAL,
+                 tracemalloc_frames: int = TRACEMALLOC_FRAMES):
+        self.lag_interval = lag_interval
+        self.tracemalloc_frames = tracemalloc_frames
+        self.sampler = StackSampler(sample_interval)
+        self.cpu_profile = cProfile.Profile()
+        self.loop_lags: List[float] = []
+        self.spans: Dict[str, List[Tuple[int, int]]] = {}
+        self.memory_snapshot = None
+        self.peak_memory = 0
+        self.started_at = None
+        self.finished_at = None
+        self._lag_task: Optional[asyncio.Task] = None
+
+    def start(self):
+        self.started_at = time.monotonic()
+        tracer.add_listener(self._on_span)
+        tracemalloc.start(self.tracemalloc_frames)
+        self.sampler.start()
+        self._lag_task = asyncio.get_running_loop().create_task(self._probe_loop_lag())
+        self.cpu_profile.enable()
+
+    def stop(self):
+        self.cpu_profile.disable()
+        if self._lag_task is not None:
+            self._lag_task.cancel()
+        self.sampler.stop()
+        self.memory_snapshot = tracemalloc.take_snapshot()
+        self.peak_memory = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+        tracer.remove_listener(self._on_span)
+        self.finished_at = time.monotonic()
+
+    async def _probe_loop_lag(self):
+        # A probe wakes up late by however long the loop was blocked
+        while True:
+            expected = time.monotonic() + self.lag_interval
+            await asyncio.sleep(self.lag_interval)
+            self.loop_lags.append(max(0.0, time.monotonic() - expected))
+
+    def _on_span(self, span):
+        self.spans.setdefault(span.name, []).append((span.start_ns, span.end_ns))
+
+    def stage_times(self) -> Dict[str, Dict]:
+        """Per traced operation: calls, summed duration and wall time covered"""
+        return {
+            name: {
+                'calls': len(intervals),
+                'total_seconds': round(sum(end - start for start, end in intervals) / 1e9, 3),
+                'wall_seconds': round(_union_seconds(intervals), 3)
+            }
+            for name, intervals in sorted(self.spans.items())
+        }
+
+    def loop_lag(self) -> Dict:
+        return {
+            'probes': len(self.loop_lags),
+            'mean_ms': round(1000 * sum(self.loop_lags) / len(self.loop_lags), 2) if self.loop_lags else 0.0,
+            'p95_ms': round(1000 * _percentile(self.loop_lags, 0.95), 2),
+            'max_ms': round(1000 * max(self.loop_lags, default=0.0), 2)
+        }
+
+    def top_functions(self, limit: int = TOP_ENTRIES) -> List[Dict]:
+        stats = pstats.Stats(self.cpu_profile, stream=io.StringIO())
+        rows = []
+        for (filename, line, function), (_, calls, own_time, cumulative, _) in stats.stats.items():
+            rows.append({
+                'function': f'{function} ({filename}:{line})',
+                'calls': calls,
+                'own_seconds': round(own_time, 4),
+                'cumulative_seconds': round(cumulative, 4)
+            })
+        rows.sort(key=lambda row: row['cumulative_seconds'], reverse=True)
+        return rows[:limit]
+
+    def top_allocations(self, limit: int = TOP_ENTRIES) -> List[Dict]:
+        if self.memory_snapshot is None:
+            return []
+        snapshot = self.memory_snapshot.filter_traces((
+            tracemalloc.Filter(False, tracemalloc.__file__),
+            tracemalloc.Filter(False, '<frozen importlib._bootstrap>')
+        ))
+        return [
+            {
+                'site': f'{stat.traceback[0].filename}:{stat.traceback[0].lineno}',
+                'size_bytes': stat.size,
+                'blocks': stat.count
+            }
+            for stat in snapshot.statistics('lineno')[:limit]
+        ]
+
+    def summary(self) -> Dict:
+        return {
+            'wall_seconds': round((self.finished_at or time.monotonic()) - self.started_at, 3),
+            'stages': self.stage_times(),
+            'event_loop_lag': self.loop_lag(),
+            'cpu': {'top_functions': self.top_functions()},
+            'stack_samples': self.sampler.samples,
+            'memory': {
+                'peak_bytes': self.peak_memory,
+                'top_allocations': self.top_allocations()
+            }
+        }
+
+    def write_report(self, directory: str) -> Dict:
+        """
+        Save the profile to ``directory``, creating it if needed
+
+        Returns:
+            The summary written to report.json, with the paths of the files written
+        """
+        os.makedirs(directory, exist_ok=True)
+        report = self.summary()
+        report['files'] = {
+            'report': os.path.join(directory, 'report.json'),
+            'cpu_profile': os.path.join(directory, 'profile.prof'),
+            'flame_graph': os.path.join(directory, 'stacks.collapsed')
+        }
+        self.cpu_profile.dump_stats(report['files']['cpu_profile'])
+        with open(report['files']['flame_graph'], 'w') as f:
+            f.write(self.sampler.collapsed())
+        with open(report['files']['report'], 'w') as f:
+            json.dump(report, f, indent=2)
+        return report
@@ -0,0 +1,132 @@
+from collections import Counter, OrderedDict, deque
+from datetime import datetime, timedelta, timezone
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+from services.sync_logging import get_logger
+
+logger = get_logger(__name__)
+
+class FairShareQueue:
+    """
+    Pending sync jobs grouped by tenant.
+
+    pop() takes the next job of the tenant with the fewest jobs running, then
+    the fewest jobs started, so one account with many repositories cannot
+    occupy every worker while others wait. Jobs of a tenant run in the order
+    they were pushed.
+    """
+
+    def __init__(self):
+        self._pending: 'OrderedDict[str, deque]' = OrderedDict()
+        self.running = Counter()
+        self.started = Counter()
+
+    def __len__(self):
+        return sum(len(jobs) for jobs in self._pending.values())
+
+    def push(self, tenant: str, job: Any):
+        self._pending.setdefault(tenant, deque()).append(job)
+
+    def pop(self) -> Tuple[str, Any]:
+        """Take the next job; the caller reports its completion with done()"""
+        if not self._pending:
+            raise IndexError("No pending jobs")
+        # min() keeps the first of equal tenants, i.e. the earliest pushed
+        tenant = min(self._pending, key=lambda name: (self.running[name], self.started[name]))
+        jobs = self._pending[tenant]
+        job = jobs.popleft()
+        if not jobs:
+            del self._pending[tenant]
+        self.running[tenant] += 1
+        self.started[tenant] += 1
+        return tenant, job
+
+    def done(self, tenant: str):
+        self.running[tenant] -= 1
+
+def repository_job(repo_id: str, data: Dict) -> Optional[Dict]:
+    """
+    Sync job for a repositories document, or None if it has no owning account
+
+    Args:
+        repo_id: Repository document ID (owner_repo)
+        data: Repository document data
+    """
+    account_id = data.get('accountId')
+    if not account_id:
+        return None
+    # IDs are owner_repo; any split maps back to the same ID
+    full_name = data.get('metadata', {}).get('full_name') or repo_id.replace('_', '/', 1)
+    return {'repo': full_name, 'account_id': account_id}
+
+def due_repositories(db, refresh_interval: timedelta, now: datetime = None) -> List[Dict]:
+    """
+    Sync jobs for repositories not synced within the refresh interval
+
+    Repositories that were never synced are due; the least recently synced
+    come first.
+
+    Args:
+        db: Firestore client
+        refresh_interval: Minimum time between syncs of a repository
+        now: Current time (defaults to now, UTC)
+
+    Returns:
+        List of job dicts with 'repo' and 'account_id'
+    """
+    cutoff = (now or datetime.now(timezone.utc)) - refresh_interval
+    never_synced = datetime.min.replace(tzinfo=timezone.utc)
+    due = []
+    fields = ['accountId', 'metadata.full_name', 'metadata.last_synced']
+    for doc in db.collection('repositories').select(fields).stream():
+        data = doc.to_dict()
+        last_synced = data.get('metadata', {}).get('last_synced') or never_synced
+        if last_synced >= cutoff:
+            continue
+        job = repository_job(doc.id, data)
+        if job is None:
+            logger.warning('repository_skipped', f"Skipping {doc.id}: no owning account", repository=doc.id)
+            continue
+        due.append((last_synced, job))
+    due.sort(key=lambda entry: entry[0])
+    return [job for _, job in due]
+
+def run_report(entries: Iterable[Dict], started_at: datetime, finished_at: datetime, workers: int) -> Dict:
+    """
+    Consolidated report of a scheduler run
+
+    Args:
+        entries: Per-repository dicts with 'repo', 'account_id', 'status',
+            'duration_seconds' and optionally 'changed_files', 'error' and 'pipeline'
+        started_at: When the run started
+        finished_at: When the run finished
+        workers: Number of worker processes
+
+    Returns:
+        Dict with run timing, per-repository entries, totals and per-tenant totals
+    """
+    entries = list(entries)
+    tenants = {}
+    for entry in entries:
+        tenant = tenants.setdefault(entry['account_id'], {
+            'repositories': 0, 'failed': 0, 'changed_files': 0, 'duration_seconds': 0.0
+        })
+        tenant['repositories'] += 1
+        tenant['failed'] += entry['status'] != 'success'
+        tenant['changed_files'] += entry.get('changed_files', 0)
+        tenant['duration_seconds'] = round(tenant['duration_seconds'] + entry['duration_seconds'], 3)
+
+    return {
+        'started_at': started_at.isoformat(),
+        'finished_at': finished_at.isoformat(),
+        'duration_seconds': round((finished_at - started_at).total_seconds(), 3),
+        'workers': workers,
+        'totals': {
+            'repositories': len(entries),
+            'succeeded': sum(entry['status'] == 'success' for entry in entries),
+            'failed': sum(entry['status'] != 'success' for entry in entries),
+            'changed_files': sum(entry.get('changed_files', 0) for entry in entries),
+            'sync_seconds': round(sum(entry['duration_seconds'] for entry in entries), 3)
+        },
+        'tenants': tenants,
+        'repositories': entries
+    }
@@ -0,0 +1,291 @@
+from datetime import datetime, timedelta, UTC
+from firebase_admin import firestore
+from typing import Callable, Dict, List, Optional
+import asyncio
+import hashlib
+import os
+import socket
+import uuid
+from services.sync_logging import get_logger
+
+logger = get_logger(__name__)
+
+# Shard leases not renewed for this long belong to a dead worker and are
+# claimed again by the next worker looking for work
+LEASE_SECONDS = 120
+
+# Seconds between lease renewals while a worker processes a shard
+HEARTBEAT_INTERVAL = 30
+
+# Attempts before a shard whose workers keep dying is marked failed
+MAX_ATTEMPTS = 3
+
+# Fewest changed files per shard; smaller syncs are split into fewer shards
+MIN_FILES_PER_SHARD = 50
+
+# Seconds between checks while the coordinator waits for other workers' shards
+POLL_INTERVAL = 5
+
+def shard_count_for(file_count: int, max_shards: int) -> int:
+    """Number of shards to split this many changed files into"""
+    return max(1, min(max_shards, file_count // MIN_FILES_PER_SHARD))
+
+def shard_index(path: str, shard_count: int) -> int:
+    """Stable shard index for a path, independent of its manifest chunk"""
+    digest = hashlib.md5(path.encode('utf-8')).digest()
+    return int.from_bytes(digest[:4], 'big') % shard_count
+
+def split_shards(files: List[Dict], shard_count: int) -> List[List[Dict]]:
+    """Split files into shards by path hash, keeping their order within each shard"""
+    shards = [[] for _ in range(shard_count)]
+    for file in files:
+        shards[shard_index(file['path'], shard_count)].append(file)
+    return shards
+
+def claimable(shard: Dict, now: datetime) -> bool:
+    """Whether a shard is waiting for a worker or its worker's lease has expired"""
+    if shard.get('status') == 'pending':
+        return True
+    expires_at = shard.get('lease_expires_at')
+    return shard.get('status') == 'leased' and expires_at is not None and expires_at <= now
+
+def merge_write_stats(writes: List[Dict]) -> Dict:
+    """
+    Combine the write counters of the writers of a sharded sync
+
+    The writers run at the same time, so the longest duration stands for
+    the whole sync.
+    """
+    merged = {'succeeded': 0, 'failed': 0, 'retried': 0, 'errors_by_code': {}, 'duration_seconds': 0.0}
+    for stats in writes:
+        for key in ('succeeded', 'failed', 'retried'):
+            merged[key] += stats.get(key, 0)
+        for code, count in stats.get('errors_by_code', {}).items():
+            merged['errors_by_code'][code] = merged['errors_by_code'].get(code, 0) + count
+        merged['duration_seconds'] = max(merged['duration_seconds'], stats.get('duration_seconds', 0.0))
+    duration = merged['duration_seconds']
+    merged['ops_per_second'] = round(merged['succeeded'] / duration, 1) if duration > 0 else 0
+    return merged
+
+def merge_pipeline_metrics(metrics: List[Dict[str, Dict]]) -> Dict[str, Dict]:
+    """Combine the per-stage metrics of the pipelines that synced each shard"""
+    merged: Dict[str, Dict] = {}
+    for pipeline in metrics:
+        for name, stage in pipeline.items():
+            total = merged.setdefault(name, {'workers': stage['workers'], 'processed': 0, 'dropped': 0,
+                                             'busy_seconds': 0.0, 'utilisation': 0.0})
+            total['processed'] += stage['processed']
+            total['dropped'] += stage['dropped']
+            total['busy_seconds'] = round(total['busy_seconds'] + stage['busy_seconds'], 3)
+            # Mean over the shards, which ran one after another on the same workers
+            total['utilisation'] = round(total['utilisation'] + stage['utilisation'] / len(metrics), 3)
+    return merged
+
+class ShardedSync:
+    """
+    Lease records of one sharded sync run.
+
+    Stored at repositories/{repo_id}/sync_shards/{run_id}. The run document
+    holds the target commit and listing options, so every worker lists and
+    diffs the same files, and a 'shards' subcollection holds one document
+    per shard with its status ('pending', 'leased', 'completed' or
+    'failed'), owner, lease expiry, attempts and result. Workers claim
+    shards in transactions and renew their lease while they work, so a
+    shard whose worker dies is claimed again once the lease expires.
+    """
+
+    def __init__(self, run_ref, target_commit: str, shard_count: int, options: Dict = None,
+                 worker_id: str = None, lease_seconds: float = LEASE_SECONDS,
+                 max_attempts: int = MAX_ATTEMPTS, lease_run_id: str = None):
+        self.run_ref = run_ref
+        self.run_id = run_ref.id
+        self.target_commit = target_commit
+        self.shard_count = shard_count
+        self.options = options or {}
+        self.worker_id = worker_id or f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+        self.lease_seconds = lease_seconds
+        self.max_attempts = max_attempts
+        self.lease_run_id = lease_run_id
+        self.shards_collection = run_ref.collection('shards')
+
+    @classmethod
+    def start(cls, repo_ref, target_commit: str, shard_count: int, options: Dict = None,
+              lease_run_id: str = None) -> 'ShardedSync':
+        """
+        Create the lease records for a new sharded sync run
+
+        Args:
+            repo_ref: Reference to repository document
+            target_commit: Commit every worker syncs
+            shard_count: Number of shards
+            options: Listing options ('max_files', 'skip_types') workers must
+                list the repository with
+            lease_run_id: Run ID of the coordinator's sync lease; workers stop
+                joining once that sync no longer holds the lease
+        """
+        run_ref = repo_ref.collection('sync_shards').document(uuid.uuid4().hex)
+        run_ref.set({
+            'target_commit': target_commit,
+            'shard_count': shard_count,
+            'options': options or {},
+            'lease_run_id': lease_run_id,
+            'status': 'running',
+            'started_at': firestore.SERVER_TIMESTAMP,
+            'updated_at': firestore.SERVER_TIMESTAMP
+        })
+        batch = firestore.client().batch()
+        for index in range(shard_count):
+            batch.set(run_ref.collection('shards').document(f'{index:04d}'), {
+                'index': index,
+                'status': 'pending',
+                'owner': None,
+                'lease_expires_at': None,
+                'attempts': 0,
+                'processed': 0
+            })
+        batch.commit()
+        logger.info('shard_run_started', f"Started sharded sync {run_ref.id} with {shard_count} shards",
+                    run_id=run_ref.id, commit=target_commit, shards=shard_count)
+        return cls(run_ref, target_commit, shard_count, options, lease_run_id=lease_run_id)
+
+    @classmethod
+    def find_active(cls, repo_ref) -> Optional['ShardedSync']:
+        """Load the most recent sharded sync run that still has shards to work on"""
+        runs = repo_ref.collection('sync_shards') \
+            .where('status', '==', 'running') \
+            .order_by('started_at', direction=firestore.Query.DESCENDING) \
+            .limit(1) \
+            .stream()
+        latest = next(iter(runs), None)
+        if latest is None:
+            return None
+        data = latest.to_dict()
+        return cls(latest.reference, data['target_commit'], data['shard_count'], data.get('options'),
+                   lease_run_id=data.get('lease_run_id'))
+
+    def _lease_expiry(self) -> datetime:
+        return datetime.now(UTC) + timedelta(seconds=self.lease_seconds)
+
+    def claim(self) -> Optional[int]:
+        """
+        Lease the next pending shard, or one whose lease has expired
+
+        Shards that already used up their attempts are marked failed instead.
+
+        Returns:
+            The claimed shard's index, or None if no shard is claimable
+        """
+        @firestore.transactional
+        def work(transaction) -> Optional[int]:
+            now = datetime.now(UTC)
+            for doc in self.shards_collection.order_by('index').stream(transaction=transaction):
+                shard = doc.to_dict()
+                if not claimable(shard, now):
+                    continue
+                if shard.get('attempts', 0) >= self.max_attempts:
+                    transaction.update(doc.reference, {
+                        'status': 'failed',
+                        'error': f"Shard lease expired after {shard['attempts']} attempts",
+                        'finished_at': firestore.SERVER_TIMESTAMP
+                    })
+                    continue
+                transaction.update(doc.reference, {
+                    'status': 'leased',
+                    'owner': self.worker_id,
+                    'lease_expires_at': self._lease_expiry(),
+                    'attempts': shard.get('attempts', 0) + 1,
+                    'processed': 0,
+                    'started_at': firestore.SERVER_TIMESTAMP
+                })
+                return shard['index']
+            return None
+
+        index = work(firestore.client().transaction())
+        if index is not None:
+            logger.info('shard_claimed', f"Claimed shard {index} of sharded sync {self.run_id}",
+                        run_id=self.run_id, shard=index, worker=self.worker_id)
+        return index
+
+    def _update_owned(self, index: int, update: Dict) -> bool:
+        """Apply an update to a shard this worker still holds; returns whether it did"""
+        shard_ref = self.shards_collection.document(f'{index:04d}')
+
+        @firestore.transactional
+        def work(transaction) -> bool:
+            shard = shard_ref.get(transaction=transaction)
+            if not shard.exists or shard.get('owner') != self.worker_id or shard.get('status') != 'leased':
+                return False
+            transaction.update(shard_ref, update)
+            return True
+
+        return work(firestore.client().transaction())
+
+    def heartbeat(self, index: int, processed: int = 0) -> bool:
+        """
+        Renew the lease on a shard and record the files processed so far
+
+        Returns:
+            False if the lease was lost to another worker
+        """
+        return self._update_owned(index, {
+            'lease_expires_at': self._lease_expiry(),
+            'processed': processed,
+            'heartbeat_at': firestore.SERVER_TIMESTAMP
+        })
+
+    async def hold(self, index: int, processed: Callable[[], int],
+                   interval: float = HEARTBEAT_INTERVAL):
+        """Renew the lease every ``interval`` seconds until cancelled"""
+        while True:
+            await asyncio.sleep(interval)
+            try:
+                if not await asyncio.to_thread(self.heartbeat, index, processed()):
+                    # The writes are idempotent, so finishing the shard is harmless
+                    logger.warning('shard_lease_lost', f"Lost the lease on shard {index} of {self.run_id}",
+                                   run_id=self.run_id, shard=index)
+                    return
+            except Exception as e:
+                logger.warning('shard_heartbeat_failed', f"Failed to renew shard lease: {str(e)}",
+                               run_id=self.run_id, shard=index)
+
+    def complete(self, index: int, result: Dict) -> bool:
+        """Record a finished shard's result; returns False if the lease was lost"""
+        return self._update_owned(index, {
+            'status': 'completed',
+            'processed': result.get('processed', 0),
+            'result': result,
+            'lease_expires_at': None,
+            'finished_at': firestore.SERVER_TIMESTAMP
+        })
+
+    def release(self, index: int, error: str) -> bool:
+        """Give up a shard after an error, so another worker can retry it"""
+        logger.warning('shard_released', f"Released shard {index} of {self.run_id}: {error}",
+                       run_id=self.run_id, shard=index)
+        return self._update_owned(index, {
+            'status': 'pending',
+            'owner': None,
+            'lease_expires_at': None,
+            'error': error
+        })
+
+    def load_shards(self) -> List[Dict]:
+        """Current state of every shard, ordered by index"""
+        return [doc.to_dict() for doc in self.shards_collection.order_by('index').stream()]
+
+    def finish(self, status: str, error: str = None):
+        """
+        Close the run, so no more workers join it
+
+        Args:
+            status: 'completed' or 'failed'
+            error: Optional error message
+        """
+        update_data: Dict = {
+            'status': status,
+            'finished_at': firestore.SERVER_TIMESTAMP,
+            'updated_at': firestore.SERVER_TIMESTAMP
+        }
+        if error:
+            update_data['error'] = error
+        self.run_ref.set(update_data, merge=True)
@@ -0,0 +1,245 @@
+from collections import deque
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Dict, Iterable, Optional, Tuple
+import functools
+import inspect
+import json
+import os
+import threading
+import time
+import uuid
+
+# Histogram buckets for span durations, in seconds
+DURATION_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+# Finished spans kept in memory for inspection
+RECENT_SPANS = 1000
+
+def _key(labels: Dict) -> Tuple:
+    return tuple(sorted((name, str(value)) for name, value in labels.items()))
+
+def _escape(value: str) -> str:
+    return value.replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+class Counter:
+    """Monotonic counter with labels"""
+
+    type = 'counter'
+
+    def __init__(self, name: str, help_text: str):
+        self.name = name
+        self.help = help_text
+        self._values: Dict[Tuple, float] = {}
+        self._lock = threading.Lock()
+
+    def inc(self, amount: float = 1, **labels):
+        key = _key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def value(self, **labels) -> float:
+        return self._values.get(_key(labels), 0)
+
+    def samples(self) -> Iterable[Tuple[str, Tuple, float]]:
+        with self._lock:
+            items = list(self._values.items())
+        for key, value in items:
+            yield self.name, key, value
+
+class Histogram:
+    """Histogram with cumulative buckets and labels"""
+
+    type = 'histogram'
+
+    def __init__(self, name: str, help_text: str, buckets: Tuple[float, ...] = DURATION_BUCKETS):
+        self.name = name
+        self.help = help_text
+        self.buckets = buckets
+        self._values: Dict[Tuple, Dict] = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, **labels):
+        key = _key(labels)
+        with self._lock:
+            entry = self._values.setdefault(key, {'buckets': [0] * len(self.buckets), 'sum': 0.0, 'count': 0})
+            for index, bound in enumerate(self.buckets):
+                if value <= bound:
+                    entry['buckets'][index] += 1
+            entry['sum'] += value
+            entry['count'] += 1
+
+    def count(self, **labels) -> int:
+        entry = self._values.get(_key(labels))
+        return entry['count'] if entry else 0
+
+    def samples(self) -> Iterable[Tuple[str, Tuple, float]]:
+        with self._lock:
+            items = [(key, dict(entry, buckets=list(entry['buckets']))) for key, entry in self._values.items()]
+        for key, entry in items:
+            for bound, bucket_count in zip(self.buckets, entry['buckets']):
+                yield f'{self.name}_bucket', key + (('le', repr(bound)),), bucket_count
+            yield f'{self.name}_bucket', key + (('le', '+Inf'),), entry['count']
+            yield f'{self.name}_sum', key, entry['sum']
+            yield f'{self.name}_count', key, entry['count']
+
+class MetricsRegistry:
+    """Process-wide metrics, rendered in the Prometheus text format"""
+
+    def __init__(self):
+        self._metrics: Dict[str, object] = {}
+        self._lock = threading.Lock()
+
+    def _get(self, metric_type, name: str, help_text: str, **kwargs):
+        with self._lock:
+            if name not in self._metrics:
+                self._metrics[name] = metric_type(name, help_text, **kwargs)
+            return self._metrics[name]
+
+    def counter(self, name: str, help_text: str) -> Counter:
+        return self._get(Counter, name, help_text)
+
+    def histogram(self, name: str, help_text: str, buckets: Tuple[float, ...] = DURATION_BUCKETS) -> Histogram:
+        return self._get(Histogram, name, help_text, buckets=buckets)
+
+    def render(self) -> str:
+        """Prometheus text exposition of every metric"""
+        lines = []
+        with self._lock:
+            metrics = list(self._metrics.values())
+        for metric in metrics:
+            lines.append(f'# HELP {metric.name} {metric.help}')
+            lines.append(f'# TYPE {metric.name} {metric.type}')
+            for name, labels, value in metric.samples():
+                label_text = ','.join(f'{label}="{_escape(label_value)}"' for label, label_value in labels)
+                lines.append(f'{name}{{{label_text}}} {value}' if label_text else f'{name} {value}')
+        return '\n'.join(lines) + '\n'
+
+metrics = MetricsRegistry()
+
+SPAN_DURATION = metrics.histogram('sync_span_duration_seconds', 'Duration of traced sync operations')
+SPAN_ERRORS = metrics.counter('sync_span_errors_total', 'Traced sync operations that raised')
+MODEL_TOKENS = metrics.counter('sync_model_tokens_total', 'Model tokens used, by kind')
+CACHE_LOOKUPS = metrics.counter('sync_cache_lookups_total', 'Stored analyses reused (hit) or regenerated (miss)')
+
+# Span of the code currently running; copied into worker threads by asyncio.to_thread
+_current_span: ContextVar[Optional['Span']] = ContextVar('current_span', default=None)
+
+class Span:
+    """A timed operation within a trace, shaped like an OpenTelemetry span"""
+
+    def __init__(self, name: str, parent: Optional['Span'] = None, attributes: Dict = None):
+        self.name = name
+        self.trace_id = parent.trace_id if parent else uuid.uuid4().hex
+        self.span_id = uuid.uuid4().hex[:16]
+        self.parent_id = parent.span_id if parent else None
+        self.attributes = dict(attributes or {})
+        self.status = 'OK'
+        self.error = None
+        self.start_ns = time.time_ns()
+        self.end_ns = None
+
+    def set_attribute(self, name: str, value):
+        self.attributes[name] = value
+
+    @property
+    def duration(self) -> float:
+        return ((self.end_ns or time.time_ns()) - self.start_ns) / 1e9
+
+    def to_dict(self) -> Dict:
+        """OTLP/JSON-style representation"""
+        span = {
+            'traceId': self.trace_id,
+            'spanId': self.span_id,
+            'parentSpanId': self.parent_id or '',
+            'name': self.name,
+            'startTimeUnixNano': self.start_ns,
+            'endTimeUnixNano': self.end_ns,
+            'attributes': self.attributes,
+            'status': {'code': self.status}
+        }
+        if self.error:
+            span['status']['message'] = self.error
+        return span
+
+class Tracer:
+    """
+    Records spans around sync operations.
+
+    Every finished span updates the duration histogram and error counter,
+    is kept in a bounded in-memory buffer and, when an export path is set
+    (TRACE_EXPORT_PATH or set_export_path), appended to it as a JSON line.
+    """
+
+    def __init__(self, export_path: str = None, recent: int = RECENT_SPANS):
+        self.export_path = export_path
+        self.recent = deque(maxlen=recent)
+        self.listeners = []
+        self._export_lock = threading.Lock()
+
+    def set_export_path(self, path: Optional[str]):
+        self.export_path = path
+
+    def add_listener(self, listener):
+        """Call ``listener(span)`` with every span that finishes"""
+        self.listeners.append(listener)
+
+    def remove_listener(self, listener):
+        if listener in self.listeners:
+            self.listeners.remove(listener)
+
+    @contextmanager
+    def span(self, name: str, **attributes):
+        """Trace the enclosed block as a child of the current span"""
+        span = Span(name, _current_span.get(), attributes)
+        token = _current_span.set(span)
+        try:
+            yield span
+        except BaseException as e:
+            span.status = 'ERROR'
+            span.error = str(e)
+            raise
+        finally:
+            _current_span.reset(token)
+            self._finish(span)
+
+    def _finish(self, span: Span):
+        span.end_ns = time.time_ns()
+        SPAN_DURATION.observe(span.duration, span=span.name)
+        if span.status == 'ERROR':
+            SPAN_ERRORS.inc(span=span.name)
+        self.recent.append(span)
+        for listener in list(self.listeners):
+            listener(span)
+        if self.export_path:
+            line = json.dumps(span.to_dict(), default=str)
+            with self._export_lock:
+                with open(self.export_path, 'a') as f:
+                    f.write(line + '\n')
+
+tracer = Tracer(os.environ.get('TRACE_EXPORT_PATH'))
+
+def span(name: str, **attributes):
+    """Trace a block with the process-wide tracer"""
+    return tracer.span(name, **attributes)
+
+def current_span() -> Optional[Span]:
+    """Innermost span of the running code, if any"""
+    return _current_span.get()
+
+def traced(name: str):
+    """Decorator tracing every call of a function or coroutine function"""
+    def decorate(function):
+        if inspect.iscoroutinefunction(function):
+            @functools.wraps(function)
+            async def async_wrapper(*args, **kwargs):
+                with tracer.span(name):
+                    return await function(*args, **kwargs)
+            return async_wrapper
+
+        @functools.wraps(function)
+        def wrapper(*args, **kwargs):
+            with tracer.span(name):
+                return function(*args, **kwargs)
+        return wrapper
+    return decorate
@@ -0,0 +1,8 @@
+import sys
+from pathlib import Path
+
+# Modules in src import each other as top-level packages (e.g. services.*),
+# as they do when run from src or from the Flask app
+src_dir = Path(__file__).resolve().parent.parent / 'src'
+if str(src_dir) not in sys.path:
+    sys.path.append(str(src_dir))
@@ -0,0 +1,49 @@
+"""
+Tests for the optional storage codecs applied to stored analyses.
+"""
+
+import pytest
+from src.services import analysis_codec
+from src.services.analysis_codec import AnalysisCodec, train_dictionary
+
+
+def sample_analysis(i):
+    return {
+        'summary': f'React component that renders list {i}',
+        'searchMetadata': {
+            'primaryFeatures': ['React component', 'Firestore queries'],
+            'dependencies': {'external': ['react', 'firebase/firestore'], 'internal': ['../hooks/useAuth']}
+        },
+        'functions': [{'name': f'load{i}', 'purpose': 'Loads data from Firestore', 'params': []}]
+    }
+
+
+def test_json_codec_stores_plain_map():
+    assert AnalysisCodec('json').encode({'summary': 'x'}) == {'ai_analysis': {'summary': 'x'}}
+
+
+def test_zlib_round_trip_with_trained_dictionary():
+    samples = [sample_analysis(i) for i in range(20)]
+    dictionary = train_dictionary('zlib', samples)
+    plain = AnalysisCodec('zlib')
+    shared = AnalysisCodec('zlib', dictionary)
+
+    encoded = shared.encode(sample_analysis(99))
+    assert encoded['ai_analysis_codec'] == {'codec': 'zlib', 'dict_id': shared.dict_id}
+    assert shared.decode(encoded['ai_analysis_encoded']) == sample_analysis(99)
+    assert len(encoded['ai_analysis_encoded']) < len(plain.encode(sample_analysis(99))['ai_analysis_encoded'])
+
+
+def test_too_few_samples_do_not_train_a_dictionary():
+    assert train_dictionary('zlib', [sample_analysis(1)]) is None
+
+
+def test_zstd_requires_optional_packages(monkeypatch):
+    monkeypatch.setattr(analysis_codec, 'zstandard', None)
+    with pytest.raises(ValueError):
+        AnalysisCodec('zstd')
+
+
+def test_unknown_codec_is_rejected():
+    with pytest.raises(ValueError):
+        AnalysisCodec('brotli')
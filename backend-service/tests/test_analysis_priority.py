@@ -0,0 +1,69 @@
+"""
+Tests for impact-ordered analysis scheduling.
+"""
+
+from datetime import datetime, timezone
+
+from src.services.analysis_priority import ImportResolver, import_fan_in, prioritize_files, recency_score
+from src.services.firestore_service import RepositorySnapshot, SnapshotRecord
+
+NOW = datetime(2026, 10, 1, tzinfo=timezone.utc)
+
+
+def record(path, last_updated='2026-09-01T00:00:00', imports=(), status='unchanged'):
+    return SnapshotRecord(path, 'sha', 100, last_updated, status, None, tuple(imports))
+
+
+def snapshot_of(*records):
+    return RepositorySnapshot({RepositorySnapshot.doc_id(r.path): r for r in records})
+
+
+def test_import_resolver_handles_relative_dotted_and_aliased_imports():
+    resolver = ImportResolver([
+        'frontend/src/utils/api.ts',
+        'frontend/src/components/index.tsx',
+        'backend/src/services/github_service.py'
+    ])
+
+    assert resolver.resolve('frontend/src/pages/Home.tsx', '../utils/api') == 'frontend/src/utils/api.ts'
+    assert resolver.resolve('frontend/src/App.tsx', './components') == 'frontend/src/components/index.tsx'
+    assert resolver.resolve('frontend/src/App.tsx', './utils/api.ts') == 'frontend/src/utils/api.ts'
+    assert resolver.resolve('backend/src/main.py', 'services.github_service') == \
+        'backend/src/services/github_service.py'
+    assert resolver.resolve('frontend/src/App.tsx', 'react') is None
+
+
+def test_import_fan_in_counts_distinct_importers():
+    fan_in = import_fan_in({
+        'src/a.ts': ['./lib', './lib'],
+        'src/b.ts': ['./lib', 'react'],
+        'src/lib.ts': ['./lib']
+    }, ['src/a.ts', 'src/b.ts', 'src/lib.ts'])
+
+    # Repeated and self imports are counted once and not at all
+    assert fan_in == {'src/lib.ts': 2}
+
+
+def test_recency_score_halves_every_half_life():
+    assert recency_score('2026-10-01T00:00:00+00:00', NOW) == 1.0
+    assert round(recency_score('2026-09-01T00:00:00', NOW), 2) == 0.5
+    assert recency_score(None, NOW) == 0.0
+
+
+def test_prioritize_files_puts_high_impact_files_first():
+    snapshot = snapshot_of(
+        record('src/lib.py', imports=[]),
+        record('src/old.py', last_updated='2024-01-01T00:00:00'),
+        record('src/a.py', imports=['lib']),
+        record('src/b.py', imports=['lib'])
+    )
+    files = [
+        {'path': 'src/old.py', 'size': 100, 'status': 'modified'},
+        {'path': 'src/lib.py', 'size': 100, 'status': 'modified'},
+        {'path': 'src/main.py', 'size': 100, 'status': 'new'},
+        {'path': 'src/huge.py', 'size': 500000, 'status': 'new'}
+    ]
+
+    ordered = [f['path'] for f in prioritize_files(files, snapshot, now=NOW)]
+
+    assert ordered == ['src/main.py', 'src/lib.py', 'src/huge.py', 'src/old.py']
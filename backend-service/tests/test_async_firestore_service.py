@@ -0,0 +1,233 @@
+"""
+Tests for AsyncFirestoreService.
+
+The writer tests use in-memory fakes. The round-trip tests run against the
+local Firestore emulator and are skipped unless it is running:
+
+    firebase emulators:start --only firestore
+    FIRESTORE_EMULATOR_HOST=localhost:8085 python -m pytest tests/test_async_firestore_service.py
+"""
+
+import asyncio
+import os
+import uuid
+import pytest
+from google.api_core import exceptions as api_exceptions
+from src.services import async_firestore_service
+from src.services.async_firestore_service import AsyncFirestoreService
+from src.services.firestore_service import RepositorySnapshot, SnapshotRecord
+
+requires_emulator = pytest.mark.skipif(
+    not os.environ.get('FIRESTORE_EMULATOR_HOST'),
+    reason='FIRESTORE_EMULATOR_HOST is not set'
+)
+
+
+class FakeCollection:
+    def __init__(self, name):
+        self.name = name
+
+    def document(self, doc_id):
+        return f'{self.name}/{doc_id}'
+
+
+class FakeRepoRef:
+    id = 'owner_repo'
+    path = 'repositories/owner_repo'
+
+    def collection(self, name):
+        return FakeCollection(name)
+
+
+class FakeBatch:
+    def __init__(self, db):
+        self.db = db
+        self.writes = []
+
+    def set(self, doc_ref, data, merge=False):
+        self.writes.append(doc_ref)
+
+    async def commit(self):
+        await asyncio.sleep(0)
+        if self.db.failures:
+            self.db.failures -= 1
+            raise api_exceptions.Aborted('contention')
+        self.db.commits.append(self.writes)
+
+
+class FakeDb:
+    def __init__(self, failures=0):
+        self.failures = failures
+        self.commits = []
+
+    def batch(self):
+        return FakeBatch(self)
+
+    def collection(self, name):
+        return FakeCollection(name)
+
+    def document(self, path):
+        return FakeRepoRef()
+
+
+class FakeTransport:
+    def __init__(self):
+        self.closed = False
+
+    async def close(self):
+        self.closed = True
+
+
+class FakeApi:
+    def __init__(self):
+        self.transport = FakeTransport()
+
+
+class FakeAsyncClient:
+    def __init__(self, project, credentials):
+        self.project = project
+        self._firestore_api_internal = FakeApi()
+
+
+class FakeApp:
+    class credential:
+        @staticmethod
+        def get_credential():
+            return 'credentials'
+
+
+def make_service(db):
+    return AsyncFirestoreService('test-project', max_write_attempts=3, client=db)
+
+
+def make_file(path, sha):
+    return {
+        'name': path.split('/')[-1],
+        'path': path,
+        'language': 'py',
+        'size': 10,
+        'last_updated': '2024-01-01T00:00:00',
+        'metadata': {'sha': sha}
+    }
+
+
+def test_each_service_creates_and_closes_its_own_client(monkeypatch):
+    """Services made on different event loops never share a client."""
+    import firebase_admin
+    monkeypatch.setattr(firebase_admin, '_apps', {'[DEFAULT]': FakeApp()})
+    monkeypatch.setattr(firebase_admin, 'get_app', lambda: FakeApp())
+    monkeypatch.setattr(async_firestore_service.cloud_firestore, 'AsyncClient', FakeAsyncClient)
+
+    async def run():
+        service = AsyncFirestoreService('test-project')
+        await service.close()
+        return service.db
+
+    first = asyncio.run(run())
+    second = asyncio.run(run())
+
+    assert first is not second
+    assert first.project == 'test-project'
+    assert first._firestore_api_internal.transport.closed
+    assert second._firestore_api_internal.transport.closed
+
+
+def test_close_leaves_a_passed_client_open():
+    db = FakeAsyncClient('test-project', None)
+    asyncio.run(make_service(db).close())
+    assert not db._firestore_api_internal.transport.closed
+
+
+def test_async_writer_commits_batches_and_tombstones():
+    """Writes are committed in batches in the background; unseen files are tombstoned on close."""
+    db = FakeDb()
+    snapshot = RepositorySnapshot({
+        'gone.py': SnapshotRecord('gone.py', 'c', 10, '2024-01-01T00:00:00', 'active', None)
+    })
+    flushes = []
+
+    async def run():
+        service = make_service(db)
+        file_writer = await service.open_file_writer(FakeRepoRef(), snapshot, max_pending=30,
+                                                     on_flush=flushes.append)
+        for index in range(45):
+            await file_writer.write(make_file(f'src/file_{index}.py', 'a'))
+        return await file_writer.close()
+
+    result = asyncio.run(run())
+    written = [doc_ref for commit in db.commits for doc_ref in commit]
+    assert all(len(commit) <= 20 for commit in db.commits)
+    assert 'files/src_file_44.py' in written
+    assert 'files/gone.py' in written
+    assert result['stats']['new'] == 45
+    assert result['stats']['deleted'] == 1
+    assert result['writes']['succeeded'] == len(written)
+    assert [len(paths) for paths in flushes] == [30, 15]
+
+
+def test_async_writer_retries_aborted_commits():
+    db = FakeDb(failures=2)
+
+    async def run():
+        file_writer = await make_service(db).open_file_writer(FakeRepoRef(), RepositorySnapshot())
+        await file_writer.write(make_file('app.py', 'a'))
+        return await file_writer.close()
+
+    writes = asyncio.run(run())['writes']
+    assert writes['failed'] == 0
+    assert writes['retried'] == 4
+    assert writes['succeeded'] == 2
+
+
+def test_async_writer_leaves_failed_batches_out_of_on_flush():
+    db = FakeDb(failures=3)
+    flushes = []
+
+    async def run():
+        file_writer = await make_service(db).open_file_writer(FakeRepoRef(), RepositorySnapshot(),
+                                                              on_flush=flushes.append)
+        await file_writer.write(make_file('lost.py', 'a'))
+        await file_writer.flush()
+        await file_writer.write(make_file('stored.py', 'b'))
+        return await file_writer.close()
+
+    writes = asyncio.run(run())['writes']
+    assert writes['failed'] > 0
+    assert flushes == [[], ['stored.py']]
+
+
+@pytest.fixture
+def emulator_service():
+    from google.cloud import firestore as cloud_firestore
+    client = cloud_firestore.AsyncClient(project='demo-qeek')
+    return AsyncFirestoreService('demo-qeek', storage_layout='split', analysis_codec='zlib', client=client)
+
+
+@requires_emulator
+def test_sync_round_trip_on_emulator(emulator_service):
+    """A full sync writes documents that the next sync reads back as its snapshot."""
+    repo_id = f'test_{uuid.uuid4().hex[:8]}'
+
+    async def run():
+        repo_ref = await emulator_service.store_repository_metadata(repo_id, {'name': repo_id})
+        snapshot = await emulator_service.load_repository_snapshot(repo_ref)
+        file_writer = await emulator_service.open_file_writer(repo_ref, snapshot)
+        file = make_file('src/app.py', 'a')
+        file['ai_analysis'] = {'summary': 'Entry point'}
+        file['functions'] = ['main']
+        await file_writer.write(file)
+        await emulator_service.store_sync_summary(repo_ref, await file_writer.close())
+
+        snapshot = await emulator_service.load_repository_snapshot(repo_ref)
+        stored = await emulator_service.get_file(repo_ref, 'src_app.py')
+        manifest = await emulator_service.get_repository_manifest(repo_ref)
+        symbols = await emulator_service.load_previous_symbols(repo_ref, snapshot, ['src/app.py'])
+        await emulator_service.update_sync_status(repo_ref, 'completed', progress={'processed': 1, 'total': 1})
+        return snapshot, stored, manifest, symbols
+
+    snapshot, stored, manifest, symbols = asyncio.run(run())
+    assert snapshot.storage_layout == 'split'
+    assert snapshot.get('src/app.py').sha == 'a'
+    assert stored['ai_analysis'] == {'summary': 'Entry point'}
+    assert [entry['path'] for entry in manifest] == ['src/app.py']
+    assert symbols == {'src/app.py': {'main': ['function']}}
@@ -0,0 +1,150 @@
+"""
+Tests for the repository purge tool, using in-memory fakes for Firestore.
+"""
+
+from firebase_admin import firestore
+from src.cleanup import purge_repository, purge_tombstones
+from src.services.firestore_service import BulkWriteStats
+from src.services.repository_manifest import chunk_id, chunk_index
+
+
+class FakeSnapshot:
+    def __init__(self, reference, data=None):
+        self.reference = reference
+        self.id = reference.split('/')[-1]
+        self._data = data or {}
+
+    def to_dict(self):
+        return dict(self._data)
+
+
+class FakeQuery:
+    def __init__(self, docs):
+        self.docs = docs
+        self.filters = []
+
+    def where(self, field, op, value):
+        self.filters.append((field, op))
+        return self
+
+    def recursive(self):
+        return self
+
+    def select(self, fields):
+        return self
+
+    def stream(self):
+        return iter(self.docs)
+
+
+class FakeCollection(FakeQuery):
+    def __init__(self, path, docs=None):
+        super().__init__(docs or [])
+        self.path = path
+        self.id = path.split('/')[-1]
+
+    def document(self, doc_id):
+        return f'{self.path}/{doc_id}'
+
+
+class FakeRepoRef:
+    def __init__(self, collections):
+        self.collections_by_id = collections
+
+    def collections(self):
+        return list(self.collections_by_id.values())
+
+    def collection(self, name):
+        return self.collections_by_id.get(name) or FakeCollection(f'repositories/owner_repo/{name}')
+
+    def __str__(self):
+        return 'repositories/owner_repo'
+
+
+class FakeDb:
+    def __init__(self, repo_ref, symbols):
+        self.repo_ref = repo_ref
+        self.symbols = symbols
+
+    def collection(self, name):
+        if name == 'symbol_index':
+            return self.symbols
+        return self
+
+    def document(self, doc_id):
+        return self.repo_ref
+
+
+class FakeBulkWriter:
+    def __init__(self):
+        self.deletes = []
+        self.updates = []
+        self.closed = False
+
+    def delete(self, reference):
+        self.deletes.append(str(reference))
+
+    def update(self, reference, fields):
+        self.updates.append((reference, fields))
+
+    def close(self):
+        self.closed = True
+
+
+class FakeService:
+    def __init__(self, repo_ref, symbols=None, settings=None):
+        self.db = FakeDb(repo_ref, symbols or FakeCollection('symbol_index'))
+        self.settings = settings or {}
+        self.bulk_writer = FakeBulkWriter()
+
+    def open_bulk_writer(self):
+        return self.bulk_writer, BulkWriteStats(max_attempts=1)
+
+    def get_sync_settings(self, repo_ref):
+        return self.settings
+
+
+def docs(collection, count):
+    return [FakeSnapshot(f'{collection}/{index}') for index in range(count)]
+
+
+def make_repo():
+    return FakeRepoRef({
+        'files': FakeCollection('files', docs('files', 3)),
+        'metrics': FakeCollection('metrics', docs('metrics', 2)),
+        # All-descendants query returns nested chunk documents as well
+        'sync_runs': FakeCollection('sync_runs', docs('sync_runs', 1) + docs('sync_runs/0/completed', 2))
+    })
+
+
+def test_purge_deletes_whole_tree_with_symbols_and_repository_last():
+    service = FakeService(make_repo(), symbols=FakeCollection('symbol_index', docs('symbol_index', 2)))
+    result = purge_repository(service, 'owner/repo')
+
+    assert result['deleted'] == {'files': 3, 'metrics': 2, 'sync_runs': 3, 'symbol_index': 2, 'repository': 1}
+    assert service.bulk_writer.deletes[-1] == 'repositories/owner_repo'
+    assert service.bulk_writer.closed
+    assert service.db.symbols.filters == [('repo_id', '==')]
+
+
+def test_purge_dry_run_and_collection_scope():
+    service = FakeService(make_repo())
+    result = purge_repository(service, 'owner/repo', dry_run=True, collections=['metrics'])
+
+    assert result['deleted'] == {'metrics': 2}
+    assert service.bulk_writer.deletes == []
+
+
+def test_purge_tombstones_removes_analyses_and_manifest_entries():
+    tombstone = FakeSnapshot('files/src_old.py', {'path': 'src/old.py'})
+    files = FakeCollection('repositories/owner_repo/files', [tombstone])
+    service = FakeService(FakeRepoRef({'files': files}),
+                          settings={'storage_layout': 'split', 'manifest': {'chunk_count': 2}})
+    result = purge_tombstones(service, 'owner/repo', older_than_days=30)
+
+    assert files.filters == [('status', '=='), ('deleted_at', '<')]
+    assert service.bulk_writer.deletes == ['files/src_old.py', 'repositories/owner_repo/analyses/src_old.py']
+    chunk_ref, fields = service.bulk_writer.updates[0]
+    assert chunk_ref == f"repositories/owner_repo/manifest/{chunk_id(chunk_index('src/old.py', 2))}"
+    assert fields == {'entries.`src/old.py`': firestore.DELETE_FIELD}
+    assert result['deleted'] == {'files': 1, 'analyses': 1, 'manifest_entries': 1}
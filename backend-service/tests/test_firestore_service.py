@@ -0,0 +1,380 @@
+"""
+Tests for the FirestoreService storage paths that do not need a live project.
+
+Firestore documents and collections are replaced with small in-memory fakes
+so the tests can check which fields are requested and how results are kept.
+"""
+
+import pytest
+from firebase_admin import firestore
+from types import SimpleNamespace
+from src.services.analysis_codec import AnalysisCodec
+from src.services.firestore_service import (
+    BulkWriteStats, FirestoreService, RepositoryFileWriter, RepositorySnapshot, SnapshotRecord,
+    SNAPSHOT_FIELDS, split_file_document
+)
+
+
+class FakeDoc:
+    def __init__(self, doc_id, data):
+        self.id = doc_id
+        self._data = data
+
+    def to_dict(self):
+        return dict(self._data)
+
+
+class FakeQuery:
+    def __init__(self, docs, fields):
+        self.docs = docs
+        self.fields = fields
+
+    def stream(self):
+        return iter(self.docs)
+
+
+class FakeCollection:
+    def __init__(self, docs):
+        self.docs = docs
+        self.selected_fields = None
+
+    def select(self, fields):
+        self.selected_fields = fields
+        return FakeQuery(self.docs, fields)
+
+
+class FakeRepoDoc:
+    def __init__(self, data):
+        self.exists = data is not None
+        self._data = data
+
+    def to_dict(self):
+        return self._data
+
+
+class FakeRepoRef:
+    def __init__(self, docs, repo_data=None):
+        self.files = FakeCollection(docs)
+        self.repo_data = repo_data
+
+    def collection(self, name):
+        assert name == 'files'
+        return self.files
+
+    def get(self, field_paths=None):
+        return FakeRepoDoc(self.repo_data)
+
+
+class FakeWriteCollection:
+    def __init__(self, name):
+        self.name = name
+
+    def document(self, doc_id):
+        return doc_id if self.name == 'files' else f'{self.name}/{doc_id}'
+
+
+class FakeWriteRepoRef:
+    id = 'owner_repo'
+
+    def collection(self, name):
+        return FakeWriteCollection(name)
+
+
+class FakeDocumentReference(str):
+    """Document reference that compares equal to the document ID the writer fakes use"""
+
+    @property
+    def path(self):
+        return str(self)
+
+
+class FakeDb:
+    def collection(self, name):
+        return FakeWriteCollection(name)
+
+
+class FakeBulkWriter:
+    def __init__(self):
+        self.writes = []
+        self.flushes = 0
+        self.closed = False
+
+    def set(self, doc_ref, data, merge=False):
+        self.writes.append((doc_ref, data, merge))
+
+    def flush(self):
+        self.flushes += 1
+
+    def close(self):
+        self.closed = True
+
+
+class FakeWriterService:
+    def __init__(self, codec='json'):
+        self.codec = codec
+        self.dictionaries = []
+        self.db = FakeDb()
+
+    def open_bulk_writer(self):
+        return FakeBulkWriter(), BulkWriteStats(max_attempts=1)
+
+    def open_analysis_codec(self, repo_ref, snapshot):
+        return AnalysisCodec(self.codec)
+
+    def store_analysis_dictionary(self, repo_ref, codec):
+        self.dictionaries.append(codec)
+
+
+@pytest.fixture
+def firestore_service():
+    """FirestoreService without a Firestore client, for methods that only use repo_ref"""
+    return FirestoreService.__new__(FirestoreService)
+
+
+def test_load_repository_snapshot_uses_projection(firestore_service):
+    """Snapshot reads request only the change-detection fields."""
+    repo_ref = FakeRepoRef([
+        FakeDoc('src_app.py', {
+            'path': 'src/app.py',
+            'metadata': {'sha': 'abc'},
+            'size': 120,
+            'last_updated': '2024-01-01T00:00:00',
+            'status': 'unchanged'
+        })
+    ])
+
+    snapshot = firestore_service.load_repository_snapshot(repo_ref)
+
+    assert repo_ref.files.selected_fields == SNAPSHOT_FIELDS
+    assert len(snapshot) == 1
+    record = snapshot.get('src/app.py')
+    assert record.sha == 'abc'
+    assert record.size == 120
+    assert record.first_indexed_at is None
+    assert snapshot.storage_layout == 'inline'
+
+
+def test_new_repository_uses_default_storage_layout(firestore_service):
+    """Repositories without files or a recorded layout get the service default."""
+    firestore_service.storage_layout = 'split'
+
+    assert firestore_service.load_repository_snapshot(FakeRepoRef([])).storage_layout == 'split'
+    recorded = FakeRepoRef([], repo_data={'metadata': {'storage_layout': 'inline'}})
+    assert firestore_service.load_repository_snapshot(recorded).storage_layout == 'inline'
+
+
+def test_snapshot_lookup_by_path():
+    """Paths are mapped to the same document IDs the store writes."""
+    snapshot = RepositorySnapshot()
+    assert RepositorySnapshot.doc_id('src/services/app.py') == 'src_services_app.py'
+    assert 'src/app.py' not in snapshot
+    assert snapshot.get('src/app.py') is None
+
+
+def test_bulk_write_stats_retries_until_max_attempts():
+    """Failed writes are retried, then counted as failures by error code."""
+    write_stats = BulkWriteStats(max_attempts=3)
+    failure = SimpleNamespace(
+        attempts=1,
+        code=10,
+        message='Aborted due to contention',
+        operation=SimpleNamespace(reference=FakeDocumentReference('repositories/r/files/a'))
+    )
+
+    assert write_stats.on_write_error(failure, None) is True
+    failure.attempts = 3
+    assert write_stats.on_write_error(failure, None) is False
+    write_stats.on_write_result(None, None, None)
+
+    writes = write_stats.to_dict()
+    assert writes['succeeded'] == 1
+    assert writes['retried'] == 1
+    assert writes['failed'] == 1
+    assert writes['errors_by_code'] == {'10': 1}
+
+
+def make_file(path, sha):
+    return {
+        'name': path.split('/')[-1],
+        'path': path,
+        'language': 'py',
+        'size': 10,
+        'last_updated': '2024-01-01T00:00:00',
+        'metadata': {'sha': sha}
+    }
+
+
+def test_file_writer_streams_changes_and_tombstones_missing_files():
+    """Only changed files are written, buffered writes are flushed, and unseen files are tombstoned."""
+    snapshot = RepositorySnapshot({
+        'same.py': SnapshotRecord('same.py', 'a', 10, '2024-01-01T00:00:00', 'unchanged', None),
+        'changed.py': SnapshotRecord('changed.py', 'b', 10, '2024-01-01T00:00:00', 'unchanged', None),
+        'gone.py': SnapshotRecord('gone.py', 'c', 10, '2024-01-01T00:00:00', 'unchanged', None)
+    })
+    file_writer = RepositoryFileWriter(FakeWriterService(), FakeWriteRepoRef(), snapshot, max_pending=2)
+
+    file_writer.write(make_file('same.py', 'a'))
+    file_writer.write(make_file('changed.py', 'b2'))
+    file_writer.write(make_file('new.py', 'd'))
+    result = file_writer.close()
+
+    bulk_writer = file_writer.bulk_writer
+    file_writes = [write for write in bulk_writer.writes if '/' not in write[0]]
+    assert [write[0] for write in file_writes] == ['changed.py', 'new.py', 'gone.py']
+    assert file_writes[-1][1]['status'] == 'deleted'
+    assert bulk_writer.flushes == 2
+    assert bulk_writer.closed
+    assert result['stats'] == {'new': 1, 'updated': 1, 'unchanged': 1, 'deleted': 1, 'restored': 0}
+    assert result['active_files'] == 3
+
+
+def test_file_writer_reports_only_stored_paths_on_flush():
+    """Paths whose document write was given up on are left out of on_flush."""
+    snapshot = RepositorySnapshot({
+        'same.py': SnapshotRecord('same.py', 'a', 10, '2024-01-01T00:00:00', 'active', None)
+    })
+    flushed = []
+    file_writer = RepositoryFileWriter(FakeWriterService(), FakeWriteRepoRef(), snapshot, on_flush=flushed.append)
+
+    file_writer.write(make_file('same.py', 'a'))
+    file_writer.write(make_file('good.py', 'b'))
+    file_writer.write(make_file('bad.py', 'c'))
+    failure = SimpleNamespace(attempts=1, code=4, message='Deadline exceeded',
+                              operation=SimpleNamespace(reference=FakeDocumentReference('bad.py')))
+    file_writer.write_stats.on_write_error(failure, None)
+    file_writer.flush()
+    file_writer.write(make_file('bad.py', 'c'))
+    file_writer.close()
+
+    assert flushed == [['same.py', 'good.py'], []]
+
+
+def test_existing_tombstones_are_not_rewritten():
+    """Files that are already tombstoned keep their original deleted_at."""
+    snapshot = RepositorySnapshot({
+        'old.py': SnapshotRecord('old.py', 'a', 10, '2024-01-01T00:00:00', 'deleted', None)
+    })
+    file_writer = RepositoryFileWriter(FakeWriterService(), FakeWriteRepoRef(), snapshot)
+    result = file_writer.close()
+
+    assert [write for write in file_writer.bulk_writer.writes if write[0] == 'old.py'] == []
+    assert result['stats']['deleted'] == 1
+
+
+def test_split_layout_writes_analysis_separately():
+    """Under the split layout the analysis goes to its own document."""
+    snapshot = RepositorySnapshot(storage_layout='split')
+    file_writer = RepositoryFileWriter(FakeWriterService(), FakeWriteRepoRef(), snapshot)
+
+    file = make_file('app.py', 'a')
+    file['ai_analysis'] = {'summary': 'Entry point'}
+    file_writer.write(file)
+    result = file_writer.close()
+
+    writes = {write[0]: write[1] for write in file_writer.bulk_writer.writes}
+    assert writes['analyses/app.py']['ai_analysis'] == {'summary': 'Entry point'}
+    assert 'ai_analysis' not in writes['app.py']
+    assert writes['app.py']['has_analysis'] is True
+    assert result['storage_layout'] == 'split'
+
+
+def test_split_file_document_without_analysis():
+    file_document, analysis_document = split_file_document({'path': 'a.py', 'size': 1})
+    assert analysis_document == {}
+    assert file_document == {'path': 'a.py', 'size': 1, 'has_analysis': False}
+
+
+def test_file_writer_merges_only_changed_manifest_entries():
+    """With an existing manifest, only changed and deleted entries are written."""
+    snapshot = RepositorySnapshot({
+        'same.py': SnapshotRecord('same.py', 'a', 10, '2024-01-01T00:00:00', 'unchanged', None),
+        'gone.py': SnapshotRecord('gone.py', 'c', 10, '2024-01-01T00:00:00', 'unchanged', None)
+    }, manifest={'chunk_count': 1})
+    file_writer = RepositoryFileWriter(FakeWriterService(), FakeWriteRepoRef(), snapshot)
+
+    file_writer.write(make_file('same.py', 'a'))
+    file_writer.write(make_file('new.py', 'd'))
+    result = file_writer.close()
+
+    manifest_writes = [write for write in file_writer.bulk_writer.writes if write[0].startswith('manifest/')]
+    assert len(manifest_writes) == 1
+    chunk_ref, data, merge = manifest_writes[0]
+    assert chunk_ref == 'manifest/chunk_0000'
+    assert merge is True
+    assert set(data['entries']) == {'new.py', 'gone.py'}
+    assert data['entries']['gone.py']['status'] == 'deleted'
+    assert result['manifest'] == {'chunk_count': 1, 'entry_count': 3}
+
+
+def test_encoded_analysis_trains_repository_dictionary():
+    """With a compressing codec, analyses are stored as bytes and sampled for a shared dictionary."""
+    service = FakeWriterService(codec='zlib')
+    file_writer = RepositoryFileWriter(service, FakeWriteRepoRef(), RepositorySnapshot())
+
+    for i in range(12):
+        file = make_file(f'src/file_{i}.py', str(i))
+        file['ai_analysis'] = {'summary': f'Service module {i}', 'imports': [{'path': 'firebase_admin'}]}
+        file_writer.write(file)
+    result = file_writer.close()
+
+    document = file_writer.bulk_writer.writes[0][1]
+    assert 'ai_analysis' not in document
+    assert document['ai_analysis_codec'] == {'codec': 'zlib', 'dict_id': None}
+    assert file_writer.codec.decode(document['ai_analysis_encoded'])['summary'] == 'Service module 0'
+    assert len(service.dictionaries) == 1
+    assert result['analysis_codec'] == {'codec': 'zlib', 'dict_id': service.dictionaries[0].dict_id}
+
+
+def test_file_writer_updates_symbol_index_delta():
+    """Changed files add their symbols; symbols a file no longer has, and deleted files, are removed."""
+    snapshot = RepositorySnapshot({
+        'app.py': SnapshotRecord('app.py', 'a', 10, '2024-01-01T00:00:00', 'unchanged', None),
+        'gone.py': SnapshotRecord('gone.py', 'c', 10, '2024-01-01T00:00:00', 'unchanged', None)
+    })
+    previous = {
+        'app.py': {'old_helper': ['function'], 'main': ['function']},
+        'gone.py': {'GoneService': ['class']}
+    }
+    file_writer = RepositoryFileWriter(FakeWriterService(), FakeWriteRepoRef(), snapshot,
+                                       previous_symbols=previous)
+
+    file = make_file('app.py', 'a2')
+    file['functions'] = ['main', 'new_helper']
+    file_writer.write(file)
+    file_writer.close()
+
+    symbol_writes = {
+        data['symbol']: data['entries'] for ref, data, merge in file_writer.bulk_writer.writes
+        if ref.startswith('symbol_index/')
+    }
+    assert set(symbol_writes) == {'old_helper', 'new_helper', 'GoneService'}
+    assert symbol_writes['new_helper'] == {'app.py': ['function']}
+    assert symbol_writes['old_helper']['app.py'] is firestore.DELETE_FIELD
+    assert symbol_writes['GoneService']['gone.py'] is firestore.DELETE_FIELD
+
+
+def test_sharded_sync_writers_split_the_closing_writes():
+    """Shard writers store only their files; the coordinator counts them and writes tombstones and the manifest."""
+    snapshot = RepositorySnapshot({
+        'changed.py': SnapshotRecord('changed.py', 'b', 10, '2024-01-01T00:00:00', 'unchanged', None),
+        'gone.py': SnapshotRecord('gone.py', 'c', 10, '2024-01-01T00:00:00', 'unchanged', None)
+    }, manifest={'chunk_count': 1})
+    service = FakeWriterService(codec='zlib')
+    shard_writer = RepositoryFileWriter(service, FakeWriteRepoRef(), snapshot, partial=True)
+    coordinator = RepositoryFileWriter(service, FakeWriteRepoRef(), snapshot)
+
+    for file in (make_file('changed.py', 'b2'), make_file('new.py', 'd')):
+        file['ai_analysis'] = {'summary': 'Changed'}
+        shard_writer.write(file)
+        coordinator.mark_stored(file)
+    shard_writer.close()
+    result = coordinator.close()
+
+    shard_writes = [write[0] for write in shard_writer.bulk_writer.writes if not write[0].startswith('symbol_index/')]
+    assert shard_writes == ['changed.py', 'new.py']
+    assert service.dictionaries == []
+    coordinator_writes = {write[0]: write[1] for write in coordinator.bulk_writer.writes}
+    assert coordinator_writes['gone.py']['status'] == 'deleted'
+    assert set(coordinator_writes['manifest/chunk_0000']['entries']) == {'changed.py', 'new.py', 'gone.py'}
+    assert result['stats'] == {'new': 1, 'updated': 1, 'unchanged': 0, 'deleted': 1, 'restored': 0}
+    assert result['active_files'] == 2
@@ -0,0 +1,89 @@
+"""
+Tests for the SQLite-backed sync job queue and its worker pool.
+"""
+
+import threading
+import time
+
+import pytest
+
+from src.services.job_queue import JobQueue, JobWorkerPool
+
+
+@pytest.fixture
+def queue(tmp_path):
+    return JobQueue(str(tmp_path / 'jobs.sqlite3'))
+
+
+def wait_for(condition, timeout=5.0):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        if time.monotonic() > deadline:
+            raise AssertionError("Timed out waiting for condition")
+        time.sleep(0.01)
+
+
+def test_enqueue_deduplicates_active_jobs(queue):
+    first, created = queue.enqueue('repository_sync', {'repo': 'a/b'}, dedupe_key='a_b')
+    second, created_again = queue.enqueue('repository_sync', {'repo': 'a/b'}, dedupe_key='a_b')
+    other, _ = queue.enqueue('repository_sync', {'repo': 'c/d'}, dedupe_key='c_d')
+
+    assert created and not created_again
+    assert second['id'] == first['id']
+    assert other['id'] != first['id']
+
+    # Once the job has finished, a new request queues a new job
+    queue.claim()
+    queue.complete(first['id'], {'changed_files': 1})
+    third, created = queue.enqueue('repository_sync', {'repo': 'a/b'}, dedupe_key='a_b')
+    assert created and third['id'] != first['id']
+
+
+def test_concurrent_enqueues_create_one_job(queue):
+    results = []
+
+    def enqueue():
+        results.append(queue.enqueue('repository_sync', {}, dedupe_key='same')[0]['id'])
+
+    threads = [threading.Thread(target=enqueue) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert len(set(results)) == 1
+
+
+def test_jobs_survive_restart_and_stale_jobs_are_reclaimed(tmp_path):
+    path = str(tmp_path / 'jobs.sqlite3')
+    job, _ = JobQueue(path).enqueue('repository_sync', {'repo': 'a/b'})
+    claimed = JobQueue(path, stale_after=0.05).claim()
+    assert claimed['id'] == job['id'] and claimed['status'] == 'running'
+
+    # The worker that claimed it never heartbeats again
+    time.sleep(0.1)
+    reclaimed = JobQueue(path, stale_after=0.05).claim()
+
+    assert reclaimed['id'] == job['id']
+    assert reclaimed['attempts'] == 2
+
+
+def test_worker_pool_runs_jobs_and_records_failures(queue):
+    def handler(payload):
+        if payload.get('fail'):
+            raise RuntimeError('sync failed')
+        return {'changed_files': payload['files']}
+
+    pool = JobWorkerPool(queue, handler, workers=2, poll_interval=0.05)
+    pool.start()
+    try:
+        ok, _ = queue.enqueue('repository_sync', {'files': 3})
+        failed, _ = queue.enqueue('repository_sync', {'fail': True})
+        pool.notify()
+        wait_for(lambda: queue.get(ok['id'])['status'] == 'succeeded' and
+                 queue.get(failed['id'])['status'] == 'failed')
+    finally:
+        pool.stop(timeout=5)
+
+    assert queue.get(ok['id'])['result'] == {'changed_files': 3}
+    assert queue.get(failed['id'])['error'] == 'sync failed'
@@ -0,0 +1,58 @@
+"""
+Tests for rolling per-sync metrics up into daily and weekly aggregates.
+"""
+
+from datetime import datetime, timezone
+from firebase_admin import firestore
+from src.services.metrics_rollup import group_by_period, period_start, rollup_update
+
+
+def metrics_doc(day, new=1, succeeded=10, active_files=5):
+    return {
+        'timestamp': datetime(2024, 1, day, 12, tzinfo=timezone.utc),
+        'stats': {'new': new, 'updated': 0, 'unchanged': 3, 'deleted': 1, 'restored': 0},
+        'writes': {'succeeded': succeeded, 'failed': 0, 'retried': 2, 'duration_seconds': 1.5},
+        'totals': {'active_files': active_files, 'deleted_files': 1, 'total_files': active_files + 1}
+    }
+
+
+def test_period_start_for_days_and_iso_weeks():
+    timestamp = datetime(2024, 1, 31, 23, 59, tzinfo=timezone.utc)
+    assert period_start(timestamp, 'daily') == '2024-01-31'
+    # 2024-01-31 is a Wednesday; its week starts on Monday the 29th
+    assert period_start(timestamp, 'weekly') == '2024-01-29'
+
+
+def test_group_by_period_skips_documents_without_timestamp():
+    documents = [('a', metrics_doc(1)), ('b', metrics_doc(1)), ('c', metrics_doc(2)), ('d', {})]
+    groups = group_by_period(documents, 'daily', 'timestamp')
+    assert {start: [ref for ref, _ in group] for start, group in groups.items()} == {
+        '2024-01-01': ['a', 'b'],
+        '2024-01-02': ['c']
+    }
+
+
+def test_rollup_update_sums_counters_and_keeps_latest_totals():
+    update = rollup_update('2024-01-01', 'daily', [metrics_doc(1, new=2), metrics_doc(2, new=3, active_files=9)])
+
+    assert isinstance(update['sync_count'], firestore.Increment)
+    assert update['sync_count'].value == 2
+    assert update['stats']['new'].value == 5
+    assert update['writes']['duration_seconds'].value == 3.0
+    assert update['latest_totals']['active_files'] == 9
+
+
+def test_daily_aggregates_roll_up_into_weekly():
+    daily = {
+        'sync_count': 4,
+        'stats': {'new': 6},
+        'writes': {'succeeded': 40},
+        'latest_totals': {'active_files': 7},
+        'latest_timestamp': datetime(2024, 1, 3, tzinfo=timezone.utc)
+    }
+    update = rollup_update('2024-01-01', 'weekly', [daily, dict(daily, sync_count=1)])
+
+    assert update['sync_count'].value == 5
+    assert update['stats']['new'].value == 12
+    assert update['stats']['restored'].value == 0
+    assert update['period'] == 'weekly'
@@ -0,0 +1,86 @@
+"""
+Tests for the progress event fan-out used by the sync event stream.
+"""
+
+import asyncio
+
+from src.services.progress_broadcaster import ProgressBroadcaster, format_sse
+from src.services.progress_reporter import ProgressReporter
+
+
+class FakeFirestoreService:
+    def update_sync_status(self, repo_ref, status, error=None, progress=None):
+        pass
+
+
+def test_events_fan_out_to_every_subscriber():
+    broadcaster = ProgressBroadcaster()
+    first = broadcaster.subscribe('owner_repo')
+    second = broadcaster.subscribe('owner_repo')
+    other = broadcaster.subscribe('other_repo')
+
+    broadcaster.publish('owner_repo', 'file', {'processed': 1})
+
+    assert first.get(timeout=0)['data'] == {'processed': 1}
+    assert second.get(timeout=0)['data'] == {'processed': 1}
+    assert other.get(timeout=0) is None
+
+
+def test_slow_subscriber_drops_oldest_events_without_blocking():
+    broadcaster = ProgressBroadcaster(max_pending=3)
+    slow = broadcaster.subscribe('owner_repo')
+
+    for processed in range(10):
+        broadcaster.publish('owner_repo', 'file', {'processed': processed})
+    broadcaster.publish('owner_repo', 'completed', {'status': 'completed'})
+
+    events = [slow.get(timeout=0) for _ in range(3)]
+    assert [event['event'] for event in events] == ['file', 'file', 'completed']
+    assert slow.dropped == 8
+
+
+def test_late_subscriber_starts_from_last_event():
+    broadcaster = ProgressBroadcaster()
+    broadcaster.publish('owner_repo', 'file', {'processed': 4})
+
+    with broadcaster.subscribe('owner_repo') as subscription:
+        assert subscription.get(timeout=0)['data'] == {'processed': 4}
+        assert broadcaster.subscriber_count('owner_repo') == 1
+    assert broadcaster.subscriber_count('owner_repo') == 0
+
+
+def test_late_subscriber_does_not_replay_a_finished_sync():
+    """A stream opened after a sync ended waits for the next sync's events."""
+    broadcaster = ProgressBroadcaster()
+    broadcaster.publish('owner_repo', 'completed', {'status': 'completed'})
+
+    with broadcaster.subscribe('owner_repo') as subscription:
+        assert subscription.get(timeout=0) is None
+        broadcaster.publish('owner_repo', 'queued', {'status': 'queued'})
+        assert subscription.get(timeout=0)['event'] == 'queued'
+
+    with broadcaster.subscribe('owner_repo') as subscription:
+        assert subscription.get(timeout=0)['event'] == 'queued'
+
+
+def test_progress_reporter_publishes_file_and_final_events():
+    broadcaster = ProgressBroadcaster()
+    subscription = broadcaster.subscribe('owner_repo')
+
+    async def run():
+        reporter = ProgressReporter(FakeFirestoreService(), None, total=2, poll_interval=0.01,
+                                    broadcaster=broadcaster, topic='owner_repo')
+        reporter.start()
+        reporter.update(path='a.py')
+        reporter.update(path='b.py')
+        await reporter.close('completed')
+
+    asyncio.run(run())
+
+    events = []
+    while (event := subscription.get(timeout=0)) is not None:
+        events.append(event)
+    assert [event['event'] for event in events] == ['started', 'file', 'file', 'completed']
+    assert events[2]['data']['path'] == 'b.py'
+    assert events[2]['data']['percent'] == 100.0
+    assert format_sse(events[-1]).startswith(f"id: {events[-1]['id']}\nevent: completed\ndata: {{")
@@ -0,0 +1,60 @@
+"""
+Tests for ProgressReporter, which writes coalesced sync progress in the background.
+"""
+
+import asyncio
+from src.services.progress_reporter import ProgressReporter
+
+
+class FakeFirestoreService:
+    def __init__(self):
+        self.updates = []
+
+    def update_sync_status(self, repo_ref, status, error=None, progress=None):
+        self.updates.append((status, error, progress))
+
+
+def test_updates_are_coalesced_by_delta():
+    """Many small updates produce one write once the percentage delta is reached."""
+    async def run():
+        service = FakeFirestoreService()
+        reporter = ProgressReporter(service, None, total=100, min_interval=60, min_delta=0.1, poll_interval=0.01)
+        reporter.start()
+        for _ in range(5):
+            reporter.update()
+        await asyncio.sleep(0.05)
+        assert service.updates == []
+        for _ in range(5):
+            reporter.update(tokens=100)
+        await asyncio.sleep(0.05)
+        await reporter.close('completed')
+        return service.updates
+
+    updates = asyncio.run(run())
+    assert [update[0] for update in updates] == ['in_progress', 'completed']
+    assert updates[0][2]['processed'] == 10
+    assert updates[-1][2]['tokens'] == 500
+
+
+def test_final_state_is_written_on_error():
+    async def run():
+        service = FakeFirestoreService()
+        reporter = ProgressReporter(service, None, total=10, poll_interval=0.01)
+        reporter.start()
+        reporter.update()
+        await reporter.close('error', error='boom')
+        return service.updates
+
+    updates = asyncio.run(run())
+    assert updates[-1][0] == 'error'
+    assert updates[-1][1] == 'boom'
+
+
+def test_snapshot_reports_throughput_and_eta():
+    reporter = ProgressReporter(FakeFirestoreService(), None, total=4)
+    reporter.update(processed=2, tokens=10)
+    progress = reporter.snapshot()
+    assert progress['percent'] == 50.0
+    assert progress['files_per_second'] > 0
+    assert progress['eta_seconds'] is not None
+    assert progress['projected_finish'] is not None
@@ -0,0 +1,48 @@
+"""
+Tests for the chunked repository manifest used to load file trees in a few reads.
+"""
+
+from src.services import repository_manifest
+from src.services.repository_manifest import ManifestUpdate, chunk_index, manifest_entry
+
+
+def test_first_sync_builds_every_chunk():
+    """Without an existing manifest every entry is written and chunks are replaced."""
+    update = ManifestUpdate(None)
+    for i in range(5):
+        update.add(f'src/file_{i}.py', {'status': 'unchanged'}, changed=False)
+
+    writes = update.plan()
+
+    assert update.chunk_count == 1
+    assert len(writes) == 1
+    chunk_id, entries, merge = writes[0]
+    assert chunk_id == 'chunk_0000'
+    assert len(entries) == 5
+    assert merge is False
+
+
+def test_outgrown_manifest_is_rebuilt_with_more_chunks(monkeypatch):
+    """A manifest whose chunks are over capacity is rewritten into more chunks."""
+    monkeypatch.setattr(repository_manifest, 'ENTRIES_PER_CHUNK', 2)
+    monkeypatch.setattr(repository_manifest, 'MAX_ENTRIES_PER_CHUNK', 3)
+    update = ManifestUpdate({'chunk_count': 1})
+    for i in range(5):
+        update.add(f'src/file_{i}.py', {'status': 'unchanged'}, changed=i == 0)
+
+    writes = update.plan()
+
+    assert update.chunk_count == 3
+    assert [write[0] for write in writes] == ['chunk_0000', 'chunk_0001', 'chunk_0002']
+    assert sum(len(write[1]) for write in writes) == 5
+    assert all(write[2] is False for write in writes)
+
+
+def test_chunk_index_is_stable():
+    assert chunk_index('src/app.py', 8) == chunk_index('src/app.py', 8)
+    assert 0 <= chunk_index('src/app.py', 8) < 8
+
+
+def test_manifest_entry_fields():
+    entry = manifest_entry({'language': 'py', 'size': 3, 'status': 'new', 'metadata': {'sha': 'abc'}})
+    assert entry == {'language': 'py', 'size': 3, 'status': 'new', 'sha': 'abc'}
@@ -0,0 +1,147 @@
+"""
+Tests for multi-repository scheduling: fair-share queueing, shared rate
+limits, due repository selection and the run report.
+"""
+
+import threading
+import time
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+from src.services.rate_limits import SharedLimits, TokenBucket
+from src.services.sync_scheduler import FairShareQueue, due_repositories, run_report
+
+
+class FakeDoc:
+    def __init__(self, doc_id, data):
+        self.id = doc_id
+        self._data = data
+
+    def to_dict(self):
+        return self._data
+
+
+class FakeCollection:
+    def __init__(self, docs):
+        self.docs = docs
+
+    def select(self, fields):
+        return self
+
+    def stream(self):
+        return iter(self.docs)
+
+
+class FakeDb:
+    def __init__(self, docs):
+        self.docs = docs
+
+    def collection(self, name):
+        assert name == 'repositories'
+        return FakeCollection(self.docs)
+
+
+def test_fair_share_queue_interleaves_tenants():
+    queue = FairShareQueue()
+    for index in range(3):
+        queue.push('busy', f'busy-{index}')
+    queue.push('quiet', 'quiet-0')
+
+    first = queue.pop()
+    second = queue.pop()
+
+    # The quiet tenant does not wait behind the busy tenant's backlog
+    assert first == ('busy', 'busy-0')
+    assert second == ('quiet', 'quiet-0')
+    assert len(queue) == 2
+
+
+def test_fair_share_queue_prefers_tenants_with_fewer_running_jobs():
+    queue = FairShareQueue()
+    queue.push('a', 'a-0')
+    queue.push('a', 'a-1')
+    queue.push('b', 'b-0')
+    queue.push('b', 'b-1')
+    queue.push('b', 'b-2')
+
+    assert queue.pop() == ('a', 'a-0')
+    assert queue.pop() == ('b', 'b-0')
+    queue.done('b')
+    # b finished its job and a is still running, so b goes next
+    assert queue.pop() == ('b', 'b-1')
+    queue.done('a')
+    queue.done('b')
+    # Both idle: a has started fewer jobs
+    assert queue.pop() == ('a', 'a-1')
+    assert queue.pop() == ('b', 'b-2')
+    with pytest.raises(IndexError):
+        queue.pop()
+
+
+def test_token_bucket_limits_request_rate():
+    bucket = TokenBucket(rate=50, capacity=1)
+    started = time.monotonic()
+    for _ in range(6):
+        bucket.acquire()
+    # The first token is available immediately, the other five take 0.1s
+    assert time.monotonic() - started >= 0.09
+
+
+def test_shared_limits_apply_per_account_budgets():
+    class Service:
+        rate_limiter = None
+        concurrency_limit = None
+
+    github_a, github_b, gemini = Service(), Service(), Service()
+    buckets = {'a': TokenBucket(1), 'b': TokenBucket(1)}
+    slots = threading.BoundedSemaphore(2)
+    limits = SharedLimits(buckets, slots)
+
+    limits.apply('a', github_service=github_a)
+    limits.apply('b', github_service=github_b, gemini_service=gemini)
+
+    assert github_a.rate_limiter is buckets['a']
+    assert github_b.rate_limiter is buckets['b']
+    assert gemini.concurrency_limit is slots
+    assert gemini.rate_limiter is None
+
+
+def test_due_repositories_orders_by_last_sync():
+    now = datetime(2026, 10, 1, tzinfo=timezone.utc)
+    db = FakeDb([
+        FakeDoc('owner_recent', {'accountId': 'acc', 'metadata': {'last_synced': now - timedelta(hours=1)}}),
+        FakeDoc('owner_old', {'accountId': 'acc', 'metadata': {
+            'full_name': 'owner/old', 'last_synced': now - timedelta(days=3)
+        }}),
+        FakeDoc('owner_new_repo', {'accountId': 'other'}),
+        FakeDoc('owner_orphan', {'metadata': {}})
+    ])
+
+    jobs = due_repositories(db, timedelta(hours=24), now=now)
+
+    assert jobs == [
+        {'repo': 'owner/new_repo', 'account_id': 'other'},
+        {'repo': 'owner/old', 'account_id': 'acc'}
+    ]
+
+
+def test_run_report_totals_by_tenant():
+    started = datetime(2026, 10, 1, tzinfo=timezone.utc)
+    entries = [
+        {'repo': 'a/one', 'account_id': 'a', 'status': 'success', 'duration_seconds': 10.0, 'changed_files': 4},
+        {'repo': 'a/two', 'account_id': 'a', 'status': 'error', 'duration_seconds': 2.5, 'changed_files': 0,
+         'error': 'boom'},
+        {'repo': 'b/one', 'account_id': 'b', 'status': 'success', 'duration_seconds': 5.0, 'changed_files': 1}
+    ]
+
+    report = run_report(entries, started, started + timedelta(seconds=12), workers=2)
+
+    assert report['duration_seconds'] == 12
+    assert report['totals'] == {
+        'repositories': 3, 'succeeded': 2, 'failed': 1, 'changed_files': 5, 'sync_seconds': 17.5
+    }
+    assert report['tenants']['a'] == {
+        'repositories': 2, 'failed': 1, 'changed_files': 4, 'duration_seconds': 12.5
+    }
+    assert report['repositories'] == entries
@@ -0,0 +1,102 @@
+"""
+Tests for building the cross-repository symbol index from file metadata.
+"""
+
+from src.services import symbol_index
+from src.services.symbol_index import SymbolIndexUpdate, extract_symbols, search_symbols, symbol_doc_id
+
+
+def test_extract_symbols_from_regex_and_ai_fields():
+    """String lists and AI analysis entries are both indexed, with merged kinds."""
+    file = {
+        'imports': ['react', '../hooks/useAuth'],
+        'functions': [{'name': 'UserProfile', 'purpose': 'Renders a user'}],
+        'classes': [],
+        'exports': ['UserProfile']
+    }
+
+    assert extract_symbols(file) == {
+        'react': ['import'],
+        '../hooks/useAuth': ['import'],
+        'UserProfile': ['export', 'function']
+    }
+
+
+def test_unchanged_symbols_are_not_rewritten():
+    update = SymbolIndexUpdate('owner_repo', {'app.py': {'main': ['function']}})
+    update.file_changed('app.py', {'functions': ['main']})
+    assert update.plan() == []
+
+
+def test_symbol_documents_are_sharded_per_repository():
+    assert symbol_doc_id('owner_a', 'react', 0) != symbol_doc_id('owner_b', 'react', 0)
+    assert symbol_doc_id('owner_a', 'react', 0).startswith('owner_a_')
+
+
+def test_common_symbol_entries_are_split_across_buckets(monkeypatch):
+    """A symbol defined by many files is written to one document per path bucket."""
+    monkeypatch.setattr(symbol_index, 'SYMBOL_BUCKETS', 4)
+    update = SymbolIndexUpdate('owner_repo')
+    paths = [f'pkg{i}/__init__.py' for i in range(40)]
+    for path in paths:
+        update.file_changed(path, {'functions': ['__init__']})
+
+    writes = update.plan()
+
+    assert 1 < len(writes) <= 4
+    assert len({doc_id for doc_id, _ in writes}) == len(writes)
+    written = {}
+    for doc_id, data in writes:
+        assert doc_id == symbol_doc_id('owner_repo', '__init__', data['bucket'])
+        written.update(data['entries'])
+    assert sorted(written) == sorted(paths)
+
+
+class FakeQuery:
+    def __init__(self, docs):
+        self.docs = docs
+
+    def where(self, *args):
+        return self
+
+    def order_by(self, *args):
+        return self
+
+    def limit(self, *args):
+        return self
+
+    def stream(self):
+        return iter(self.docs)
+
+
+class FakeDoc:
+    def __init__(self, data):
+        self.data = data
+
+    def to_dict(self):
+        return self.data
+
+
+class FakeDb:
+    def __init__(self, docs):
+        self.docs = docs
+
+    def collection(self, name):
+        return FakeQuery(self.docs)
+
+
+def test_search_caps_paths_per_symbol():
+    """A hot symbol returns at most max_paths paths across its bucket documents."""
+    docs = [
+        FakeDoc({
+            'symbol': 'main', 'repo_id': 'owner_repo', 'bucket': bucket,
+            'entries': {f'b{bucket}/f{i}.py': ['function'] for i in range(5)}
+        })
+        for bucket in range(3)
+    ]
+    docs.append(FakeDoc({'symbol': 'main', 'repo_id': 'owner_repo', 'entries': {'legacy.py': ['function']}}))
+
+    results = search_symbols(FakeDb(docs), 'main', max_paths=7)
+
+    assert len(results) == 7
+    assert 'legacy.py' not in {result['path'] for result in results}
@@ -0,0 +1,185 @@
+"""
+Tests for SyncCheckpoint, the durable progress record used to resume syncs.
+
+Firestore references are replaced with an in-memory fake that records every
+document written.
+"""
+
+from src.services import sync_checkpoint
+from src.services.sync_checkpoint import SyncCheckpoint
+
+
+class FakeDocRef:
+    def __init__(self, store, path):
+        self.store = store
+        self.path = path
+        self.id = path.split('/')[-1]
+
+    def collection(self, name):
+        return FakeCollectionRef(self.store, f'{self.path}/{name}')
+
+    def set(self, data, merge=False):
+        if merge:
+            self.store.setdefault(self.path, {}).update(data)
+        else:
+            self.store[self.path] = dict(data)
+
+
+class FakeSnapshot:
+    def __init__(self, ref, data):
+        self.reference = ref
+        self.id = ref.id
+        self._data = data
+
+    def get(self, field):
+        return self._data[field]
+
+    def to_dict(self):
+        return dict(self._data)
+
+
+class FakeCollectionRef:
+    def __init__(self, store, path, filters=(), order=None, count=None):
+        self.store = store
+        self.path = path
+        self.filters = filters
+        self.order = order
+        self.count = count
+
+    def document(self, doc_id):
+        return FakeDocRef(self.store, f'{self.path}/{doc_id}')
+
+    def where(self, field, op, value):
+        match = (lambda v: v in value) if op == 'in' else (lambda v: v == value)
+        return FakeCollectionRef(self.store, self.path, self.filters + ((field, match),), self.order, self.count)
+
+    def order_by(self, field, direction=None):
+        return FakeCollectionRef(self.store, self.path, self.filters, (field, direction), self.count)
+
+    def limit(self, count):
+        return FakeCollectionRef(self.store, self.path, self.filters, self.order, count)
+
+    def stream(self):
+        docs = [
+            FakeSnapshot(FakeDocRef(self.store, path), data)
+            for path, data in sorted(self.store.items())
+            if path.rsplit('/', 1)[0] == self.path
+            and all(field in data and match(data[field]) for field, match in self.filters)
+        ]
+        if self.order:
+            field, direction = self.order
+            # Like Firestore, ordering leaves out documents without the field
+            docs = [doc for doc in docs if doc.to_dict().get(field) is not None]
+            docs.sort(key=lambda doc: doc.get(field), reverse=direction == 'DESCENDING')
+        return iter(docs[:self.count] if self.count else docs)
+
+
+def test_start_splits_pending_paths_into_chunks(monkeypatch):
+    """Pending paths are spread over chunk documents."""
+    monkeypatch.setattr(sync_checkpoint, 'CHUNK_SIZE', 2)
+    store = {}
+    repo_ref = FakeDocRef(store, 'repositories/owner_repo')
+
+    checkpoint = SyncCheckpoint.start(repo_ref, 'abc123', ['a.py', 'b.py', 'c.py'])
+
+    run_path = f'repositories/owner_repo/sync_runs/{checkpoint.run_id}'
+    assert store[run_path]['target_commit'] == 'abc123'
+    assert store[run_path]['pending_count'] == 3
+    assert store[f'{run_path}/pending/00000']['paths'] == ['a.py', 'b.py']
+    assert store[f'{run_path}/pending/00001']['paths'] == ['c.py']
+
+
+def test_completed_paths_are_saved_in_new_chunks():
+    """Each save writes only the paths completed since the previous save."""
+    store = {}
+    run_ref = FakeDocRef(store, 'repositories/owner_repo/sync_runs/run1')
+    checkpoint = SyncCheckpoint(run_ref, 'abc123', ['a.py', 'b.py'])
+
+    checkpoint.mark_completed('a.py')
+    checkpoint.save()
+    checkpoint.save()
+    checkpoint.mark_completed('b.py')
+    checkpoint.finish('completed')
+
+    assert store['repositories/owner_repo/sync_runs/run1/completed/00000']['paths'] == ['a.py']
+    assert store['repositories/owner_repo/sync_runs/run1/completed/00001']['paths'] == ['b.py']
+    assert store['repositories/owner_repo/sync_runs/run1']['status'] == 'completed'
+    assert store['repositories/owner_repo/sync_runs/run1']['completed_count'] == 2
+    assert checkpoint.is_completed('a.py')
+
+
+def test_stored_paths_are_completed_and_saved_together():
+    store = {}
+    run_ref = FakeDocRef(store, 'repositories/owner_repo/sync_runs/run1')
+    checkpoint = SyncCheckpoint(run_ref, 'abc123', ['a.py', 'b.py'])
+
+    checkpoint.save_stored(['a.py'])
+    checkpoint.save_stored([])
+
+    assert store['repositories/owner_repo/sync_runs/run1/completed/00000']['paths'] == ['a.py']
+    assert 'repositories/owner_repo/sync_runs/run1/completed/00001' not in store
+    assert checkpoint.is_completed('a.py')
+    assert not checkpoint.is_completed('b.py')
+
+
+def test_find_resumable_loads_latest_timestamped_run():
+    """The newest unfinished run is loaded; runs without a start time are skipped."""
+    store = {
+        'repositories/owner_repo/sync_runs/legacy': {'target_commit': 'abc123', 'status': 'failed'},
+        'repositories/owner_repo/sync_runs/old': {
+            'target_commit': 'abc123', 'status': 'failed', 'started_at': 1
+        },
+        'repositories/owner_repo/sync_runs/new': {
+            'target_commit': 'abc123', 'status': 'in_progress', 'started_at': 2
+        },
+        'repositories/owner_repo/sync_runs/new/pending/00000': {'paths': ['a.py', 'b.py']},
+        'repositories/owner_repo/sync_runs/new/completed/00000': {'paths': ['a.py']},
+        'repositories/owner_repo/sync_runs/done': {
+            'target_commit': 'abc123', 'status': 'completed', 'started_at': 3
+        }
+    }
+    repo_ref = FakeDocRef(store, 'repositories/owner_repo')
+
+    checkpoint = SyncCheckpoint.find_resumable(repo_ref, 'abc123')
+
+    # Finding a run only reads it
+    assert 'resumed_at' not in store['repositories/owner_repo/sync_runs/new']
+    assert checkpoint.run_id == 'new'
+    assert checkpoint.pending_paths == ['a.py', 'b.py']
+    assert checkpoint.is_completed('a.py')
+    assert not checkpoint.is_completed('b.py')
+    assert checkpoint.completed_chunks == 1
+
+
+def test_resume_marks_the_run_in_progress():
+    store = {'repositories/owner_repo/sync_runs/run1': {'target_commit': 'abc123', 'status': 'failed'}}
+    run_ref = FakeDocRef(store, 'repositories/owner_repo/sync_runs/run1')
+
+    SyncCheckpoint(run_ref, 'abc123', ['a.py']).resume()
+
+    assert store['repositories/owner_repo/sync_runs/run1']['status'] == 'in_progress'
+    assert 'resumed_at' in store['repositories/owner_repo/sync_runs/run1']
+
+
+def test_resume_retries_completed_paths_that_were_not_stored():
+    """After a partially failed flush, only files stored at the listed SHA are skipped."""
+    from src.main import diff_repository_files, split_resumed
+    from src.services.firestore_service import RepositorySnapshot, SnapshotRecord
+
+    # The interrupted run completed both paths, but only a.py's write was stored
+    checkpoint = SyncCheckpoint(FakeDocRef({}, 'repositories/owner_repo/sync_runs/run1'), 'abc123',
+                                ['a.py', 'b.py', 'c.py'], completed_paths={'a.py', 'b.py'})
+    snapshot = RepositorySnapshot({
+        'a.py': SnapshotRecord('a.py', 'a2', 10, '2024-02-01T00:00:00', 'active', None),
+        'b.py': SnapshotRecord('b.py', 'b1', 10, '2024-01-01T00:00:00', 'active', None)
+    })
+    listed = [{'path': path, 'metadata': {'sha': sha}}
+              for path, sha in (('a.py', 'a2'), ('b.py', 'b2'), ('c.py', 'c1'))]
+
+    files_to_process, unchanged_files, _ = diff_repository_files(listed, snapshot)
+    unchanged_files, resumed_files = split_resumed(unchanged_files, checkpoint)
+
+    assert [f['path'] for f in files_to_process] == ['b.py', 'c.py']
+    assert unchanged_files == []
+    assert [f['path'] for f in resumed_files] == ['a.py']
+    assert resumed_files[0]['last_updated'] == '2024-02-01T00:00:00'
@@ -0,0 +1,117 @@
+"""
+Tests for the per-repository sync lease: expiry, joining a running sync and queueing behind it.
+"""
+
+import asyncio
+from datetime import datetime, timedelta, UTC
+
+import pytest
+
+from src.services.sync_lease import SyncLease, acquire_sync_lease, joined_result, lease_held_by, lease_is_live
+
+
+class FakeRepoRef:
+    id = 'owner_repo'
+
+    def __init__(self, state=None):
+        self.state = state
+
+    def get(self, field_paths=None):
+        return FakeSnapshot(self.state)
+
+
+class FakeSnapshot:
+    def __init__(self, state):
+        self.exists = state is not None
+        self.state = state
+
+    def to_dict(self):
+        return self.state
+
+
+def fake_states(monkeypatch, states):
+    """Make try_acquire return the given (acquired, state) tuples in turn"""
+    calls = []
+
+    def try_acquire(self, join_run_id=None):
+        calls.append(join_run_id)
+        return states.pop(0)
+
+    monkeypatch.setattr(SyncLease, 'try_acquire', try_acquire)
+    return calls
+
+
+def test_lease_expires_unless_renewed():
+    now = datetime.now(UTC)
+
+    assert lease_is_live({'run_id': 'a', 'expires_at': now + timedelta(seconds=30)}, now)
+    assert not lease_is_live({'run_id': 'a', 'expires_at': now - timedelta(seconds=1)}, now)
+    assert not lease_is_live(None, now)
+
+
+def test_lease_held_by_only_the_live_holder():
+    live = {'sync_lease': {'run_id': 'run-1', 'expires_at': datetime.now(UTC) + timedelta(seconds=30)}}
+    expired = {'sync_lease': {'run_id': 'run-1', 'expires_at': datetime.now(UTC) - timedelta(seconds=1)}}
+
+    assert lease_held_by(FakeRepoRef(live), 'run-1')
+    assert not lease_held_by(FakeRepoRef(live), 'run-2')
+    assert not lease_held_by(FakeRepoRef(expired), 'run-1')
+    assert not lease_held_by(FakeRepoRef(), 'run-1')
+
+
+def test_join_waits_for_the_running_sync_and_returns_its_result(monkeypatch):
+    running = {'sync_lease': {'run_id': 'run-1', 'owner': 'host:1'}}
+    calls = fake_states(monkeypatch, [
+        (False, running),
+        (False, running),
+        (False, {'last_sync_run': {'run_id': 'run-1', 'status': 'success', 'file_count': 7, 'changed_files': 7}})
+    ])
+
+    waited_for = []
+
+    lease, result = asyncio.run(acquire_sync_lease(FakeRepoRef(), poll_interval=0, on_wait=waited_for.append))
+
+    assert lease is None
+    assert result == {'status': 'success', 'joined': True, 'run_id': 'run-1', 'file_count': 7, 'changed_files': 7}
+    assert calls == [None, 'run-1', 'run-1']
+    assert waited_for == [{'run_id': 'run-1', 'owner': 'host:1'}]
+
+
+def test_queue_waits_for_the_lease_and_then_syncs(monkeypatch):
+    calls = fake_states(monkeypatch, [
+        (False, {'sync_lease': {'run_id': 'run-1'}}),
+        (True, {'last_sync_run': {'run_id': 'run-1', 'status': 'success'}})
+    ])
+
+    lease, result = asyncio.run(acquire_sync_lease(FakeRepoRef(), if_running='queue', poll_interval=0))
+
+    assert isinstance(lease, SyncLease)
+    assert result is None
+    assert calls == [None, None]
+
+
+def test_waiting_gives_up_after_the_timeout(monkeypatch):
+    fake_states(monkeypatch, [(False, {'sync_lease': {'run_id': 'run-1'}})])
+
+    with pytest.raises(TimeoutError):
+        asyncio.run(acquire_sync_lease(FakeRepoRef(), poll_interval=0, timeout=0))
+
+
+def test_joined_failure_carries_the_error():
+    result = joined_result({'run_id': 'run-1', 'status': 'error', 'error': 'GitHub rate limit exceeded'})
+
+    assert result['status'] == 'error'
+    assert result['error'] == 'GitHub rate limit exceeded'
+
+
+def test_lost_lease_stops_the_sync_at_its_next_check(monkeypatch):
+    """Once another sync takes the lease over, check() raises instead of letting writes continue."""
+    monkeypatch.setattr(SyncLease, 'renew', lambda self: False)
+    lease = SyncLease(FakeRepoRef())
+    lease.check()
+
+    asyncio.run(lease.hold(interval=0))
+
+    assert lease.lost
+    with pytest.raises(RuntimeError, match='taken over'):
+        lease.check()
@@ -0,0 +1,100 @@
+"""
+Tests for structured sync logging: sampling, truncation, the queue handler and file summaries.
+"""
+
+import io
+import json
+import logging
+
+import pytest
+
+from src.services import sync_logging
+from src.services.sync_logging import (
+    EventLogger, FileLogSummary, JsonFormatter, SamplingFilter, configure_logging, flush_logging
+)
+
+
+def make_record(event, level=logging.WARNING, **fields):
+    record = logging.makeLogRecord({'msg': event, 'levelno': level, 'levelname': logging.getLevelName(level)})
+    record.event = event
+    record.fields = fields
+    return record
+
+
+@pytest.fixture
+def restore_logging():
+    root = logging.getLogger()
+    handlers, level = list(root.handlers), root.level
+    yield
+    sync_logging._listener.stop()
+    sync_logging._listener = None
+    root.handlers[:] = handlers
+    root.setLevel(level)
+    sync_logging._mode = 'verbose'
+
+
+def test_sampling_keeps_every_nth_event_and_all_errors():
+    sampler = SamplingFilter({'file_fetch_failed': 3})
+
+    kept = [sampler.filter(make_record('file_fetch_failed', path=str(n))) for n in range(7)]
+    assert kept == [True, False, False, True, False, False, True]
+
+    record = make_record('file_fetch_failed')
+    sampler.filter(record)
+    sampler.filter(record)
+    record = make_record('file_fetch_failed')
+    assert sampler.filter(record)
+    assert record.fields == {'sample_rate': 3, 'suppressed': 2}
+
+    assert all(sampler.filter(make_record('file_fetch_failed', logging.ERROR)) for _ in range(3))
+    assert sampler.filter(make_record('sync_completed', logging.INFO))
+
+
+def test_json_formatter_truncates_long_fields():
+    formatter = JsonFormatter(max_field_length=10)
+
+    entry = json.loads(formatter.format(make_record('model_response', response='x' * 25, tokens=12)))
+
+    assert entry['severity'] == 'WARNING'
+    assert entry['event'] == 'model_response'
+    assert entry['response'] == 'x' * 10 + '... [15 more chars]'
+    assert entry['tokens'] == 12
+
+
+def test_quiet_mode_writes_json_through_the_queue(restore_logging):
+    stream = io.StringIO()
+    assert configure_logging('quiet', stream=stream) == 'quiet'
+    log = EventLogger('services.test_sync_logging')
+
+    log.debug('file_new', path='a.py')
+    log.info('sync_started', 'Processing repository: owner/repo', repository='owner/repo')
+    try:
+        raise ValueError('boom')
+    except ValueError:
+        log.exception('sync_failed', 'boom')
+    flush_logging()
+
+    entries = [json.loads(line) for line in stream.getvalue().splitlines()]
+    assert [entry['event'] for entry in entries] == ['sync_started', 'sync_failed']
+    assert entries[0]['repository'] == 'owner/repo'
+    assert 'ValueError: boom' in entries[1]['exception']
+    assert sync_logging.is_quiet()
+
+
+def test_file_summary_logs_once_per_batch(restore_logging):
+    stream = io.StringIO()
+    configure_logging('quiet', stream=stream)
+    summary = FileLogSummary(EventLogger('services.test_sync_logging'), total=5, every=2)
+
+    for n in range(5):
+        usage = {'usage': {'total_tokens': 10}}
+        summary.add({'path': f'{n}.py', 'analysis_metadata': usage,
+                     'ai_analysis': {'error': 'failed'} if n == 0 else {'summary': 'ok'}})
+    summary.report()
+    summary.report()
+    flush_logging()
+
+    entries = [json.loads(line) for line in stream.getvalue().splitlines()]
+    assert [entry['processed'] for entry in entries] == [2, 4, 5]
+    assert entries[-1]['errors'] == 1
+    assert entries[-1]['tokens'] == 50
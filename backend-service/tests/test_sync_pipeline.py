@@ -0,0 +1,136 @@
+"""
+Tests for SyncPipeline, the staged producer/consumer pipeline used by syncs.
+"""
+
+import asyncio
+import pytest
+from src.services.sync_pipeline import PipelineStage, SyncPipeline
+
+
+def test_items_flow_through_all_stages():
+    persisted = []
+
+    async def analyze(item):
+        await asyncio.sleep(0)
+        return item * 10
+
+    pipeline = SyncPipeline([
+        PipelineStage('fetch', lambda item: item + 1, workers=3, blocking=True),
+        # Odd items are dropped
+        PipelineStage('filter', lambda item: item if item % 2 else None),
+        PipelineStage('analyze', analyze, workers=2),
+        PipelineStage('persist', persisted.append)
+    ], queue_size=2)
+    asyncio.run(pipeline.run(range(10)))
+
+    assert sorted(persisted) == [10, 30, 50, 70, 90]
+    metrics = pipeline.metrics()
+    assert metrics['fetch']['processed'] == 10
+    assert metrics['filter']['dropped'] == 5
+    assert metrics['persist']['processed'] == 5
+    assert metrics['analyze']['queue_depth'] == 0
+
+
+def test_bounded_queues_apply_backpressure():
+    """A slow last stage limits how far ahead the first stage can run."""
+    fetched = []
+    persisted = []
+
+    async def persist(item):
+        await asyncio.sleep(0.01)
+        persisted.append(item)
+        # Items fetched but not yet persisted: at most both queues plus workers
+        assert len(fetched) - len(persisted) <= 2 + 2 + 2
+
+    pipeline = SyncPipeline([
+        PipelineStage('fetch', lambda item: fetched.append(item) or item),
+        PipelineStage('persist', persist)
+    ], queue_size=2)
+    asyncio.run(pipeline.run(range(20)))
+
+    assert len(persisted) == 20
+    assert pipeline.metrics()['persist']['utilisation'] > pipeline.metrics()['fetch']['utilisation']
+
+
+def test_stage_errors_stop_the_pipeline():
+    def fail(item):
+        if item == 3:
+            raise RuntimeError('boom')
+        return item
+
+    pipeline = SyncPipeline([PipelineStage('fetch', fail), PipelineStage('persist', lambda item: item)])
+    with pytest.raises(RuntimeError, match='boom'):
+        asyncio.run(pipeline.run(range(100)))
+
+
+def test_stage_requires_a_worker():
+    with pytest.raises(ValueError):
+        PipelineStage('fetch', lambda item: item, workers=0)
+
+
+def test_sync_writer_persists_off_the_event_loop():
+    """A blocking file writer's writes and flushes run in a worker thread."""
+    import threading
+    from src.main import build_sync_pipeline
+
+    class BlockingWriter:
+        def __init__(self):
+            self.threads = []
+
+        def write(self, file):
+            self.threads.append(threading.get_ident())
+
+    writer = BlockingWriter()
+    pipeline = build_sync_pipeline(None, None, 'owner/repo', 'abc123', {}, writer, None, None)
+
+    asyncio.run(pipeline.stages[-1].handle({'path': 'app.py'}))
+
+    assert writer.threads and writer.threads[0] != threading.get_ident()
+
+
+def test_persist_stops_once_the_sync_lease_is_lost():
+    from src.main import build_sync_pipeline
+
+    class LostLease:
+        lost = True
+
+        def check(self):
+            raise RuntimeError('Sync lease was taken over by another sync')
+
+    written = []
+    pipeline = build_sync_pipeline(None, None, 'owner/repo', 'abc123', {}, written, None, None,
+                                   sync_lease=LostLease())
+    with pytest.raises(RuntimeError, match='taken over'):
+        asyncio.run(pipeline.stages[-1].handle({'path': 'app.py'}))
+    assert written == []
+
+
+def test_failed_fetch_is_stored_with_its_error():
+    """A file whose commit history can't be fetched doesn't abort the sync."""
+    from src.main import build_sync_pipeline
+    from src.services.firestore_service import RepositoryFileWriter
+
+    class GithubService:
+        def get_last_commit(self, repo_full_name, path, ref=None):
+            if path == 'broken.txt':
+                raise RuntimeError('rate limited')
+            return {'date': '2024-01-01T00:00:00', 'message': 'update'}
+
+    class DocumentWriter:
+        def __init__(self):
+            self.documents = []
+
+        def write(self, file):
+            self.documents.append(RepositoryFileWriter.build_file_document(file, None))
+
+    files = [{'name': name, 'path': name, 'language': 'txt', 'size': 1, 'metadata': {'sha': name}}
+             for name in ('a.txt', 'broken.txt', 'b.txt')]
+    writer = DocumentWriter()
+    pipeline = build_sync_pipeline(GithubService(), None, 'owner/repo', 'abc123', {}, writer, None, None)
+    asyncio.run(pipeline.run(files))
+
+    documents = {document['path']: document for document in writer.documents}
+    assert sorted(documents) == ['a.txt', 'b.txt', 'broken.txt']
+    assert documents['broken.txt']['last_updated'] is None
+    assert documents['broken.txt']['ai_analysis'] == {'error': 'rate limited'}
+    assert documents['a.txt']['last_updated'] == '2024-01-01T00:00:00'
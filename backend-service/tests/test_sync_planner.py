@@ -0,0 +1,51 @@
+"""
+Tests for the dry-run sync estimate.
+"""
+
+from src.services.sync_planner import (
+    GITHUB_CALLS_PER_SYNC, PROMPT_OVERHEAD_TOKENS, RESPONSE_TOKENS_PER_FILE, estimate_sync, model_cost
+)
+
+
+def test_model_cost_uses_long_context_rates_above_threshold():
+    assert model_cost(100_000, 0) == 0.125
+    assert model_cost(0, 1_000_000) == 5.0
+    assert model_cost(200_000, 0) == 0.5
+
+
+def test_estimate_counts_calls_tokens_and_cache_hits():
+    files = [
+        {'path': 'src/app.py', 'size': 4000},
+        {'path': 'src/util.ts', 'size': 800},
+        {'path': 'logo.png', 'size': 90000}
+    ]
+    analyzed = {'src/app.py', 'src/util.ts'}
+
+    plan = estimate_sync(
+        files,
+        should_analyze=lambda path: path in analyzed,
+        fetches_content=lambda path: path in analyzed,
+        unchanged=5,
+        resumed=2,
+        deleted=1,
+        config={'pipeline_fetch_workers': 2, 'pipeline_analyze_workers': 1}
+    )
+
+    usage = plan['models']['gemini-1.5-pro']
+    assert usage['requests'] == 2
+    assert usage['prompt_tokens'] == 2 * PROMPT_OVERHEAD_TOKENS + 1000 + 200
+    assert usage['response_tokens'] == 2 * RESPONSE_TOKENS_PER_FILE
+    # Every changed file needs its last commit; only analyzed ones their content
+    assert plan['github']['calls'] == GITHUB_CALLS_PER_SYNC + 3 + 2
+    assert plan['cache'] == {'hits': 7, 'misses': 3, 'hit_ratio': 0.7}
+    assert plan['firestore']['writes'] == 4
+    assert plan['bottleneck'] == 'analyze'
+    assert plan['duration_seconds']['total'] > plan['duration_seconds']['fetch']
+
+
+def test_estimate_of_unchanged_repository_is_free():
+    plan = estimate_sync([], lambda path: True, lambda path: True, unchanged=10, resumed=0, deleted=0)
+
+    assert plan['cost_usd'] == 0
+    assert plan['cache']['hit_ratio'] == 1.0
+    assert plan['github']['calls'] == GITHUB_CALLS_PER_SYNC
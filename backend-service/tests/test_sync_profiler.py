@@ -0,0 +1,55 @@
+"""
+Tests for the sync profiling report.
+"""
+
+import asyncio
+import json
+import time
+
+from services.sync_profiler import SyncProfiler, _union_seconds
+from services.telemetry import span
+
+
+def test_union_counts_overlapping_intervals_once():
+    second = 1_000_000_000
+    intervals = [(0, 2 * second), (1 * second, 3 * second), (5 * second, 6 * second)]
+
+    assert _union_seconds(intervals) == 4.0
+    assert _union_seconds([]) == 0.0
+
+
+def test_profile_report_covers_stages_lag_memory_and_stacks(tmp_path):
+    async def sync():
+        profiler = SyncProfiler(sample_interval=0.001, lag_interval=0.01)
+        profiler.start()
+        try:
+            async def fetch(index):
+                with span('pipeline.fetch'):
+                    await asyncio.sleep(0.02)
+                    return [index] * 10000
+            contents = await asyncio.gather(*(fetch(index) for index in range(4)))
+            with span('pipeline.analyze'):
+                # Blocks the event loop, so the lag probe sees it
+                time.sleep(0.05)
+            await asyncio.sleep(0.02)
+        finally:
+            profiler.stop()
+        return profiler, contents
+
+    profiler, _ = asyncio.run(sync())
+    report = profiler.write_report(str(tmp_path / 'profile'))
+
+    fetch = report['stages']['pipeline.fetch']
+    assert fetch['calls'] == 4
+    # The fetches overlap, so they cover less wall time than their sum
+    assert fetch['wall_seconds'] < fetch['total_seconds']
+    assert report['event_loop_lag']['max_ms'] >= 30
+    assert report['memory']['peak_bytes'] > 0
+    assert report['memory']['top_allocations']
+    assert report['cpu']['top_functions']
+
+    with open(report['files']['report']) as f:
+        assert json.load(f)['stages'] == report['stages']
+    with open(report['files']['flame_graph']) as f:
+        stacks = [line.rsplit(' ', 1) for line in f]
+    assert any(stack.startswith('MainThread;') and int(count) > 0 for stack, count in stacks)
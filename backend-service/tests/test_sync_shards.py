@@ -0,0 +1,72 @@
+"""
+Tests for splitting a sync into shards and merging the shards' results.
+"""
+
+from datetime import datetime, timedelta, UTC
+
+from src.services.sync_shards import (
+    claimable, merge_pipeline_metrics, merge_write_stats, shard_count_for, shard_index, split_shards
+)
+
+
+def test_shard_count_scales_with_changed_files():
+    assert shard_count_for(10, 8) == 1
+    assert shard_count_for(120, 8) == 2
+    assert shard_count_for(100000, 8) == 8
+    assert shard_count_for(100000, 1) == 1
+
+
+def test_files_are_split_by_stable_path_hash():
+    files = [{'path': f'src/module_{n}.py'} for n in range(200)]
+
+    shards = split_shards(files, 4)
+
+    assert sorted(f['path'] for shard in shards for f in shard) == sorted(f['path'] for f in files)
+    assert all(shard for shard in shards)
+    for index, shard in enumerate(shards):
+        assert all(shard_index(f['path'], 4) == index for f in shard)
+        # Files keep their priority order within a shard
+        assert shard == [f for f in files if f in shard]
+
+
+def test_only_pending_and_expired_shards_are_claimable():
+    now = datetime.now(UTC)
+
+    assert claimable({'status': 'pending'}, now)
+    assert claimable({'status': 'leased', 'lease_expires_at': now - timedelta(seconds=1)}, now)
+    assert not claimable({'status': 'leased', 'lease_expires_at': now + timedelta(seconds=60)}, now)
+    assert not claimable({'status': 'completed', 'lease_expires_at': None}, now)
+    assert not claimable({'status': 'failed'}, now)
+
+
+def test_shard_results_merge_into_one_record():
+    writes = merge_write_stats([
+        {'succeeded': 10, 'failed': 1, 'retried': 2, 'errors_by_code': {'ABORTED': 1}, 'duration_seconds': 2.0},
+        {'succeeded': 30, 'failed': 0, 'retried': 1, 'errors_by_code': {}, 'duration_seconds': 4.0}
+    ])
+    assert writes == {'succeeded': 40, 'failed': 1, 'retried': 3, 'errors_by_code': {'ABORTED': 1},
+                      'duration_seconds': 4.0, 'ops_per_second': 10.0}
+
+    stage = {'workers': 4, 'processed': 5, 'dropped': 0, 'busy_seconds': 1.5, 'utilisation': 0.5}
+    pipeline = merge_pipeline_metrics([{'analyze': stage}, {'analyze': {**stage, 'utilisation': 0.25}}])
+    assert pipeline['analyze']['processed'] == 10
+    assert pipeline['analyze']['busy_seconds'] == 3.0
+    assert pipeline['analyze']['utilisation'] == 0.375
+
+
+def test_joined_workers_stop_once_the_coordinator_loses_its_lease(monkeypatch):
+    import asyncio
+    import src.main
+    from src.main import ShardContext, sync_claimed_shards
+
+    class ShardRun:
+        run_id = 'shards-1'
+        lease_run_id = 'run-1'
+
+        def claim(self):
+            raise AssertionError('no shard should be claimed')
+
+    monkeypatch.setattr(src.main, 'lease_held_by', lambda repo_ref, run_id: False)
+    context = ShardContext(None, None, None, 'owner/repo', object(), None, 'abc123', {})
+
+    assert asyncio.run(sync_claimed_shards(ShardRun(), [[]], context)) == {}
@@ -0,0 +1,77 @@
+"""
+Tests for sync tracing and the Prometheus metrics registry.
+"""
+
+import asyncio
+import json
+
+import pytest
+
+from src.services.telemetry import MetricsRegistry, Tracer, SPAN_DURATION, SPAN_ERRORS, traced
+
+
+def test_registry_renders_prometheus_text():
+    registry = MetricsRegistry()
+    tokens = registry.counter('tokens_total', 'Tokens used')
+    latency = registry.histogram('latency_seconds', 'Call latency', buckets=(0.1, 1.0))
+    tokens.inc(5, kind='prompt')
+    tokens.inc(3, kind='prompt')
+    latency.observe(0.5, span='fetch')
+
+    text = registry.render()
+
+    assert '# TYPE tokens_total counter' in text
+    assert 'tokens_total{kind="prompt"} 8' in text
+    assert '# TYPE latency_seconds histogram' in text
+    assert 'latency_seconds_bucket{span="fetch",le="0.1"} 0' in text
+    assert 'latency_seconds_bucket{span="fetch",le="1.0"} 1' in text
+    assert 'latency_seconds_bucket{span="fetch",le="+Inf"} 1' in text
+    assert 'latency_seconds_count{span="fetch"} 1' in text
+    assert registry.counter('tokens_total', 'Tokens used') is tokens
+
+
+def test_nested_spans_share_trace_and_export_json_lines(tmp_path):
+    export_path = tmp_path / 'trace.jsonl'
+    tracer = Tracer(str(export_path))
+
+    with tracer.span('test.sync', repository='owner/repo') as root:
+        with tracer.span('test.fetch') as child:
+            pass
+
+    assert child.trace_id == root.trace_id
+    assert child.parent_id == root.span_id
+    spans = [json.loads(line) for line in export_path.read_text().splitlines()]
+    assert [span['name'] for span in spans] == ['test.fetch', 'test.sync']
+    assert spans[1]['attributes'] == {'repository': 'owner/repo'}
+    assert spans[1]['parentSpanId'] == ''
+    assert spans[1]['endTimeUnixNano'] >= spans[1]['startTimeUnixNano']
+
+
+def test_failed_span_is_counted_and_reraised():
+    tracer = Tracer()
+    errors = SPAN_ERRORS.value(span='test.failing')
+
+    with pytest.raises(ValueError):
+        with tracer.span('test.failing'):
+            raise ValueError('bad response')
+
+    assert tracer.recent[-1].status == 'ERROR'
+    assert tracer.recent[-1].error == 'bad response'
+    assert SPAN_ERRORS.value(span='test.failing') == errors + 1
+
+
+def test_traced_covers_functions_and_coroutines():
+    calls = SPAN_DURATION.count(span='test.traced')
+
+    @traced('test.traced')
+    def parse(text):
+        return json.loads(text)
+
+    @traced('test.traced')
+    async def generate():
+        await asyncio.sleep(0)
+        return parse('{"ok": true}')
+
+    assert asyncio.run(generate()) == {'ok': True}
+    assert generate.__name__ == 'generate'
+    assert SPAN_DURATION.count(span='test.traced') == calls + 2